@@ -17,4 +17,5 @@ then
 fi
 
 
-PYTHONPATH=. poetry run python /code/hll_seed_vip/cli.py
+# exec so SIGTERM reaches Python and it can shut down gracefully
+PYTHONPATH=. exec poetry run python /code/hll_seed_vip/cli.py
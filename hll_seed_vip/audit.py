@@ -0,0 +1,183 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Final, Iterable, Iterator, NamedTuple
+
+import httpx
+from loguru import logger
+
+from hll_seed_vip.io import get_vips
+from hll_seed_vip.ledger import GrantRecord, read_ledger
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.models import ServerConfig, VipPlayer
+from hll_seed_vip.utils import calc_vip_expiration_for_seeds, has_indefinite_vip
+
+# The latest grant is still active but the player isn't a VIP
+MISSING: Final = "missing"
+# The VIP list doesn't have the expiration the latest grant set
+EXPIRATION_MISMATCH: Final = "expiration_mismatch"
+# Two grants closer together than two seeds can be
+DOUBLE_ADDITION: Final = "double_addition"
+# A grant doesn't match `calc_vip_expiration_timestamp` applied to the previous one
+# once per seed it was for
+WRONG_EXPIRATION: Final = "wrong_expiration"
+
+FINDING_KINDS: Final = (MISSING, EXPIRATION_MISMATCH, DOUBLE_ADDITION, WRONG_EXPIRATION)
+
+
+class AuditFinding(NamedTuple):
+    kind: str
+    player_id: str
+    name: str
+    granted_at: datetime
+    expected: datetime | None
+    actual: datetime | None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "player_id": self.player_id,
+            "name": self.name,
+            "granted_at": self.granted_at.isoformat(),
+            "expected": self.expected.isoformat() if self.expected else None,
+            "actual": self.actual.isoformat() if self.actual else None,
+        }
+
+
+def _differs(a: datetime | None, b: datetime | None, tolerance: timedelta) -> bool:
+    if a is None or b is None:
+        return a is not b
+    return abs(a - b) > tolerance
+
+
+def check_grants(
+    config: ServerConfig,
+    grants: Iterable[GrantRecord],
+    tolerance: timedelta,
+    latest: dict[str, GrantRecord],
+) -> Iterator[AuditFinding]:
+    """Check each grant against the player's previous one, filling `latest` as it goes
+
+    Only the latest grant per player is kept so months of grants are checked in a
+    single pass. Grants are assumed to be in the order they were made, which the
+    append only ledger guarantees
+    """
+    for grant in grants:
+        if grant.server_url != config.base_url:
+            continue
+
+        prev = latest.get(grant.player_id)
+        latest[grant.player_id] = grant
+        if prev is None:
+            continue
+
+        if config.cumulative_vip and grant.granted_at - prev.granted_at < config.buffer:
+            yield AuditFinding(
+                kind=DOUBLE_ADDITION,
+                player_id=grant.player_id,
+                name=grant.name,
+                granted_at=grant.granted_at,
+                expected=prev.expiration,
+                actual=grant.expiration,
+            )
+            continue
+
+        expected = calc_vip_expiration_for_seeds(
+            config, prev.expiration, from_time=grant.granted_at, seeds=grant.seeds
+        )
+        # An expired VIP may have been removed before the player seeded again
+        expired = prev.expiration is not None and prev.expiration < grant.granted_at
+        if _differs(expected, grant.expiration, tolerance) and not (
+            expired
+            and not _differs(
+                calc_vip_expiration_for_seeds(
+                    config, None, from_time=grant.granted_at, seeds=grant.seeds
+                ),
+                grant.expiration,
+                tolerance,
+            )
+        ):
+            yield AuditFinding(
+                kind=WRONG_EXPIRATION,
+                player_id=grant.player_id,
+                name=grant.name,
+                granted_at=grant.granted_at,
+                expected=expected,
+                actual=grant.expiration,
+            )
+
+
+def check_vips(
+    latest: dict[str, GrantRecord],
+    vips: dict[str, VipPlayer],
+    now: datetime,
+    tolerance: timedelta,
+) -> Iterator[AuditFinding]:
+    """Join the latest grant per player against the VIP list"""
+    for player_id, grant in latest.items():
+        vip = vips.get(player_id)
+        if has_indefinite_vip(vip):
+            continue
+
+        if vip is None:
+            if grant.expiration is None or grant.expiration > now:
+                yield AuditFinding(
+                    kind=MISSING,
+                    player_id=player_id,
+                    name=grant.name,
+                    granted_at=grant.granted_at,
+                    expected=grant.expiration,
+                    actual=None,
+                )
+        elif _differs(grant.expiration, vip.expiration_date, tolerance):
+            yield AuditFinding(
+                kind=EXPIRATION_MISMATCH,
+                player_id=player_id,
+                name=grant.name,
+                granted_at=grant.granted_at,
+                expected=grant.expiration,
+                actual=vip.expiration_date,
+            )
+
+
+def make_audit_report(
+    config: ServerConfig,
+    findings: list[AuditFinding],
+    players: int,
+    now: datetime,
+) -> dict[str, Any]:
+    counts = Counter(finding.kind for finding in findings)
+    return {
+        "server_url": config.base_url,
+        "generated_at": now.isoformat(),
+        "players": players,
+        "counts": {kind: counts[kind] for kind in FINDING_KINDS},
+        "findings": [finding.to_dict() for finding in findings],
+    }
+
+
+async def audit_rewards(
+    client: httpx.AsyncClient,
+    config: ServerConfig,
+    ledger_path: Path,
+    tolerance: timedelta = timedelta(minutes=5),
+) -> dict[str, Any]:
+    """Compare every grant in the ledger with the CRCON VIP list
+
+    The ledger is checked first so only the VIPs of players it granted are kept from
+    the streamed VIP list
+    """
+    now = datetime.now(tz=timezone.utc)
+    latest: dict[str, GrantRecord] = {}
+    findings = list(check_grants(config, read_ledger(ledger_path), tolerance, latest))
+    vips = await get_vips(client, config.base_url, player_filter=latest.__contains__)
+    findings.extend(check_vips(latest, vips, now, tolerance))
+    report = make_audit_report(config, findings, players=len(latest), now=now)
+
+    for kind, count in report["counts"].items():
+        metrics.set(f"audit.{kind}", count)
+    logger.info(
+        f"Audited {len(latest)} rewarded players against {len(vips)} of their VIP entries: {json.dumps(report['counts'])}"
+    )
+    return report
@@ -0,0 +1,391 @@
+import json
+from bisect import bisect_left
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Final, Iterable, Iterator, NamedTuple, Sequence
+
+import httpx
+import trio
+from loguru import logger
+
+from hll_seed_vip.io import add_vip, get_vips
+from hll_seed_vip.ledger import GrantLedger, GrantRecord
+from hll_seed_vip.log import summarize
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.models import GameState, Player, ServerConfig, ServerPopulation, Team
+from hll_seed_vip.pipeline import SeededEvent, SeedingStateMachine, Snapshot
+from hll_seed_vip.timeseries import load_range, seeder_counts
+from hll_seed_vip.utils import (
+    calc_vip_expiration_for_seeds,
+    format_vip_reward_name,
+    has_indefinite_vip,
+)
+
+CONNECTED: Final = "CONNECTED"
+DISCONNECTED: Final = "DISCONNECTED"
+TEAMSWITCH: Final = "TEAMSWITCH"
+
+
+class ConnectionEvent(NamedTuple):
+    # Seconds since the epoch
+    timestamp: float
+    action: str
+    player_id: str
+    name: str
+    team: Team | None = None
+
+
+class Session(NamedTuple):
+    joined_at: float
+    name: str
+    team: Team | None
+
+
+class MissedSeed(NamedTuple):
+    seeded_timestamp: datetime
+    seeders: set[str]
+    names: dict[str, str]
+
+
+def parse_team(sub_content: str | None) -> Team | None:
+    """The team switched to from a TEAMSWITCH `sub_content` like `Allies > Axis`"""
+    if not sub_content:
+        return None
+    team = sub_content.rsplit(">", 1)[-1].strip().lower()
+    return Team(team) if team in (Team.ALLIES, Team.AXIS) else None
+
+
+def parse_log_line(line: str) -> ConnectionEvent | None:
+    """Parse a CRCON structured log line, None if it isn't a connection log
+
+    Expects the `timestamp_ms`, `action`, `player_id_1`, `player_name_1` and
+    `sub_content` fields CRCON uses for its logs, one JSON object per line
+    """
+    raw = json.loads(line)
+    action = raw.get("action")
+    if action not in (CONNECTED, DISCONNECTED, TEAMSWITCH):
+        return None
+
+    return ConnectionEvent(
+        timestamp=raw["timestamp_ms"] / 1000,
+        action=action,
+        player_id=raw["player_id_1"],
+        name=raw.get("player_name_1") or "",
+        team=parse_team(raw.get("sub_content")) if action == TEAMSWITCH else None,
+    )
+
+
+def read_connection_events(
+    lines: Iterable[str], start: datetime, end: datetime
+) -> Iterator[ConnectionEvent]:
+    """Yield the connection logs with start <= timestamp < end, the logs must be in order"""
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    prev_ts = float("-inf")
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            event = parse_log_line(line)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Skipping invalid log line {line_no}: {e}")
+            continue
+        if event is None:
+            continue
+
+        if event.timestamp < prev_ts:
+            raise ValueError(
+                f"Log line {line_no} is out of order, the logs must be sorted oldest first"
+            )
+        prev_ts = event.timestamp
+        if event.timestamp >= end_ts:
+            return
+        if event.timestamp >= start_ts:
+            yield event
+
+
+def make_snapshot(
+    config: ServerConfig, online: dict[str, Session], now: float
+) -> Snapshot:
+    """What polling CRCON at `now` would have returned
+
+    Players whose team isn't known from a TEAMSWITCH log are split between the teams
+    """
+    allies = axis = unknown = 0
+    for session in online.values():
+        if session.team == Team.ALLIES:
+            allies += 1
+        elif session.team == Team.AXIS:
+            axis += 1
+        else:
+            unknown += 1
+
+    return Snapshot(
+        config=config,
+        gamestate=GameState.model_construct(
+            num_allied_players=allies + (unknown + 1) // 2,
+            num_axis_players=axis + unknown // 2,
+        ),
+        players=ServerPopulation.model_construct(
+            players={
+                player_id: Player.model_construct(
+                    name=session.name,
+                    player_id=player_id,
+                    current_playtime_seconds=int(now - session.joined_at),
+                )
+                for player_id, session in online.items()
+            }
+        ),
+        timestamp=datetime.fromtimestamp(now, tz=timezone.utc),
+        monotonic=now,
+    )
+
+
+def replay_seeds(
+    config: ServerConfig,
+    events: Iterable[ConnectionEvent],
+    until: float | None = None,
+    since: float | None = None,
+) -> Iterator[SeededEvent]:
+    """Replay connection logs through the seeding state machine
+
+    The server is polled as often as the live seeder would have, so seeds are found
+    with the same `minimum_play_time`, `online_when_seeded` and `buffer` rules. Only
+    the players currently online are kept in memory
+
+    Events before `since` only track who is online (and since when), polling starts
+    at `since` so seeds before it aren't found
+    """
+    # No announcements while replaying
+    config = config.model_copy(update={"discord_webhooks": []})
+    state_machine = SeedingStateMachine()
+    online: dict[str, Session] = {}
+    next_poll: float | None = since
+
+    def poll_until(timestamp: float) -> Iterator[SeededEvent]:
+        nonlocal next_poll
+        while next_poll is not None and next_poll <= timestamp:
+            for seed in state_machine.process(make_snapshot(config, online, next_poll)):
+                if isinstance(seed, SeededEvent):
+                    yield seed
+            next_poll += state_machine.sleep_time or config.poll_time_seeding
+
+    for event in events:
+        if next_poll is None:
+            next_poll = event.timestamp
+        yield from poll_until(event.timestamp)
+
+        if event.action == CONNECTED:
+            online[event.player_id] = Session(event.timestamp, event.name, None)
+        elif event.action == DISCONNECTED:
+            online.pop(event.player_id, None)
+        elif event.player_id in online:
+            online[event.player_id] = online[event.player_id]._replace(team=event.team)
+
+    if until is not None:
+        yield from poll_until(until)
+
+
+def recording_gaps(
+    timestamps: Sequence[float], start: float, end: float, max_gap: float
+) -> list[tuple[float, float]]:
+    """The periods between `start` and `end` the seeder wasn't recording
+
+    The seeder records the population every poll, so anywhere the records (sorted
+    oldest first) are more than `max_gap` seconds apart it wasn't running
+    """
+    gaps: list[tuple[float, float]] = []
+    prev = start
+    for timestamp in (*timestamps, end):
+        if timestamp - prev > max_gap:
+            gaps.append((prev, timestamp))
+        prev = max(prev, timestamp)
+    return gaps
+
+
+def find_missed_seeds(
+    seeds: Iterable[SeededEvent],
+    live_seeds: list[datetime],
+    tolerance: timedelta,
+    gaps: list[tuple[float, float]] | None = None,
+) -> Iterator[MissedSeed]:
+    """Seeds that weren't seen by the live seeder within `tolerance` of when they happened
+
+    If `gaps` is set only seeds while the seeder wasn't recording (see `recording_gaps`)
+    can have been missed, the seeder saw the rest and decided who earned VIP itself
+    """
+    live_seeds = sorted(live_seeds)
+    for seed in seeds:
+        if gaps is not None:
+            seeded_at = seed.seeded_timestamp.timestamp()
+            if not any(gap_start < seeded_at < gap_end for gap_start, gap_end in gaps):
+                logger.info(
+                    f"Skipping the seed at {seed.seeded_timestamp.isoformat()}, the seeder was recording"
+                )
+                continue
+
+        idx = bisect_left(live_seeds, seed.seeded_timestamp - tolerance)
+        if (
+            idx < len(live_seeds)
+            and live_seeds[idx] <= seed.seeded_timestamp + tolerance
+        ):
+            logger.info(
+                f"Skipping the seed at {seed.seeded_timestamp.isoformat()}, the seeder was running"
+            )
+            continue
+
+        logger.info(
+            f"Missed seed at {seed.seeded_timestamp.isoformat()} seeders={summarize(seed.seeders)}"
+        )
+        yield MissedSeed(
+            seeded_timestamp=seed.seeded_timestamp,
+            seeders=set(seed.seeders),
+            names={
+                player_id: seed.names[player_id]
+                for player_id in seed.seeders
+                if player_id in seed.names
+            },
+        )
+
+
+async def grant_backfill(
+    client: httpx.AsyncClient,
+    config: ServerConfig,
+    rewards: Counter[str],
+    names: dict[str, str],
+    ledger: GrantLedger | None = None,
+    batch_size: int = 20,
+    batch_delay: float = 1.0,
+) -> list[GrantRecord]:
+    """Grant VIP for every seed each player missed, in concurrent batches
+
+    The grants are only logged if `config.dry_run` is set
+    """
+    vips = await get_vips(client, config.base_url, player_filter=rewards.__contains__)
+    now = datetime.now(tz=timezone.utc)
+    grants: list[GrantRecord] = []
+    for player_id, num_seeds in sorted(rewards.items()):
+        vip = vips.get(player_id)
+        if has_indefinite_vip(vip):
+            continue
+
+        grants.append(
+            GrantRecord(
+                player_id=player_id,
+                name=(
+                    vip.player.name
+                    if vip
+                    else format_vip_reward_name(
+                        names.get(player_id, "No player name found"),
+                        format_str=config.player_name_not_current_vip,
+                    )
+                ),
+                expiration=calc_vip_expiration_for_seeds(
+                    config,
+                    vip.expiration_date if vip else None,
+                    from_time=now,
+                    seeds=num_seeds,
+                ),
+                granted_at=now,
+                server_url=config.base_url,
+                seeds=num_seeds,
+            )
+        )
+
+    async def grant(record: GrantRecord) -> None:
+        await add_vip(
+            client=client,
+            server_url=config.base_url,
+            player_id=record.player_id,
+            player_name=record.name,
+            expiration_timestamp=record.expiration,
+            forward=config.forward,
+        )
+        if ledger:
+            ledger.record(record)
+        metrics.incr("backfill.granted")
+
+    for record in grants:
+        logger.info(
+            f"{config.dry_run=} backfilling VIP for {record.player_id} {record.name!r} {record.seeds} seeds, expires {record.expiration}"
+        )
+    if config.dry_run:
+        return grants
+
+    for idx in range(0, len(grants), batch_size):
+        if idx:
+            await trio.sleep(batch_delay)
+        async with trio.open_nursery() as nursery:
+            for record in grants[idx : idx + batch_size]:
+                nursery.start_soon(grant, record)
+
+    return grants
+
+
+async def run_backfill(
+    client: httpx.AsyncClient,
+    config: ServerConfig,
+    lines: Iterable[str],
+    start: datetime,
+    end: datetime,
+    population_dir: Path,
+    ledger: GrantLedger | None = None,
+    tolerance: timedelta = timedelta(minutes=15),
+    lookback: timedelta = timedelta(hours=6),
+    batch_size: int = 20,
+    batch_delay: float = 1.0,
+) -> list[GrantRecord]:
+    """Find the seeds missed between `start` and `end` and grant their VIP
+
+    Only seeds while the seeder wasn't recording to `population_dir` are backfilled and
+    seeds it recorded are skipped. The logs from `lookback` before `start` are read to
+    find out who was already online at `start`, players who joined before that are
+    missed
+
+    Raises ValueError instead of granting VIP if nothing was recorded in the range,
+    which usually means `population_dir` is wrong
+    """
+    series = load_range(population_dir, start, end)
+    if not len(series) and not config.dry_run:
+        raise ValueError(
+            f"No population records in {population_dir} between {start.isoformat()} and {end.isoformat()}, refusing to grant VIP without knowing when the seeder was running"
+        )
+
+    # Polls run late when CRCON is slow to respond
+    max_poll_time = max(
+        config.poll_time_seeding, config.poll_time_seeded, config.max_poll_time
+    )
+    gaps = recording_gaps(
+        series.timestamps, start.timestamp(), end.timestamp(), 2 * max_poll_time
+    )
+    live_seeds = [ts for ts, _ in seeder_counts(series)]
+    rewards: Counter[str] = Counter()
+    names: dict[str, str] = {}
+    missed = 0
+    for seed in find_missed_seeds(
+        replay_seeds(
+            config,
+            read_connection_events(lines, start - lookback, end),
+            until=end.timestamp(),
+            since=start.timestamp(),
+        ),
+        live_seeds,
+        tolerance,
+        gaps,
+    ):
+        missed += 1
+        rewards.update(seed.seeders)
+        names.update(seed.names)
+
+    logger.info(
+        f"Found {missed} missed seeds in {len(gaps)} gaps between {start.isoformat()} and {end.isoformat()}, {len(rewards)} players to reward"
+    )
+    return await grant_backfill(
+        client,
+        config,
+        rewards,
+        names,
+        ledger=ledger,
+        batch_size=batch_size,
+        batch_delay=batch_delay,
+    )
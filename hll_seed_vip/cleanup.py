@@ -0,0 +1,162 @@
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Final, NamedTuple
+
+import httpx
+import trio
+from loguru import logger
+
+from hll_seed_vip.config_watcher import ConfigWatcher
+from hll_seed_vip.io import get_vips, remove_vip
+from hll_seed_vip.leader import LeaderElector
+from hll_seed_vip.ledger import granted_player_ids
+from hll_seed_vip.log import summarize
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.models import ServerConfig, VipPlayer
+from hll_seed_vip.templates import template_pattern
+from hll_seed_vip.vip_index import VipIndex
+
+REPORT_SAMPLE_SIZE: Final = 20
+
+
+class CleanupCandidate(NamedTuple):
+    player_id: str
+    name: str
+    expiration_date: datetime
+    # name and/or ledger
+    matched_by: tuple[str, ...]
+
+
+def make_cleanup_index(
+    config: ServerConfig,
+    vips: dict[str, VipPlayer],
+    ledger_player_ids: set[str],
+) -> VipIndex:
+    pattern = None
+    if config.vip_cleanup_match in ("name", "both"):
+        pattern = template_pattern(config.player_name_not_current_vip)
+        if pattern is None:
+            logger.warning(
+                f"Can't match VIP names against {config.player_name_not_current_vip!r}, it would match every VIP"
+            )
+    if config.vip_cleanup_match == "name":
+        ledger_player_ids = set()
+
+    return VipIndex(vips, seed_name_pattern=pattern, seed_player_ids=ledger_player_ids)
+
+
+def find_expired_seed_vips(
+    config: ServerConfig,
+    vips: dict[str, VipPlayer],
+    ledger_player_ids: set[str],
+    now: datetime,
+) -> list[CleanupCandidate]:
+    """Return the expired VIP entries that were granted by this tool"""
+    index = make_cleanup_index(config, vips, ledger_player_ids)
+    return [
+        CleanupCandidate(
+            player_id=vip.player.player_id,
+            name=vip.player.name,
+            expiration_date=vip.expiration_date,
+            matched_by=index.seed_granted_by(vip),
+        )
+        for vip in index.seed_granted(end=now)
+        if vip.expiration_date is not None
+    ]
+
+
+def format_cleanup_report(
+    candidates: list[CleanupCandidate], total_vips: int, dry_run: bool
+) -> str:
+    action = "Would remove" if dry_run else "Removing"
+    lines = [f"{action} {len(candidates)} of {total_vips} VIP entries"]
+    if candidates:
+        lines.append(
+            f"Expired between {candidates[0].expiration_date.isoformat()} and {candidates[-1].expiration_date.isoformat()}"
+        )
+    for candidate in candidates[:REPORT_SAMPLE_SIZE]:
+        lines.append(
+            f"  {candidate.player_id} {candidate.name!r} expired {candidate.expiration_date.isoformat()} matched by {'/'.join(candidate.matched_by)}"
+        )
+    if len(candidates) > REPORT_SAMPLE_SIZE:
+        lines.append(f"  ... and {len(candidates) - REPORT_SAMPLE_SIZE} more")
+    return "\n".join(lines)
+
+
+async def remove_vips(
+    client: httpx.AsyncClient,
+    config: ServerConfig,
+    player_ids: list[str],
+) -> None:
+    """Remove VIP in concurrent batches, pausing between batches to spare CRCON"""
+    batch_size = config.vip_cleanup_batch_size
+    for idx in range(0, len(player_ids), batch_size):
+        if idx:
+            await trio.sleep(config.vip_cleanup_batch_delay)
+        batch = player_ids[idx : idx + batch_size]
+        async with trio.open_nursery() as nursery:
+            for player_id in batch:
+                nursery.start_soon(remove_vip, client, config.base_url, player_id)
+        metrics.incr("vip_cleanup.removed", len(batch))
+
+
+async def cleanup_expired_vips(
+    client: httpx.AsyncClient,
+    config: ServerConfig,
+    ledger_path: Path | None = None,
+) -> list[CleanupCandidate]:
+    """Report and (unless a dry run) remove expired VIP entries granted by this tool"""
+    vips = await get_vips(client, config.base_url)
+    ledger_player_ids = granted_player_ids(ledger_path) if ledger_path else set()
+    candidates = find_expired_seed_vips(
+        config=config,
+        vips=vips,
+        ledger_player_ids=ledger_player_ids,
+        now=datetime.now(tz=timezone.utc),
+    )
+
+    dry_run = config.dry_run or config.vip_cleanup_dry_run
+    logger.info(
+        format_cleanup_report(candidates, total_vips=len(vips), dry_run=dry_run)
+    )
+    if candidates and not dry_run:
+        await remove_vips(client, config, [c.player_id for c in candidates])
+        logger.opt(lazy=True).info(
+            "Removed expired VIP {}",
+            lambda: summarize([c.player_id for c in candidates]),
+        )
+
+    return candidates
+
+
+async def run_vip_cleanup(
+    client: httpx.AsyncClient,
+    config_watcher: ConfigWatcher,
+    ledger_path: Path | None = None,
+    leader: LeaderElector | None = None,
+    vip_lock: trio.Lock | None = None,
+) -> None:
+    """Run the cleanup every `vip_cleanup_interval` seconds while it's enabled
+
+    A failed cleanup is logged and retried next interval, it never stops the seeding.
+    Each cleanup holds `vip_lock` from fetching the VIP list until the last removal so
+    VIP granted while it runs (rewards hold the same lock) are never removed
+    """
+    while True:
+        config = config_watcher.config
+        await trio.sleep(config.vip_cleanup_interval)
+
+        config = config_watcher.config
+        if not config.vip_cleanup:
+            continue
+        if leader and not leader.is_leader:
+            logger.info("Not the leader, skipping VIP cleanup")
+            continue
+
+        try:
+            async with vip_lock or nullcontext():
+                await cleanup_expired_vips(client, config, ledger_path)
+        except Exception:
+            logger.exception("VIP cleanup failed")
+            metrics.incr("vip_cleanup.failed")
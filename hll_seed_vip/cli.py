@@ -1,43 +1,35 @@
+import argparse
+import json
 import os
 import sys
-from collections import defaultdict
+from contextlib import nullcontext
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
 from typing import Final
 
-import discord_webhook as discord
-import httpx
-import humanize
 import trio
 import yaml
 from loguru import logger
 
 from hll_seed_vip.constants import API_KEY, API_KEY_FORMAT
-from hll_seed_vip.io import get_gamestate, get_online_players, get_public_info, get_vips
-from hll_seed_vip.utils import (
-    calc_vip_expiration_timestamp,
-    collect_steam_ids,
-    filter_indefinite_vip_steam_ids,
-    filter_online_players,
-    get_next_player_bucket,
-    is_seeded,
-    load_config,
-    make_seed_announcement_embed,
-    message_players,
-    reward_players,
-)
+from hll_seed_vip.io import make_client
+from hll_seed_vip.ledger import GrantLedger
+from hll_seed_vip.log import setup_logging
+from hll_seed_vip.pipeline import serve_server
+from hll_seed_vip.shutdown import GracefulShutdown
+from hll_seed_vip.utils import activate_language, load_config
 
 CONFIG_FILE_NAME: Final = os.getenv("CONFIG_FILE_NAME", "config.yml")
 CONFIG_DIR: Final = os.getenv("CONFIG_DIR", "./config")
 LOG_FILE_NAME: Final = os.getenv("LOG_FILE_NAME", "seeding.log")
 LOG_DIR: Final = os.getenv("LOG_DIR", "./logs")
+POPULATION_DIR: Final = os.getenv("POPULATION_DIR", os.path.join(LOG_DIR, "population"))
+LEDGER_DIR: Final = os.getenv("LEDGER_DIR", os.path.join(LOG_DIR, "ledger"))
+STATE_DIR: Final = os.getenv("STATE_DIR", os.path.join(LOG_DIR, "state"))
+LEADER_DIR: Final = os.getenv("LEADER_DIR", os.path.join(LOG_DIR, "leader"))
 TAG_VERSION: Final = os.getenv("TAG_VERSION", "<unknown>")
 
 
-async def raise_on_4xx_5xx(response):
-    response.raise_for_status()
-
-
 async def main():
     api_key = os.getenv(API_KEY)
     headers = {"Authorization": API_KEY_FORMAT.format(api_key=api_key)}
@@ -45,258 +37,243 @@ async def main():
     if api_key is None:
         raise ValueError(f"{API_KEY} must be set")
 
+    config_path = Path(CONFIG_DIR).joinpath(CONFIG_FILE_NAME)
     try:
-        config = load_config(Path(CONFIG_DIR).joinpath(CONFIG_FILE_NAME))
+        config = load_config(config_path)
     except yaml.YAMLError as e:
         logger.error(f"Unable to parse your config file: {e}")
         sys.exit(1)
+    os.makedirs(STATE_DIR, exist_ok=True)
+
+    logger.info(f"{TAG_VERSION=} starting")
+    shutdown = GracefulShutdown()
     try:
-        if config.language:
-            logger.info(f"Attempting to activate language={config.language}")
-            humanize.activate(config.language)
-    except FileNotFoundError:
-        logger.error(
-            f"Unable to activate language={config.language}, defaulting to English"
-        )
+        async with trio.open_nursery() as nursery:
+            await nursery.start(shutdown.watch_signals)
+            await serve_server(
+                config_path,
+                config,
+                headers,
+                Path(POPULATION_DIR),
+                Path(LEADER_DIR),
+                Path(STATE_DIR).joinpath(f"{config_path.stem}.json"),
+                Path(LEDGER_DIR).joinpath(f"{config_path.stem}.jsonl"),
+                shutdown,
+            )
+            nursery.cancel_scope.cancel()
+    except* Exception as eg:
+        for e in eg.exceptions:
+            logger.exception(e)
+        raise
+
+
+def population_dir_for(config_path: Path) -> Path:
+    """Where the seeder records the population of the server in `config_path`
+
+    With --workers every server has its own directory named after its config file,
+    otherwise the population is recorded straight into POPULATION_DIR
+    """
+    server_dir = Path(POPULATION_DIR).joinpath(config_path.stem)
+    return server_dir if server_dir.is_dir() else Path(POPULATION_DIR)
+
+
+async def backfill(args: argparse.Namespace) -> None:
+    # Each subcommand imports its own modules so seeding starts as fast as possible
+    from hll_seed_vip.backfill import run_backfill
 
-    whs: list[discord.DiscordWebhook] = []
-    if config.discord_webhooks:
-        whs = [discord.DiscordWebhook(url=str(url)) for url in config.discord_webhooks]
-
-    async with httpx.AsyncClient(
-        headers=headers, event_hooks={"response": [raise_on_4xx_5xx]}
-    ) as client:
-        to_add_vip_steam_ids: set[str] = set()
-        no_reward_steam_ids: set[str] = set()
-        player_name_lookup: dict[str, str] = {}
-        prev_announced_bucket: int = 0
-        player_buckets = config.discord_seeding_player_buckets
-        if player_buckets:
-            next_player_bucket = player_buckets[0]
-        else:
-            next_player_bucket = None
-        last_bucket_announced = False
-        seeded_timestamp: datetime | None = None
-
-        gamestate = await get_gamestate(client, config.base_url)
-        is_seeding = not is_seeded(config=config, gamestate=gamestate)
-        try:
-            while True:
-                online_players = await get_online_players(client, config.base_url)
-                if online_players is None:
-                    logger.debug(
-                        f"Did not receive a usable result from `get_online_players`, continuing"
-                    )
-                    continue
-
-                gamestate = await get_gamestate(client, config.base_url)
-
-                if gamestate is None:
-                    logger.debug(
-                        f"Did not receive a usable result from `get_gamestate`, continuing"
-                    )
-                    continue
-
-                total_players = (
-                    gamestate.num_allied_players + gamestate.num_axis_players
-                )
+    api_key = os.getenv(API_KEY)
+    if api_key is None:
+        raise ValueError(f"{API_KEY} must be set")
 
-                player_name_lookup |= {
-                    p.player_id: p.name for p in online_players.players.values()
-                }
+    config_path = Path(args.config)
+    config = load_config(config_path)
+    if not args.apply:
+        config = config.model_copy(update={"dry_run": True})
+    activate_language(config.language)
 
-                logger.debug(
-                    f"{is_seeding=} {len(online_players.players.keys())} online players (`get_players`), {gamestate.num_allied_players} allied {gamestate.num_axis_players} axis players (gamestate)",
-                )
-                to_add_vip_steam_ids = collect_steam_ids(
-                    config=config,
-                    players=online_players,
-                    cum_steam_ids=to_add_vip_steam_ids,
+    headers = {"Authorization": API_KEY_FORMAT.format(api_key=api_key)}
+    fp = sys.stdin if args.logs == "-" else open(args.logs, encoding="utf8")
+    population_dir = population_dir_for(config_path)
+    ledger_path = Path(LEDGER_DIR).joinpath(f"{config_path.stem}.jsonl")
+    logger.info(
+        f"Backfilling {config.base_url} using the population in {population_dir}"
+    )
+    with fp, GrantLedger(ledger_path) if args.apply else nullcontext() as ledger:
+        async with make_client(config, headers) as client:
+            try:
+                grants = await run_backfill(
+                    client,
+                    config,
+                    fp,
+                    start=args.start,
+                    end=args.end,
+                    population_dir=population_dir,
+                    ledger=ledger,
+                    tolerance=timedelta(minutes=args.tolerance),
+                    lookback=timedelta(minutes=args.lookback),
+                    batch_size=args.batch_size,
+                    batch_delay=args.batch_delay,
                 )
+            except ValueError as e:
+                logger.error(e)
+                sys.exit(1)
+
+    action = "Granted" if args.apply else "Would grant (pass --apply to grant)"
+    logger.info(f"{action} VIP to {len(grants)} players")
+
+
+async def audit(args: argparse.Namespace) -> None:
+    from hll_seed_vip.audit import audit_rewards
+
+    api_key = os.getenv(API_KEY)
+    if api_key is None:
+        raise ValueError(f"{API_KEY} must be set")
+
+    config_path = Path(CONFIG_DIR).joinpath(CONFIG_FILE_NAME)
+    config = load_config(config_path)
+    ledger_path = (
+        Path(args.ledger)
+        if args.ledger
+        else Path(LEDGER_DIR).joinpath(f"{config_path.stem}.jsonl")
+    )
+
+    headers = {"Authorization": API_KEY_FORMAT.format(api_key=api_key)}
+    async with make_client(config, headers) as client:
+        report = await audit_rewards(
+            client, config, ledger_path, tolerance=timedelta(seconds=args.tolerance)
+        )
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        logger.info(f"Wrote the audit report to {args.output}")
+
+
+def parse_datetime(value: str) -> datetime:
+    """An ISO 8601 date/time, UTC unless it has a timezone"""
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 
-                # Server seeded
-                if is_seeding and is_seeded(config=config, gamestate=gamestate):
-                    seeded_timestamp = datetime.now(tz=timezone.utc)
-                    logger.info(f"Server seeded at {seeded_timestamp.isoformat()}")
-                    current_vips = await get_vips(client, config.base_url)
-
-                    # only include online players in the current_vips
-                    current_vips = filter_online_players(current_vips, online_players)
-
-                    # no vip reward needed for indefinite vip holders
-                    indefinite_vip_steam_ids = filter_indefinite_vip_steam_ids(
-                        current_vips
-                    )
-                    to_add_vip_steam_ids -= indefinite_vip_steam_ids
-
-                    # Players who were online when we seeded but didn't meet the criteria for VIP
-                    no_reward_steam_ids = {
-                        p.player_id for p in online_players.players.values()
-                    } - to_add_vip_steam_ids
-
-                    expiration_timestamps = defaultdict(
-                        lambda: calc_vip_expiration_timestamp(
-                            config=config,
-                            expiration=None,
-                            from_time=seeded_timestamp or datetime.now(tz=timezone.utc),
-                        )
-                    )
-                    for player in current_vips.values():
-                        expiration_timestamps[
-                            player.player.player_id
-                        ] = calc_vip_expiration_timestamp(
-                            config=config,
-                            expiration=player.expiration_date if player else None,
-                            from_time=seeded_timestamp,
-                        )
-
-                    # Add or update VIP in CRCON
-                    await reward_players(
-                        client=client,
-                        config=config,
-                        to_add_vip_steam_ids=to_add_vip_steam_ids,
-                        current_vips=current_vips,
-                        players_lookup=player_name_lookup,
-                        expiration_timestamps=expiration_timestamps,
-                    )
-
-                    # Message those who earned VIP
-                    await message_players(
-                        client=client,
-                        config=config,
-                        message=config.message_reward,
-                        steam_ids=to_add_vip_steam_ids,
-                        expiration_timestamps=expiration_timestamps,
-                    )
-
-                    # Message those who did not earn
-                    await message_players(
-                        client=client,
-                        config=config,
-                        message=config.message_non_vip,
-                        steam_ids=no_reward_steam_ids,
-                        expiration_timestamps=None,
-                    )
-
-                    # Post seeding complete Discord message
-                    if whs:
-                        public_info = await get_public_info(client, config.base_url)
-                        logger.debug(
-                            f"Making embed for `{config.discord_seeding_complete_message}`"
-                        )
-                        embed = make_seed_announcement_embed(
-                            message=config.discord_seeding_complete_message,
-                            current_map=public_info["current_map"]["map"][
-                                "pretty_name"
-                            ],
-                            time_remaining=gamestate.raw_time_remaining,
-                            player_count_message=config.discord_player_count_message,
-                            num_allied_players=gamestate.num_allied_players,
-                            num_axis_players=gamestate.num_axis_players,
-                        )
-                        if embed:
-                            for wh in whs:
-                                wh.add_embed(embed)
-                                wh.execute(remove_embeds=True)
-
-                    # Reset for next seed
-                    last_bucket_announced = False
-                    prev_announced_bucket = 0
-                    to_add_vip_steam_ids.clear()
-                    is_seeding = False
-                elif (
-                    not is_seeding
-                    and not is_seeded(config=config, gamestate=gamestate)
-                    and total_players > 0
-                ):
-                    delta: timedelta | None = None
-                    if seeded_timestamp:
-                        delta = datetime.now(tz=timezone.utc) - seeded_timestamp
-
-                    if not seeded_timestamp:
-                        logger.debug(
-                            f"Back in seeding: seeded_timestamp={seeded_timestamp} {delta=} {config.buffer=}"
-                        )
-                        is_seeding = True
-                    elif delta and (delta > config.buffer):
-                        logger.debug(
-                            f"Back in seeding: seeded_timestamp={seeded_timestamp.isoformat()} {delta=} delta > buffer {delta > config.buffer} {config.buffer=}"
-                        )
-                        is_seeding = True
-                    else:
-                        logger.info(
-                            f"Delaying seeding mode due to buffer of {config.buffer} > {delta} time since seeded"
-                        )
-
-                if is_seeding:
-                    sleep_time = config.poll_time_seeding
-
-                    # When we fall back into seeding with players still on the
-                    # server we want to announce the largest bucket possible or
-                    # it will announce from the smallest to the largest and spam
-                    # Discord with unneccessary announcements
-                    next_player_bucket = get_next_player_bucket(
-                        config.discord_seeding_player_buckets,
-                        total_players=total_players,
-                    )
-
-                    # Announce seeding progress
-                    logger.debug(
-                        f"whs={[wh.url for wh in whs]} {config.discord_seeding_player_buckets=} {total_players=} {prev_announced_bucket=} {next_player_bucket=} {last_bucket_announced=}"
-                    )
-                    if (
-                        whs
-                        and next_player_bucket
-                        and not last_bucket_announced
-                        and prev_announced_bucket < next_player_bucket
-                        and total_players >= next_player_bucket
-                    ):
-                        prev_announced_bucket = next_player_bucket
-
-                        public_info = await get_public_info(client, config.base_url)
-                        embed = make_seed_announcement_embed(
-                            message=config.discord_seeding_in_progress_message.format(
-                                player_count=total_players
-                            ),
-                            current_map=public_info["current_map"]["map"][
-                                "pretty_name"
-                            ],
-                            time_remaining=gamestate.raw_time_remaining,
-                            player_count_message=config.discord_player_count_message,
-                            num_allied_players=gamestate.num_allied_players,
-                            num_axis_players=gamestate.num_axis_players,
-                        )
-                        if (
-                            next_player_bucket
-                            == config.discord_seeding_player_buckets[-1]
-                        ):
-                            logger.debug(f"setting last_bucket_announced=True")
-                            last_bucket_announced = True
-
-                        if embed:
-                            for wh in whs:
-                                wh.add_embed(embed)
-                                wh.execute(remove_embeds=True)
-
-                else:
-                    sleep_time = config.poll_time_seeded
-
-                logger.info(f"{TAG_VERSION=} sleeping {sleep_time=}")
-                await trio.sleep(sleep_time)
-        except* Exception as eg:
-            for e in eg.exceptions:
-                logger.exception(e)
-            raise
+
+def supervise(num_workers: int, log_level: str) -> None:
+    from hll_seed_vip.supervisor import Supervisor, find_configs
+
+    if os.getenv(API_KEY) is None:
+        raise ValueError(f"{API_KEY} must be set")
+
+    config_paths = find_configs(Path(CONFIG_DIR))
+    if not config_paths:
+        logger.error(f"No config files found in {CONFIG_DIR}")
+        sys.exit(1)
+
+    logger.info(
+        f"{TAG_VERSION=} supervising {len(config_paths)} servers across {num_workers} workers"
+    )
+    Supervisor(
+        config_paths=config_paths,
+        num_workers=num_workers,
+        state_dir=Path(STATE_DIR),
+        population_dir=Path(POPULATION_DIR),
+        ledger_dir=Path(LEDGER_DIR),
+        leader_dir=Path(LEADER_DIR),
+        log_level=log_level,
+    ).run()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reward players with VIP for helping seed your Hell Let Loose server"
+    )
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report how long importing each dependency takes and exit",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Seed every config file in CONFIG_DIR, sharded across this many processes",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    backfill_parser = subparsers.add_parser(
+        "backfill",
+        help="Grant VIP for seeds missed while the seeder wasn't running",
+        description="Replay CRCON connection logs to find seeds the seeder missed and grant their VIP",
+    )
+    backfill_parser.add_argument(
+        "logs",
+        help="CRCON logs as JSON lines sorted oldest first, or - to read from stdin",
+    )
+    backfill_parser.add_argument(
+        "--config",
+        default=os.path.join(CONFIG_DIR, CONFIG_FILE_NAME),
+        help="The config file of the server to backfill, its population and ledger are found from its name",
+    )
+    backfill_parser.add_argument("--start", type=parse_datetime, required=True)
+    backfill_parser.add_argument("--end", type=parse_datetime, required=True)
+    backfill_parser.add_argument(
+        "--apply",
+        action="store_true",
+        help="Grant the VIP instead of only logging what would be granted",
+    )
+    backfill_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=15,
+        help="Skip seeds within this many minutes of a seed the seeder recorded",
+    )
+    backfill_parser.add_argument(
+        "--lookback",
+        type=float,
+        default=360,
+        help="Read the logs from this many minutes before --start to find who was already online",
+    )
+    backfill_parser.add_argument("--batch-size", type=int, default=20)
+    backfill_parser.add_argument("--batch-delay", type=float, default=1.0)
+    audit_parser = subparsers.add_parser(
+        "audit",
+        help="Compare the VIP granted by the seeder with the CRCON VIP list",
+        description="Report missing grants, double cumulative additions and wrong expirations as JSON",
+    )
+    audit_parser.add_argument(
+        "--ledger", help="The grant ledger to audit, the config's ledger by default"
+    )
+    audit_parser.add_argument(
+        "--output", default="-", help="Where to write the JSON report, - for stdout"
+    )
+    audit_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=300,
+        help="Ignore expirations that differ by less than this many seconds",
+    )
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        from hll_seed_vip.profiling import report_startup_profile
+
+        report_startup_profile()
+        sys.exit(0)
+
     os.makedirs(LOG_DIR, exist_ok=True)
     os.makedirs(CONFIG_DIR, exist_ok=True)
     # TODO: expose log retention/rotation as configurable options
-    logger.add(
-        Path(LOG_DIR).joinpath(LOG_FILE_NAME),
-        level=os.getenv("LOG_LEVEL", "DEBUG"),
-        rotation="10 MB",
-        retention="10 days",
-    )
-    trio.run(main)
+    log_level = os.getenv("LOG_LEVEL", "DEBUG")
+    sink = setup_logging(Path(LOG_DIR).joinpath(LOG_FILE_NAME), level=log_level)
+    try:
+        if args.command == "backfill":
+            trio.run(backfill, args)
+        elif args.command == "audit":
+            trio.run(audit, args)
+        elif args.workers:
+            supervise(args.workers, log_level)
+        else:
+            trio.run(main)
+    finally:
+        logger.info("Stopped")
+        # Write out any batched log messages before exiting
+        logger.remove()
+        sink.stop()
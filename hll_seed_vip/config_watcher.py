@@ -0,0 +1,106 @@
+from pathlib import Path
+from typing import Any, Final
+
+import trio
+import yaml
+from loguru import logger
+
+from hll_seed_vip.models import ServerConfig
+from hll_seed_vip.utils import load_config
+
+DEFAULT_POLL_INTERVAL: Final = 10
+# Only read when a server starts, i.e. by `make_client` for the http_ settings
+RESTART_REQUIRED_PREFIXES: Final = ("http_", "leader_", "status_api")
+RESTART_REQUIRED_FIELDS: Final = frozenset(
+    {
+        "shutdown_timeout",
+        "message_rate_limit",
+        "message_burst",
+        "message_dedup_window",
+        "message_queue_size",
+        "reward_sinks",
+    }
+)
+
+
+def needs_restart(field: str) -> bool:
+    return field in RESTART_REQUIRED_FIELDS or field.startswith(
+        RESTART_REQUIRED_PREFIXES
+    )
+
+
+def diff_configs(old: ServerConfig, new: ServerConfig) -> dict[str, tuple[Any, Any]]:
+    """Return the fields that changed between two configs as (old, new) pairs"""
+    old_values = old.model_dump()
+    new_values = new.model_dump()
+    return {
+        field: (old_values[field], new_values[field])
+        for field in new_values
+        if old_values.get(field) != new_values[field]
+    }
+
+
+class ConfigWatcher:
+    """Watch a config file by polling its mtime and reload it when it changes
+
+    The seeding loop picks up `config` at the start of each tick, so a new config is
+    only ever swapped in between ticks; invalid edits are logged and the current
+    config is kept
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        config: ServerConfig,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.config = config
+        self.poll_interval = poll_interval
+        self._mtime = self._get_mtime()
+
+    def _get_mtime(self) -> int | None:
+        try:
+            return self.path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def check(self) -> bool:
+        """Reload the config if the file changed, return True if a new config was loaded"""
+        mtime = self._get_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        try:
+            new_config = load_config(self.path)
+        except (
+            OSError,
+            KeyError,
+            TypeError,
+            AttributeError,
+            ValueError,
+            yaml.YAMLError,
+        ) as e:
+            logger.error(
+                f"Keeping the current config, unable to reload {self.path}: {e}"
+            )
+            return False
+
+        changes = diff_configs(self.config, new_config)
+        if not changes:
+            logger.debug(f"{self.path} was modified but no settings changed")
+            return False
+
+        for field, (old, new) in changes.items():
+            logger.info(f"Config changed {field}: {old!r} -> {new!r}")
+            if needs_restart(field):
+                logger.warning(f"{field} only takes effect after a restart")
+        self.config = new_config
+        return True
+
+    async def run(self) -> None:
+        logger.info(f"Watching {self.path} for changes every {self.poll_interval}s")
+        while True:
+            await trio.sleep(self.poll_interval)
+            self.check()
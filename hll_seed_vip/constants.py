@@ -10,3 +10,13 @@ INDEFINITE_VIP_DATE: Final = datetime(
     day=1,
     tzinfo=timezone.utc,
 )
+
+# Seconds, keyed by the final part of the CRCON endpoint path
+DEFAULT_HTTP_TIMEOUT: Final = 10.0
+DEFAULT_ENDPOINT_TIMEOUTS: Final = {
+    # The full VIP list can be very large
+    "get_vip_ids": 60.0,
+    "get_gamestate": 5.0,
+    "get_players": 10.0,
+    "get_public_info": 5.0,
+}
@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+
+class SeedForecaster:
+    """Double exponential (Holt) smoothing of the total player count
+
+    Keeps a smoothed player count and join rate that are updated in constant time
+    and memory every poll, poll intervals don't need to be evenly spaced
+    """
+
+    def __init__(self, alpha: float = 0.5, beta: float = 0.3) -> None:
+        if not (0 < alpha <= 1 and 0 < beta <= 1):
+            raise ValueError(f"{alpha=} and {beta=} must be in (0, 1]")
+        self.alpha = alpha
+        self.beta = beta
+        self.level: float | None = None
+        # players per second
+        self.trend: float = 0.0
+        self.last_update: float | None = None
+
+    def update(self, timestamp: float, total_players: int) -> None:
+        if self.level is None or self.last_update is None:
+            self.level = float(total_players)
+            self.last_update = timestamp
+            return
+
+        elapsed = timestamp - self.last_update
+        if elapsed <= 0:
+            return
+
+        prev_level = self.level
+        predicted = prev_level + self.trend * elapsed
+        self.level = self.alpha * total_players + (1 - self.alpha) * predicted
+        self.trend = (
+            self.beta * (self.level - prev_level) / elapsed
+            + (1 - self.beta) * self.trend
+        )
+        self.last_update = timestamp
+
+    @property
+    def players_per_second(self) -> float:
+        return self.trend
+
+    @property
+    def players_per_minute(self) -> float:
+        return self.trend * 60
+
+    def eta(self, remaining_players: int) -> timedelta | None:
+        """Return the estimated time until `remaining_players` more players join
+
+        None if players aren't joining
+        """
+        if remaining_players <= 0:
+            return timedelta(0)
+        if self.trend <= 0:
+            return None
+        return timedelta(seconds=remaining_players / self.trend)
+
+    def reset(self) -> None:
+        self.level = None
+        self.trend = 0.0
+        self.last_update = None
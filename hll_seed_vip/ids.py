@@ -0,0 +1,37 @@
+from typing import Final
+
+# Enough for the regulars of a busy server, later IDs are just not shared
+MAX_PLAYER_IDS: Final = 50_000
+
+
+class PlayerIdRegistry:
+    """Intern player IDs so each one is stored once per process
+
+    Every poll would otherwise create new copies of the same Steam/Windows IDs,
+    interned IDs are shared by every set and dict that holds them (across servers in a
+    worker too) and compare by identity before their contents
+
+    IDs are never removed so once `max_size` IDs are held new ones are returned as is
+    """
+
+    def __init__(self, max_size: int = MAX_PLAYER_IDS) -> None:
+        self.max_size = max_size
+        self._ids: dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, player_id: str) -> bool:
+        return player_id in self._ids
+
+    def intern(self, player_id: str) -> str:
+        """Return the canonical copy of `player_id`"""
+        canonical = self._ids.get(player_id)
+        if canonical is not None:
+            return canonical
+        if len(self._ids) < self.max_size:
+            self._ids[player_id] = player_id
+        return player_id
+
+
+player_ids = PlayerIdRegistry()
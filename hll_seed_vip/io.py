@@ -1,24 +1,159 @@
+import importlib.util
 import inspect
 import urllib.parse
 from datetime import datetime
 from functools import wraps
 from itertools import cycle
-from typing import Any
+from typing import Any, Callable
+from weakref import WeakKeyDictionary
 
 import httpx
 import trio
 from loguru import logger
 
+from hll_seed_vip.constants import DEFAULT_ENDPOINT_TIMEOUTS, DEFAULT_HTTP_TIMEOUT
+from hll_seed_vip.ids import player_ids
+from hll_seed_vip.jsonstream import iter_json_array
 from hll_seed_vip.models import (
     GameState,
     GameStateType,
     Player,
     PublicInfoType,
+    ServerConfig,
     ServerPopulation,
     VipPlayer,
 )
 
 
+async def raise_on_4xx_5xx(response: httpx.Response):
+    response.raise_for_status()
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+# The CountingTransport of each client made by `make_client`
+_counting_transports: WeakKeyDictionary[
+    httpx.AsyncClient, "CountingTransport"
+] = WeakKeyDictionary()
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close: Callable[[], None] | None = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close:
+                self._on_close()
+                self._on_close = None
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """Count the requests in flight through `transport`
+
+    A request is in flight until its response has been read and closed. Only the
+    public transport API is used so the counts survive httpx/httpcore upgrades
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_connections: int):
+        self.transport = transport
+        self.max_connections = max_connections
+        self.in_flight = 0
+
+    def _done(self) -> None:
+        self.in_flight -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self._done()
+            raise
+        assert isinstance(response.stream, httpx.AsyncByteStream)
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_CountedStream(response.stream, self._done),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def stats(self) -> dict[str, int]:
+        # Past max_connections requests wait for a connection (HTTP/1.1)
+        queued = max(0, self.in_flight - self.max_connections)
+        return {
+            "http.requests_active": self.in_flight - queued,
+            "http.requests_queued": queued,
+        }
+
+
+def make_client(
+    config: ServerConfig,
+    headers: dict[str, str],
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> httpx.AsyncClient:
+    """Return a client for CRCON with the configured pool limits and timeouts"""
+    timeouts = {**DEFAULT_ENDPOINT_TIMEOUTS, **config.http_timeouts}
+    default_timeout = timeouts.pop("default", DEFAULT_HTTP_TIMEOUT)
+    endpoint_timeouts = {
+        endpoint: httpx.Timeout(timeout).as_dict()
+        for endpoint, timeout in timeouts.items()
+    }
+
+    async def set_endpoint_timeout(request: httpx.Request):
+        endpoint = request.url.path.rstrip("/").rsplit("/", 1)[-1]
+        if endpoint in endpoint_timeouts:
+            request.extensions["timeout"] = endpoint_timeouts[endpoint]
+
+    http2 = config.http2
+    if http2 and not http2_available():
+        logger.warning(
+            "http2 is enabled but the h2 package is not installed, using HTTP/1.1"
+        )
+        http2 = False
+
+    if transport is None:
+        transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(
+                max_connections=config.http_max_connections,
+                max_keepalive_connections=config.http_max_keepalive_connections,
+                keepalive_expiry=config.http_keepalive_expiry,
+            ),
+            http2=http2,
+        )
+    counting_transport = CountingTransport(transport, config.http_max_connections)
+
+    client = httpx.AsyncClient(
+        headers=headers,
+        timeout=httpx.Timeout(default_timeout),
+        transport=counting_transport,
+        event_hooks={
+            "request": [set_endpoint_timeout],
+            "response": [raise_on_4xx_5xx],
+        },
+    )
+    _counting_transports[client] = counting_transport
+    return client
+
+
+def get_pool_stats(client: httpx.AsyncClient) -> dict[str, int]:
+    """Return the requests in flight for clients made by `make_client`"""
+    transport = _counting_transports.get(client)
+    return transport.stats() if transport else {}
+
+
 def with_backoff_retry():
     backoffs = (0, 1, 1.5, 2, 4, 8, 16)
 
@@ -62,22 +197,34 @@ async def get_vips(
     client: httpx.AsyncClient,
     server_url: str,
     endpoint="api/get_vip_ids",
+    player_filter: Callable[[str], bool] | None = None,
 ) -> dict[str, VipPlayer]:
+    """Return VIPs by player ID, only those `player_filter` accepts if it's set
+
+    The response is parsed as it streams in so only the VIPs being kept are ever held
+    in memory rather than the entire VIP list
+    """
     url = urllib.parse.urljoin(server_url, endpoint)
-    response = await client.get(url=url)
+    vips: dict[str, VipPlayer] = {}
+    async with client.stream("GET", url=url) as response:
+        async for vip in iter_json_array(response.aiter_text(), "result"):
+            player_id = vip["player_id"]
+            if player_filter:
+                if not player_filter(player_id):
+                    continue
+                # Only players we've seen, interning the whole VIP list would fill
+                # the registry with players who may never join
+                player_id = player_ids.intern(player_id)
+            vips[player_id] = VipPlayer(
+                player=Player(
+                    player_id=player_id,
+                    name=vip["name"],
+                    current_playtime_seconds=0,
+                ),
+                expiration_date=vip["vip_expiration"],
+            )
 
-    raw_vips = response.json()["result"]
-    return {
-        vip["player_id"]: VipPlayer(
-            player=Player(
-                player_id=vip["player_id"],
-                name=vip["name"],
-                current_playtime_seconds=0,
-            ),
-            expiration_date=vip["vip_expiration"],
-        )
-        for vip in raw_vips
-    }
+    return vips
 
 
 @with_backoff_retry()
@@ -106,10 +253,10 @@ async def get_online_players(
     players = {}
     for raw_player in result:
         name = raw_player["name"]
-        player_id = player_id = raw_player["player_id"]
+        player_id = player_ids.intern(raw_player["player_id"])
         if raw_player["profile"] is None:
             # Apparently CRCON will occasionally not return a player profile
-            logger.debug(f"No CRCON profile, skipping {raw_player}")
+            logger.debug("No CRCON profile, skipping {}", raw_player)
             continue
         current_playtime_seconds = raw_player["profile"]["current_playtime_seconds"]
         p = Player(
@@ -142,7 +289,7 @@ async def add_vip(
             expiration_timestamp.isoformat() if expiration_timestamp else None
         ),
     }
-    logger.debug(f"add_vip {url=} {body=}")
+    logger.debug("add_vip url={} body={}", url, body)
     response = await client.post(url=url, json=body)
     result = response.json()["result"]
     logger.info(
@@ -150,6 +297,21 @@ async def add_vip(
     )
 
 
+@with_backoff_retry()
+async def remove_vip(
+    client: httpx.AsyncClient,
+    server_url: str,
+    player_id: str,
+    endpoint="api/remove_vip",
+):
+    url = urllib.parse.urljoin(server_url, endpoint)
+    body = {"player_id": player_id}
+    logger.debug("remove_vip url={} body={}", url, body)
+    response = await client.post(url=url, json=body)
+    result = response.json()["result"]
+    logger.info(f"removed VIP for {player_id=} {result=}")
+
+
 @with_backoff_retry()
 async def message_player(
     client: httpx.AsyncClient,
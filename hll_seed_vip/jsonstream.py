@@ -0,0 +1,155 @@
+import json
+import re
+from typing import Any, AsyncIterator, Final
+
+WHITESPACE: Final = " \t\n\r"
+DELIMITERS: Final = WHITESPACE + ",:]}"
+_skip_whitespace = re.compile(r"[ \t\n\r]*").match
+# Consumed text is only dropped from the buffer once there's this much of it, so
+# trimming doesn't copy the buffer for every item
+TRIM_SIZE: Final = 64 * 1024
+
+
+class _Reader:
+    """A text buffer over an async stream of chunks that's refilled on demand"""
+
+    def __init__(self, chunks: AsyncIterator[str]) -> None:
+        self._chunks = chunks
+        self.buffer = ""
+        self.pos = 0
+        self.exhausted = False
+        # Set once an array item has been read so the next one must follow a comma
+        self.after_item = False
+
+    async def fill(self) -> bool:
+        """Read another chunk, return False if the stream is finished"""
+        if self.exhausted:
+            return False
+        try:
+            chunk = await anext(self._chunks)
+        except StopAsyncIteration:
+            self.exhausted = True
+            return False
+
+        if self.pos >= TRIM_SIZE:
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+        self.buffer += chunk
+        return True
+
+    async def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not await self.fill():
+                raise ValueError("Unexpected end of JSON")
+
+    async def expect(self, char: str) -> None:
+        found = await self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r} at {self.pos}")
+        self.pos += 1
+
+    async def value(self, decoder: json.JSONDecoder) -> Any:
+        """Decode the next complete JSON value, reading more until it's all there"""
+        await self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not await self.fill():
+                    raise
+                continue
+
+            # A number split across chunks (`10` then `.5`) decodes early, only a
+            # value followed by a delimiter is known to be complete
+            if (
+                end == len(self.buffer) or self.buffer[end] not in DELIMITERS
+            ) and await self.fill():
+                continue
+
+            self.pos = end
+            return value
+
+
+def _scan_items(reader: _Reader, decoder: json.JSONDecoder, items: list[Any]) -> bool:
+    """Decode every complete array item in the buffer, return True at the end of the array
+
+    `reader.pos` is left at the start of the next item or its separator, everything is
+    done without awaiting since this runs once per item in the VIP list
+    """
+    buffer = reader.buffer
+    pos = reader.pos
+    try:
+        while True:
+            pos = _skip_whitespace(buffer, pos).end()
+            if pos == len(buffer):
+                return False
+            if buffer[pos] == "]":
+                reader.pos = pos + 1
+                return True
+            if items or reader.after_item:
+                if buffer[pos] != ",":
+                    raise ValueError(f"Expected ',' but found {buffer[pos]!r} at {pos}")
+                pos = _skip_whitespace(buffer, pos + 1).end()
+                if pos == len(buffer):
+                    return False
+
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if reader.exhausted:
+                    raise
+                return False
+            if not reader.exhausted and (
+                end == len(buffer) or buffer[end] not in DELIMITERS
+            ):
+                return False
+
+            items.append(item)
+            reader.pos = pos = end
+    finally:
+        if items:
+            reader.after_item = True
+
+
+async def iter_json_array(chunks: AsyncIterator[str], key: str) -> AsyncIterator[Any]:
+    """Yield each item of the array at `key` in a streamed top level JSON object
+
+    Only the items from a single chunk are held in memory at a time, other keys are
+    decoded whole and discarded
+    """
+    decoder = json.JSONDecoder()
+    reader = _Reader(chunks)
+
+    await reader.expect("{")
+    if await reader.peek() == "}":
+        raise KeyError(key)
+
+    while True:
+        name = await reader.value(decoder)
+        await reader.expect(":")
+
+        if name == key:
+            if await reader.peek() != "[":
+                raise ValueError(
+                    f"{key!r} is not an array: {await reader.value(decoder)!r}"
+                )
+            reader.pos += 1
+            while True:
+                items: list[Any] = []
+                done = _scan_items(reader, decoder, items)
+                for item in items:
+                    yield item
+                if done:
+                    return
+                if not await reader.fill():
+                    raise ValueError("Unexpected end of JSON")
+
+        await reader.value(decoder)
+        if await reader.peek() == "}":
+            raise KeyError(key)
+        await reader.expect(",")
@@ -0,0 +1,206 @@
+import fcntl
+import os
+import re
+import socket
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import IO, Final
+
+import trio
+from loguru import logger
+
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.models import ServerConfig
+
+# The default SQLite lease database in the leader directory
+SQLITE_LEASE_FILE_NAME: Final = "leases.db"
+
+
+class LeaseBackend(ABC):
+    """Somewhere redundant instances can agree on which of them is the leader"""
+
+    @abstractmethod
+    def acquire(self, holder: str, lease_time: float) -> bool:
+        """Acquire or renew the lease for `holder`, return True if they hold it"""
+
+    @abstractmethod
+    def release(self, holder: str) -> None:
+        """Give up the lease if `holder` holds it"""
+
+
+class FileLockLease(LeaseBackend):
+    """An exclusive `flock` on a file, only works for instances on the same machine
+
+    The OS releases the lock as soon as the holder exits so the lease time isn't used
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._fp: IO | None = None
+
+    def acquire(self, holder: str, lease_time: float) -> bool:
+        if self._fp is not None:
+            return True
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fp = open(self.path, "a+")
+        try:
+            fcntl.flock(fp, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fp.close()
+            return False
+
+        fp.seek(0)
+        fp.truncate()
+        fp.write(holder)
+        fp.flush()
+        self._fp = fp
+        return True
+
+    def release(self, holder: str) -> None:
+        if self._fp is None:
+            return
+        fcntl.flock(self._fp, fcntl.LOCK_UN)
+        self._fp.close()
+        self._fp = None
+
+
+class SQLiteLease(LeaseBackend):
+    """A lease row with an expiration time in an SQLite database"""
+
+    def __init__(self, path: Path, name: str = "hll_seed_vip") -> None:
+        self.path = path
+        self.name = name
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None so BEGIN IMMEDIATE can be issued explicitly
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def acquire(self, holder: str, lease_time: float) -> bool:
+        # Wall clock time since the lease is shared between processes/machines
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT holder, expires_at FROM leases WHERE name = ?", (self.name,)
+            ).fetchone()
+            if row is not None and row[0] != holder and row[1] > now:
+                conn.execute("ROLLBACK")
+                return False
+
+            conn.execute(
+                "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                (self.name, holder, now + lease_time),
+            )
+            conn.execute("COMMIT")
+            return True
+        finally:
+            conn.close()
+
+    def release(self, holder: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, holder)
+            )
+
+
+def lease_path(config: ServerConfig, leader_dir: Path) -> Path:
+    """Where the lease for this server is kept, in `leader_dir` unless it's configured
+
+    Lock files default to one per server since only one holder can lock a file,
+    servers can share an SQLite database since each has its own lease row
+    """
+    if config.leader_lease_path:
+        return Path(config.leader_lease_path)
+    if config.leader_backend == "sqlite":
+        return leader_dir.joinpath(SQLITE_LEASE_FILE_NAME)
+    name = re.sub(r"[^A-Za-z0-9]+", "_", config.base_url).strip("_")
+    return leader_dir.joinpath(f"{name}.lock")
+
+
+def make_lease_backend(config: ServerConfig, leader_dir: Path) -> LeaseBackend:
+    path = lease_path(config, leader_dir)
+    if config.leader_backend == "sqlite":
+        # Servers can share a database, each with their own lease
+        return SQLiteLease(path, name=config.base_url)
+    return FileLockLease(path)
+
+
+class LeaderElector:
+    """Keep trying to acquire or renew a lease so only one instance acts
+
+    Leadership is only trusted until the lease would expire, so a leader that can't
+    renew in time stops acting before a standby can take over
+    """
+
+    def __init__(
+        self,
+        backend: LeaseBackend,
+        lease_time: float = 30,
+        renew_interval: float = 10,
+        holder: str | None = None,
+    ) -> None:
+        self.backend = backend
+        self.lease_time = lease_time
+        self.renew_interval = renew_interval
+        self.holder = holder or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4()}"
+        self._valid_until: float | None = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._valid_until is not None and time.monotonic() < self._valid_until
+
+    def try_acquire(self) -> bool:
+        was_leader = self.is_leader
+        # Measured before acquiring so the local lease never outlives the shared one
+        started = time.monotonic()
+        try:
+            if self.backend.acquire(self.holder, self.lease_time):
+                self._valid_until = started + self.lease_time
+            else:
+                self._valid_until = None
+        except (OSError, sqlite3.Error) as e:
+            # Keep leading until our lease runs out in case this is temporary
+            logger.error(f"Unable to acquire the leader lease: {e}")
+            if not self.is_leader:
+                self._valid_until = None
+
+        if self.is_leader != was_leader:
+            logger.info(
+                f"{self.holder} is now the {'leader' if self.is_leader else 'standby'}"
+            )
+        metrics.set("leader", int(self.is_leader))
+        return self.is_leader
+
+    def release(self) -> None:
+        if self._valid_until is not None:
+            self.backend.release(self.holder)
+            self._valid_until = None
+
+    async def run(self) -> None:
+        try:
+            while True:
+                await trio.to_thread.run_sync(self.try_acquire)
+                await trio.sleep(self.renew_interval)
+        finally:
+            self.release()
+
+
+def make_leader_elector(config: ServerConfig, leader_dir: Path) -> LeaderElector | None:
+    if not config.leader_election:
+        return None
+
+    return LeaderElector(
+        make_lease_backend(config, leader_dir),
+        lease_time=config.leader_lease_time,
+        renew_interval=config.leader_renew_interval,
+    )
@@ -0,0 +1,91 @@
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Iterator, NamedTuple
+
+from loguru import logger
+
+from hll_seed_vip.ids import player_ids
+
+
+class GrantRecord(NamedTuple):
+    player_id: str
+    name: str
+    expiration: datetime | None
+    granted_at: datetime
+    server_url: str
+    # How many seeds the grant is for, only backfills reward more than one at once
+    seeds: int = 1
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "player_id": self.player_id,
+                "name": self.name,
+                "expiration": self.expiration.isoformat() if self.expiration else None,
+                "granted_at": self.granted_at.isoformat(),
+                "server_url": self.server_url,
+                "seeds": self.seeds,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, line: str) -> "GrantRecord":
+        raw = json.loads(line)
+        return cls(
+            player_id=raw["player_id"],
+            name=raw["name"],
+            expiration=(
+                datetime.fromisoformat(raw["expiration"]) if raw["expiration"] else None
+            ),
+            granted_at=datetime.fromisoformat(raw["granted_at"]),
+            server_url=raw["server_url"],
+            seeds=raw.get("seeds", 1),
+        )
+
+
+class GrantLedger:
+    """An append only JSON lines record of every VIP granted by `reward_players`"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp: IO | None = open(self.path, "a", encoding="utf8")
+
+    def record(self, grant: GrantRecord) -> None:
+        if self._fp is None:
+            raise ValueError(f"{self.path} is closed")
+        self._fp.write(grant.to_json() + "\n")
+        self._fp.flush()
+
+    def close(self) -> None:
+        if self._fp:
+            self._fp.close()
+        self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_ledger(path: Path) -> Iterator[GrantRecord]:
+    """Yield every grant in the ledger, skipping lines that can't be parsed"""
+    try:
+        fp = open(path, encoding="utf8")
+    except FileNotFoundError:
+        return
+
+    with fp:
+        for line_no, line in enumerate(fp, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield GrantRecord.from_json(line)
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning(f"Skipping invalid ledger entry {path}:{line_no}: {e}")
+
+
+def granted_player_ids(path: Path) -> set[str]:
+    return {player_ids.intern(grant.player_id) for grant in read_ledger(path)}
@@ -0,0 +1,123 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Collection, Final, Mapping
+
+from loguru import logger
+
+# Only enough of a collection to be useful in logs, the full contents of large
+# collections (every VIP on the server) can dominate the cost of a seed
+SUMMARY_SAMPLE_SIZE: Final = 5
+# Messages at or above this level are written immediately instead of batched
+URGENT_LEVEL_NO: Final = logger.level("WARNING").no
+
+
+def summarize(items: Collection, sample_size: int = SUMMARY_SAMPLE_SIZE) -> str:
+    """Return the size of a collection and a small sample of it for logging"""
+    if len(items) <= sample_size:
+        return f"len={len(items)} {items!r}"
+
+    if isinstance(items, Mapping):
+        sample = {k: items[k] for _, k in zip(range(sample_size), items)}
+    else:
+        sample = [item for _, item in zip(range(sample_size), items)]
+    return f"len={len(items)} sample={sample!r}"
+
+
+class BatchingFileSink:
+    """A loguru sink that writes log messages from a background thread in batches
+
+    Messages are queued by the logging thread and written when `batch_size` messages
+    are waiting, `flush_interval` seconds have passed, or a WARNING or higher message
+    is logged. Files are rotated by size and old rotations are removed after `retention`
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        rotation_bytes: int = 10 * 1024 * 1024,
+        retention: timedelta = timedelta(days=10),
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.path = path
+        self.rotation_bytes = rotation_bytes
+        self.retention = retention
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._fp = open(self.path, "a", encoding="utf8")
+        self._queue: queue.SimpleQueue[tuple[str, bool] | None] = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, message) -> None:
+        record = getattr(message, "record", None)
+        urgent = record is not None and record["level"].no >= URGENT_LEVEL_NO
+        self._queue.put((str(message), urgent))
+
+    def stop(self) -> None:
+        """Write any queued messages and close the file"""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._fp.close()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            batch = [item[0]]
+            urgent = item[1]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not urgent:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item[0])
+                urgent = item[1]
+
+            self._write_batch("".join(batch))
+
+    def _write_batch(self, text: str) -> None:
+        if self._fp.tell() + len(text) > self.rotation_bytes and self._fp.tell() > 0:
+            self._rotate()
+        self._fp.write(text)
+        self._fp.flush()
+
+    def _rotate(self) -> None:
+        self._fp.close()
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f")
+        os.replace(
+            self.path,
+            self.path.with_name(f"{self.path.stem}.{timestamp}{self.path.suffix}"),
+        )
+        self._fp = open(self.path, "a", encoding="utf8")
+
+        cutoff = time.time() - self.retention.total_seconds()
+        for rotated in self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}"):
+            if rotated.stat().st_mtime < cutoff:
+                rotated.unlink(missing_ok=True)
+
+
+def setup_logging(path: Path, level: str) -> BatchingFileSink:
+    sink = BatchingFileSink(path)
+    logger.add(sink, level=level)
+    return sink
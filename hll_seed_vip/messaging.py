@@ -0,0 +1,195 @@
+from collections import deque
+from enum import IntEnum
+from typing import Final, NamedTuple
+
+import httpx
+import trio
+from loguru import logger
+
+from hll_seed_vip.io import message_player
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.models import ServerConfig
+
+
+class MessagePriority(IntEnum):
+    """Lower values are sent first"""
+
+    REWARD = 0
+    NON_VIP = 1
+
+
+# Only messages that say the same thing every seed are deduplicated
+DEDUP_PRIORITIES: Final = frozenset({MessagePriority.NON_VIP})
+
+
+class OutboundMessage(NamedTuple):
+    priority: MessagePriority
+    server_url: str
+    player_id: str
+    message: str
+
+
+class TokenBucket:
+    """Allow `rate` events per second on average with bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated: float | None = None
+
+    def _refill(self, now: float) -> None:
+        if self._updated is not None:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    async def take(self) -> None:
+        while True:
+            self._refill(trio.current_time())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await trio.sleep((1 - self.tokens) / self.rate)
+
+
+class MessageQueue:
+    """Outbound player messages sent in priority order at a limited rate
+
+    A player is only sent one non VIP message per `dedup_window` seconds so a server
+    hovering around the seeding thresholds doesn't message the same players every
+    seed. Reward messages are always sent since each one is for a new grant. When the
+    queue is full the newest lowest priority message is dropped
+    """
+
+    def __init__(
+        self,
+        rate_limit: float,
+        burst: int,
+        dedup_window: float,
+        max_size: int,
+    ) -> None:
+        self.bucket = TokenBucket(rate_limit, burst)
+        self.dedup_window = dedup_window
+        self.max_size = max_size
+        self._queues: dict[MessagePriority, deque[OutboundMessage]] = {
+            priority: deque() for priority in MessagePriority
+        }
+        # (player_id, priority): trio.current_time() when a deduplicated message was queued
+        self._recent: dict[tuple[str, MessagePriority], float] = {}
+        self._pruned_at = 0.0
+        self._wakeup = trio.Event()
+        self._closed = False
+
+    @classmethod
+    def from_config(cls, config: ServerConfig) -> "MessageQueue":
+        return cls(
+            rate_limit=config.message_rate_limit,
+            burst=config.message_burst,
+            dedup_window=config.message_dedup_window.total_seconds(),
+            max_size=config.message_queue_size,
+        )
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def put(self, message: OutboundMessage) -> bool:
+        """Queue a message, return False if it was deduplicated or dropped"""
+        if self._closed:
+            raise trio.ClosedResourceError("message queue is closed")
+
+        now = trio.current_time()
+        self._prune(now)
+        key = (message.player_id, message.priority)
+        dedup = message.priority in DEDUP_PRIORITIES
+        queued_at = self._recent.get(key) if dedup else None
+        if queued_at is not None and now - queued_at < self.dedup_window:
+            logger.info(
+                f"Not messaging {message.player_id}, already sent a {message.priority.name} message {now - queued_at:.0f}s ago"
+            )
+            metrics.incr("messages.deduplicated")
+            return False
+
+        if len(self) >= self.max_size:
+            lowest = max(p for p, queue in self._queues.items() if queue)
+            if lowest <= message.priority:
+                self._drop(message)
+                return False
+            evicted = self._queues[lowest].pop()
+            self._recent.pop((evicted.player_id, evicted.priority), None)
+            self._drop(evicted)
+
+        if dedup:
+            self._recent[key] = now
+        self._queues[message.priority].append(message)
+        self._wakeup.set()
+        metrics.set("messages.queue_depth", len(self))
+        return True
+
+    def _drop(self, message: OutboundMessage) -> None:
+        logger.warning(
+            f"Message queue is full, dropping {message.priority.name} message to {message.player_id}"
+        )
+        metrics.incr("messages.dropped")
+
+    def _prune(self, now: float) -> None:
+        if now - self._pruned_at < self.dedup_window:
+            return
+        self._recent = {
+            key: queued_at
+            for key, queued_at in self._recent.items()
+            if now - queued_at < self.dedup_window
+        }
+        self._pruned_at = now
+
+    def get_nowait(self) -> OutboundMessage | None:
+        for queue in self._queues.values():
+            if queue:
+                message = queue.popleft()
+                metrics.set("messages.queue_depth", len(self))
+                return message
+        return None
+
+    async def get(self) -> OutboundMessage | None:
+        """Wait for the next message, None once the queue is closed and empty"""
+        while (message := self.get_nowait()) is None:
+            if self._closed:
+                return None
+            self._wakeup = trio.Event()
+            await self._wakeup.wait()
+        return message
+
+    def close(self) -> None:
+        """Stop accepting messages, those already queued are still sent"""
+        self._closed = True
+        self._wakeup.set()
+
+
+async def send_messages(client: httpx.AsyncClient, queue: MessageQueue) -> None:
+    """Send queued messages until the queue is closed and empty
+
+    Messages still queued or being sent when this is cancelled are logged as unsent
+    """
+    sending: OutboundMessage | None = None
+    try:
+        while (sending := await queue.get()) is not None:
+            await queue.bucket.take()
+            await message_player(
+                client=client,
+                server_url=sending.server_url,
+                player_id=sending.player_id,
+                message=sending.message,
+            )
+            metrics.incr("messages.sent")
+            sending = None
+    except trio.Cancelled:
+        unsent = [sending] if sending else []
+        while (message := queue.get_nowait()) is not None:
+            unsent.append(message)
+        for message in unsent:
+            logger.error(
+                f"Cancelled before finishing: {message.priority.name} message to {message.player_id} was not sent"
+            )
+        metrics.incr("messages.unsent", len(unsent))
+        raise
@@ -0,0 +1,25 @@
+from collections import defaultdict
+
+
+class Metrics:
+    """In memory gauges and counters for the running seeder"""
+
+    def __init__(self) -> None:
+        self.gauges: dict[str, float] = {}
+        self.counters: defaultdict[str, int] = defaultdict(int)
+
+    def set(self, name: str, value: float) -> None:
+        self.gauges[name] = value
+
+    def incr(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def snapshot(self) -> dict[str, float]:
+        return {**self.gauges, **self.counters}
+
+    def clear(self) -> None:
+        self.gauges.clear()
+        self.counters.clear()
+
+
+metrics = Metrics()
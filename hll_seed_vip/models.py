@@ -1,10 +1,44 @@
+from bisect import bisect_right
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import TYPE_CHECKING, Any, Literal, TypedDict, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Final,
+    Literal,
+    NotRequired,
+    Sequence,
+    TypedDict,
+    Union,
+)
 
 import pydantic
 import typing_extensions
 
+from hll_seed_vip.templates import (
+    NO_FIELDS,
+    PLAYER_COUNT_FIELDS,
+    PLAYER_MESSAGE_FIELDS,
+    SEEDING_COMPLETE_FIELDS,
+    SEEDING_IN_PROGRESS_FIELDS,
+    VIP_NAME_FIELDS,
+    validate_template,
+)
+
+# The most players a server can have
+MAX_PLAYERS: Final = 100
+
+
+def make_bucket_lookup(
+    buckets: Sequence[int], max_players: int = MAX_PLAYERS
+) -> tuple[int | None, ...]:
+    """The largest of `buckets` reached at each player count, None if none are"""
+    buckets = sorted(buckets)
+    return tuple(
+        buckets[idx - 1] if (idx := bisect_right(buckets, total_players)) else None
+        for total_players in range(max(max_players, *buckets, 0) + 1)
+    )
+
 
 class ConfigTimeDeltaType(TypedDict):
     seconds: int
@@ -42,6 +76,67 @@ class ConfigDiscordType(TypedDict):
 class ConfigPlayerMessageType(TypedDict):
     reward: str
     non_vip: str
+    rate_limit: float
+    burst: int
+    dedup_window: ConfigTimeDeltaType
+    queue_size: int
+
+
+class ConfigHttpType(TypedDict):
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    http2: bool
+    timeouts: dict[str, float]
+
+
+class ConfigLeaderElectionType(TypedDict):
+    enabled: bool
+    backend: Literal["file", "sqlite"]
+    path: str
+    lease_time: int
+    renew_interval: int
+
+
+class ConfigVipCleanupType(TypedDict):
+    enabled: bool
+    dry_run: bool
+    match: Literal["name", "ledger", "both"]
+    interval: int
+    batch_size: int
+    batch_delay: float
+
+
+class ConfigStatusApiType(TypedDict):
+    enabled: bool
+    host: str
+    port: int
+    max_rewards: int
+
+
+class ConfigWatchdogType(TypedDict):
+    enabled: bool
+    stall_after: float
+    restart_tick: bool
+
+
+class ConfigAdaptivePollingType(TypedDict):
+    enabled: bool
+    min_poll_time: NotRequired[int]
+    max_poll_time: NotRequired[int]
+
+
+class ConfigRewardSinkType(TypedDict, total=False):
+    type: Literal["sqlite", "webhook", "discord_role"]
+    name: str
+    timeout: float
+    retries: int
+    queue_size: int
+    path: str
+    points: int
+    url: str
+    headers: dict[str, str]
+    role_id: str
 
 
 class ConfigType(TypedDict):
@@ -52,10 +147,52 @@ class ConfigType(TypedDict):
     dry_run: bool
     poll_time_seeding: int
     poll_time_seeded: int
+    shutdown_timeout: float
+    adaptive_polling: ConfigAdaptivePollingType
+    http: ConfigHttpType
+    leader_election: ConfigLeaderElectionType
+    vip_cleanup: ConfigVipCleanupType
+    status_api: ConfigStatusApiType
+    watchdog: ConfigWatchdogType
+    reward_sinks: list[ConfigRewardSinkType]
     requirements: ConfigRequirementsType
     vip_reward: ConfigVipRewardType
 
 
+class RewardSinkConfig(pydantic.BaseModel):
+    type: Literal["sqlite", "webhook", "discord_role"]
+    # defaults to `type`, must be unique
+    name: str | None = None
+    # seconds each attempt gets and how many times a failed attempt is retried
+    timeout: float = pydantic.Field(default=10, gt=0)
+    retries: int = pydantic.Field(default=3, ge=0)
+    # seeds waiting for a slow sink, more are dropped
+    queue_size: int = pydantic.Field(default=20, ge=1)
+
+    # sqlite
+    path: str | None = None
+    points: int = 1
+    # webhook and discord_role
+    url: pydantic.HttpUrl | None = None
+    headers: dict[str, str] = pydantic.Field(default_factory=dict)
+    # discord_role
+    role_id: str | None = None
+
+    @pydantic.model_validator(mode="after")
+    def has_required_fields(self):
+        required = {
+            "sqlite": ("path",),
+            "webhook": ("url",),
+            "discord_role": ("url", "role_id"),
+        }[self.type]
+        missing = [field for field in required if getattr(self, field) is None]
+        if missing:
+            raise ValueError(f"{self.type} reward sinks need {', '.join(missing)}")
+        if self.name is None:
+            self.name = self.type
+        return self
+
+
 class ServerConfig(pydantic.BaseModel):
     language: str | None
     base_url: str
@@ -70,6 +207,54 @@ class ServerConfig(pydantic.BaseModel):
     poll_time_seeding: int
     poll_time_seeded: int
 
+    # adaptive polling while seeding
+    adaptive_polling: bool = False
+    min_poll_time: int = pydantic.Field(default=10, ge=1)
+    max_poll_time: int = pydantic.Field(default=120, ge=1)
+
+    # seconds in-flight rewards and messages get to finish after SIGTERM/SIGINT
+    shutdown_timeout: float = pydantic.Field(default=30, ge=0)
+
+    # CRCON HTTP client
+    http_max_connections: int = pydantic.Field(default=10, ge=1)
+    http_max_keepalive_connections: int = pydantic.Field(default=5, ge=0)
+    http_keepalive_expiry: float = pydantic.Field(default=30, ge=0)
+    http2: bool = False
+    # seconds keyed by endpoint name (i.e. get_vip_ids), `default` for anything else
+    http_timeouts: dict[str, float] = pydantic.Field(default_factory=dict)
+
+    # only the instance holding the lease rewards players and posts to Discord
+    leader_election: bool = False
+    leader_backend: Literal["file", "sqlite"] = "file"
+    # None for the default of the backend, see `leader.lease_path`
+    leader_lease_path: str | None = None
+    leader_lease_time: int = pydantic.Field(default=30, ge=1)
+    leader_renew_interval: int = pydantic.Field(default=10, ge=1)
+
+    # removing expired VIP entries granted by this tool
+    vip_cleanup: bool = False
+    vip_cleanup_dry_run: bool = True
+    # identify granted entries by their `player_name_not_current_vip` name, the
+    # grant ledger or either one
+    vip_cleanup_match: Literal["name", "ledger", "both"] = "both"
+    vip_cleanup_interval: int = pydantic.Field(default=3600, ge=60)
+    vip_cleanup_batch_size: int = pydantic.Field(default=20, ge=1)
+    vip_cleanup_batch_delay: float = pydantic.Field(default=1.0, ge=0)
+
+    # read only HTTP API with the seeder's current state
+    status_api: bool = False
+    status_api_host: str = "127.0.0.1"
+    status_api_port: int = pydantic.Field(default=8080, ge=0, le=65535)
+    status_api_max_rewards: int = pydantic.Field(default=20, ge=1)
+
+    # detecting (and optionally restarting) a poll that never finishes
+    watchdog: bool = True
+    watchdog_stall_after: float = pydantic.Field(default=120, ge=1)
+    watchdog_restart_tick: bool = False
+
+    # rewarding seeders outside of CRCON, see `sinks.py`
+    reward_sinks: list[RewardSinkConfig] = pydantic.Field(default_factory=list)
+
     # player count conditions
     min_allies: int
     min_axis: int
@@ -83,6 +268,12 @@ class ServerConfig(pydantic.BaseModel):
     # player messages
     message_reward: str
     message_non_vip: str
+    # messages per second sent to CRCON and how many can be sent at once
+    message_rate_limit: float = pydantic.Field(default=5, gt=0)
+    message_burst: int = pydantic.Field(default=10, ge=1)
+    # how long before a player can be sent another message of the same kind
+    message_dedup_window: timedelta = timedelta(minutes=30)
+    message_queue_size: int = pydantic.Field(default=500, ge=1)
 
     # rewards
     forward: bool
@@ -92,11 +283,81 @@ class ServerConfig(pydantic.BaseModel):
     nice_time_delta: bool
     nice_expiration_date: bool
 
+    # discord_seeding_player_buckets indexed by player count, see `player_bucket`
+    _bucket_lookup: tuple[int | None, ...] = pydantic.PrivateAttr(default=())
+    _bucket_lookup_source: list[int] | None = pydantic.PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._build_bucket_lookup()
+
+    def _build_bucket_lookup(self) -> None:
+        self._bucket_lookup = make_bucket_lookup(self.discord_seeding_player_buckets)
+        self._bucket_lookup_source = self.discord_seeding_player_buckets
+
+    def player_bucket(self, total_players: int) -> int | None:
+        """The largest Discord player bucket reached with `total_players` players"""
+        # model_copy(update=...) skips model_post_init so the table may need rebuilding
+        if self._bucket_lookup_source is not self.discord_seeding_player_buckets:
+            self._build_bucket_lookup()
+        lookup = self._bucket_lookup
+        return lookup[min(max(total_players, 0), len(lookup) - 1)]
+
+    @pydantic.field_validator("discord_seeding_player_buckets")
+    @classmethod
+    def sorted_buckets(cls, v):
+        return sorted(v)
+
     @pydantic.field_validator("base_url")
     @classmethod
     def only_valid_urls(cls, v):
         return str(pydantic.HttpUrl(v))  # type: ignore
 
+    @pydantic.field_validator("message_reward")
+    @classmethod
+    def valid_player_message(cls, v):
+        return validate_template(v, PLAYER_MESSAGE_FIELDS)
+
+    @pydantic.field_validator("message_non_vip")
+    @classmethod
+    def valid_static_message(cls, v):
+        return validate_template(v, NO_FIELDS)
+
+    @pydantic.field_validator("discord_seeding_complete_message")
+    @classmethod
+    def valid_seeding_complete_message(cls, v):
+        return validate_template(v, SEEDING_COMPLETE_FIELDS)
+
+    @pydantic.field_validator("player_name_not_current_vip")
+    @classmethod
+    def valid_vip_name(cls, v):
+        return validate_template(v, VIP_NAME_FIELDS)
+
+    @pydantic.field_validator("discord_seeding_in_progress_message")
+    @classmethod
+    def valid_seeding_in_progress_message(cls, v):
+        return validate_template(v, SEEDING_IN_PROGRESS_FIELDS)
+
+    @pydantic.field_validator("discord_player_count_message")
+    @classmethod
+    def valid_player_count_message(cls, v):
+        return validate_template(v, PLAYER_COUNT_FIELDS)
+
+    @pydantic.field_validator("reward_sinks")
+    @classmethod
+    def unique_sink_names(cls, v):
+        names = [sink.name for sink in v]
+        if len(names) != len(set(names)):
+            raise ValueError(f"reward sink names must be unique: {names}")
+        return v
+
+    @pydantic.model_validator(mode="after")
+    def min_poll_time_le_max(self):
+        if self.min_poll_time > self.max_poll_time:
+            raise ValueError(
+                f"min_poll_time={self.min_poll_time} must be <= max_poll_time={self.max_poll_time}"
+            )
+        return self
+
 
 class Player(pydantic.BaseModel):
     name: str
@@ -309,6 +570,7 @@ class Layer(pydantic.BaseModel):
     game_mode: GameMode
     attackers: Union[Team, None] = None
     environment: Environment = Environment.DAY
+    image_url: str | None = None
 
     def __str__(self) -> str:
         return self.id
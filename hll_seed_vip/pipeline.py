@@ -0,0 +1,893 @@
+import json
+import os
+from collections import defaultdict
+from contextlib import ExitStack, nullcontext
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Final, NamedTuple
+
+import httpx
+import trio
+from loguru import logger
+
+from hll_seed_vip.cleanup import run_vip_cleanup
+from hll_seed_vip.config_watcher import ConfigWatcher
+from hll_seed_vip.forecast import SeedForecaster
+from hll_seed_vip.io import (
+    get_gamestate,
+    get_online_players,
+    get_pool_stats,
+    get_vips,
+    make_client,
+)
+from hll_seed_vip.leader import LeaderElector, make_leader_elector
+from hll_seed_vip.ledger import GrantLedger
+from hll_seed_vip.log import summarize
+from hll_seed_vip.messaging import MessagePriority, MessageQueue, send_messages
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.models import GameState, ServerConfig, ServerPopulation
+from hll_seed_vip.shutdown import GracefulShutdown, drain_nowait
+from hll_seed_vip.sinks import RewardSink, SeedReward, deliver, make_reward_sinks
+from hll_seed_vip.snapshot import SeederTracker
+from hll_seed_vip.status import RewardOutcome, StatusCache, serve_status
+from hll_seed_vip.timeseries import PopulationRecord, PopulationWriter
+from hll_seed_vip.utils import (
+    activate_language,
+    calc_adaptive_poll_time,
+    calc_vip_expiration_timestamp,
+    format_seeding_complete_message,
+    format_seeding_in_progress_message,
+    is_seeded,
+    layer_embed_assets,
+    make_seed_announcement_embed,
+    message_players,
+    players_until_seeded,
+    reward_players,
+)
+from hll_seed_vip.vip_index import VipIndex
+from hll_seed_vip.watchdog import Watchdog
+
+if TYPE_CHECKING:
+    import discord_webhook as discord
+
+SNAPSHOT_QUEUE_SIZE: Final = 4
+EVENT_QUEUE_SIZE: Final = 16
+
+
+class Snapshot(NamedTuple):
+    """Everything observed from CRCON in a single poll"""
+
+    config: ServerConfig
+    gamestate: GameState
+    players: ServerPopulation
+    timestamp: datetime
+    # trio.current_time() when the snapshot was taken
+    monotonic: float
+
+    @property
+    def total_players(self) -> int:
+        return self.gamestate.num_allied_players + self.gamestate.num_axis_players
+
+
+class SeededEvent(NamedTuple):
+    snapshot: Snapshot
+    seeded_timestamp: datetime
+    seeders: set[str]
+    names: dict[str, str]
+
+
+class BucketReachedEvent(NamedTuple):
+    snapshot: Snapshot
+    bucket: int
+    eta: timedelta | None
+
+
+class BackToSeedingEvent(NamedTuple):
+    snapshot: Snapshot
+
+
+Event = SeededEvent | BucketReachedEvent | BackToSeedingEvent
+
+
+class SeedingStateMachine:
+    """Turn snapshots into seeding events
+
+    Only tracks state and decides what happened, it never calls CRCON so it can't be
+    slowed down by the actions taken for each event
+    """
+
+    def __init__(self) -> None:
+        self.is_seeding: bool | None = None
+        self.seeded_timestamp: datetime | None = None
+        self.prev_announced_bucket: int = 0
+        self.last_bucket_announced = False
+        self.tracker = SeederTracker()
+        self.forecaster = SeedForecaster()
+        # How long the poller should wait before the next snapshot
+        self.sleep_time: int | None = None
+
+    def dump_state(self) -> dict[str, Any]:
+        """The state needed to pick up where we left off after a restart
+
+        Seeders aren't persisted, their play time is rebuilt from CRCON on the first poll
+        """
+        return {
+            "is_seeding": self.is_seeding,
+            "seeded_timestamp": (
+                self.seeded_timestamp.isoformat() if self.seeded_timestamp else None
+            ),
+            "prev_announced_bucket": self.prev_announced_bucket,
+            "last_bucket_announced": self.last_bucket_announced,
+        }
+
+    def load_state(self, state: dict[str, Any]) -> None:
+        self.is_seeding = state["is_seeding"]
+        self.seeded_timestamp = (
+            datetime.fromisoformat(state["seeded_timestamp"])
+            if state["seeded_timestamp"]
+            else None
+        )
+        self.prev_announced_bucket = state["prev_announced_bucket"]
+        self.last_bucket_announced = state["last_bucket_announced"]
+
+    def save(self, path: Path) -> None:
+        # Write then rename so a crash mid write can't leave a corrupt state file
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.dump_state()))
+        os.replace(tmp_path, path)
+
+    def restore(self, path: Path) -> bool:
+        """Load state saved by `save`, return False if there was none to load"""
+        try:
+            state = json.loads(path.read_text())
+            self.load_state(state)
+        except FileNotFoundError:
+            return False
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error(f"Ignoring invalid state file {path}: {e}")
+            return False
+
+        logger.info(f"Restored seeding state from {path}: {state}")
+        return True
+
+    def process(self, snapshot: Snapshot) -> list[Event]:
+        config = snapshot.config
+        gamestate = snapshot.gamestate
+        total_players = snapshot.total_players
+        events: list[Event] = []
+
+        if self.is_seeding is None:
+            self.is_seeding = not is_seeded(config=config, gamestate=gamestate)
+
+        self.forecaster.update(snapshot.monotonic, total_players)
+        population_delta = self.tracker.update(
+            config=config, players=snapshot.players, now=snapshot.monotonic
+        )
+
+        logger.debug(
+            "is_seeding={} {} online players (`get_players`) {} joined {} left, {} allied {} axis players (gamestate)",
+            self.is_seeding,
+            len(snapshot.players.players),
+            len(population_delta.joined),
+            len(population_delta.left),
+            gamestate.num_allied_players,
+            gamestate.num_axis_players,
+        )
+
+        # Server seeded
+        if self.is_seeding and is_seeded(config=config, gamestate=gamestate):
+            self.seeded_timestamp = snapshot.timestamp
+            logger.info(f"Server seeded at {self.seeded_timestamp.isoformat()}")
+            events.append(
+                SeededEvent(
+                    snapshot=snapshot,
+                    seeded_timestamp=self.seeded_timestamp,
+                    seeders=self.tracker.seeders(
+                        config=config, players=snapshot.players
+                    ),
+                    names=self.tracker.names,
+                )
+            )
+
+            # Reset for next seed
+            self.last_bucket_announced = False
+            self.prev_announced_bucket = 0
+            self.tracker.reset()
+            self.forecaster.reset()
+            self.is_seeding = False
+        elif (
+            not self.is_seeding
+            and not is_seeded(config=config, gamestate=gamestate)
+            and total_players > 0
+        ):
+            delta: timedelta | None = None
+            if self.seeded_timestamp:
+                delta = snapshot.timestamp - self.seeded_timestamp
+
+            if not self.seeded_timestamp:
+                logger.debug(
+                    f"Back in seeding: seeded_timestamp={self.seeded_timestamp} {delta=} {config.buffer=}"
+                )
+                self.is_seeding = True
+            elif delta and (delta > config.buffer):
+                logger.debug(
+                    f"Back in seeding: seeded_timestamp={self.seeded_timestamp.isoformat()} {delta=} delta > buffer {delta > config.buffer} {config.buffer=}"
+                )
+                self.is_seeding = True
+            else:
+                logger.info(
+                    f"Delaying seeding mode due to buffer of {config.buffer} > {delta} time since seeded"
+                )
+
+            if self.is_seeding:
+                events.append(BackToSeedingEvent(snapshot=snapshot))
+
+        if self.is_seeding:
+            self.sleep_time = calc_adaptive_poll_time(
+                config=config,
+                gamestate=gamestate,
+                players_per_second=self.forecaster.players_per_second,
+            )
+            bucket_event = self._check_player_bucket(snapshot)
+            if bucket_event:
+                events.append(bucket_event)
+        else:
+            self.sleep_time = config.poll_time_seeded
+
+        return events
+
+    def _check_player_bucket(self, snapshot: Snapshot) -> BucketReachedEvent | None:
+        config = snapshot.config
+        total_players = snapshot.total_players
+
+        # When we fall back into seeding with players still on the
+        # server we want to announce the largest bucket possible or
+        # it will announce from the smallest to the largest and spam
+        # Discord with unneccessary announcements
+        next_player_bucket = config.player_bucket(total_players)
+
+        logger.opt(lazy=True).debug(
+            "config.discord_seeding_player_buckets={} total_players={} prev_announced_bucket={} next_player_bucket={} last_bucket_announced={}",
+            lambda: config.discord_seeding_player_buckets,
+            lambda: total_players,
+            lambda: self.prev_announced_bucket,
+            lambda: next_player_bucket,
+            lambda: self.last_bucket_announced,
+        )
+        if not (
+            config.discord_webhooks
+            and next_player_bucket
+            and not self.last_bucket_announced
+            and self.prev_announced_bucket < next_player_bucket
+            and total_players >= next_player_bucket
+        ):
+            return None
+
+        self.prev_announced_bucket = next_player_bucket
+        if next_player_bucket == config.discord_seeding_player_buckets[-1]:
+            logger.debug(f"setting last_bucket_announced=True")
+            self.last_bucket_announced = True
+
+        return BucketReachedEvent(
+            snapshot=snapshot,
+            bucket=next_player_bucket,
+            eta=self.forecaster.eta(
+                players_until_seeded(config=config, gamestate=snapshot.gamestate)
+            ),
+        )
+
+
+def record_queue_depth(name: str, channel: Any) -> None:
+    metrics.set(
+        f"pipeline.{name}.queue_depth", channel.statistics().current_buffer_used
+    )
+
+
+class EventRouter:
+    """Fan events out to the workers subscribed to each event type
+
+    Workers that must see every event apply backpressure when their queue is full,
+    others have events dropped (and counted) so they can never hold up the pipeline
+    """
+
+    def __init__(self) -> None:
+        self._routes: defaultdict[
+            type, list[tuple[str, trio.MemorySendChannel, bool]]
+        ] = defaultdict(list)
+        self._channels: dict[str, trio.MemorySendChannel] = {}
+
+    def subscribe(
+        self,
+        name: str,
+        event_types: tuple[type, ...],
+        drop_when_full: bool = False,
+        queue_size: int = EVENT_QUEUE_SIZE,
+    ) -> trio.MemoryReceiveChannel:
+        send_channel, receive_channel = trio.open_memory_channel(queue_size)
+        self._channels[name] = send_channel
+        for event_type in event_types:
+            self._routes[event_type].append((name, send_channel, drop_when_full))
+        return receive_channel
+
+    async def publish(self, event: Event) -> None:
+        for name, channel, drop_when_full in self._routes[type(event)]:
+            if drop_when_full:
+                try:
+                    channel.send_nowait(event)
+                except trio.WouldBlock:
+                    logger.warning(f"{name} queue is full, dropping {type(event)}")
+                    metrics.incr(f"pipeline.{name}.dropped")
+            else:
+                await channel.send(event)
+            record_queue_depth(name, channel)
+
+    async def aclose(self) -> None:
+        for channel in self._channels.values():
+            await channel.aclose()
+
+
+async def poll_crcon(
+    client: httpx.AsyncClient,
+    config_watcher: ConfigWatcher,
+    state_machine: SeedingStateMachine,
+    send_channel: trio.MemorySendChannel,
+    shutdown: GracefulShutdown | None = None,
+    watchdog: Watchdog | None = None,
+) -> None:
+    """Take a snapshot of the server every poll regardless of what happens downstream
+
+    Polling stops when shutdown is requested, closing `send_channel` so the rest of
+    the pipeline can finish what's already been queued. The CRCON calls of each poll
+    are marked with `watchdog` so one that hangs is noticed
+    """
+    config = config_watcher.config
+    async with send_channel:
+        with shutdown.stop_on_request() if shutdown else nullcontext():
+            while True:
+                # None if the watchdog cancelled the poll
+                snapshot: Snapshot | None = None
+                with watchdog.tick() if watchdog else nullcontext():
+                    # Only swap configs between ticks
+                    if config_watcher.config is not config:
+                        if config_watcher.config.language != config.language:
+                            activate_language(config_watcher.config.language)
+                        config = config_watcher.config
+
+                    online_players = await get_online_players(client, config.base_url)
+                    if online_players is None:
+                        logger.debug(
+                            f"Did not receive a usable result from `get_online_players`, continuing"
+                        )
+                        continue
+
+                    gamestate = await get_gamestate(client, config.base_url)
+                    if gamestate is None:
+                        logger.debug(
+                            f"Did not receive a usable result from `get_gamestate`, continuing"
+                        )
+                        continue
+
+                    snapshot = Snapshot(
+                        config=config,
+                        gamestate=gamestate,
+                        players=online_players,
+                        timestamp=datetime.now(tz=timezone.utc),
+                        monotonic=trio.current_time(),
+                    )
+
+                # Outside the tick, waiting on a busy pipeline isn't a stalled poll
+                if snapshot is not None:
+                    await send_channel.send(snapshot)
+                    record_queue_depth("snapshots", send_channel)
+
+                pool_stats = get_pool_stats(client)
+                for name, value in pool_stats.items():
+                    metrics.set(name, value)
+                logger.debug("HTTP pool {}", pool_stats)
+
+                # The state machine may not have processed this snapshot yet, in which case
+                # the poll time from the previous snapshot is used
+                sleep_time = state_machine.sleep_time or config.poll_time_seeding
+                logger.info(
+                    f"sleeping {sleep_time=} players_per_minute={state_machine.forecaster.players_per_minute:.2f}"
+                )
+                await trio.sleep(sleep_time)
+
+
+async def process_snapshots(
+    state_machine: SeedingStateMachine,
+    population_writer: PopulationWriter,
+    receive_channel: trio.MemoryReceiveChannel,
+    router: EventRouter,
+    state_path: Path | None = None,
+    status: StatusCache | None = None,
+) -> None:
+    async with receive_channel:
+        async for snapshot in receive_channel:
+            record_queue_depth("snapshots", receive_channel)
+            prev_state = state_machine.dump_state()
+            events = state_machine.process(snapshot)
+            if state_path and state_machine.dump_state() != prev_state:
+                state_machine.save(state_path)
+            if status:
+                status.update(state_machine, snapshot)
+            seeded_event = next(
+                (event for event in events if isinstance(event, SeededEvent)), None
+            )
+
+            population_writer.append(
+                PopulationRecord(
+                    timestamp=snapshot.timestamp,
+                    num_allied_players=snapshot.gamestate.num_allied_players,
+                    num_axis_players=snapshot.gamestate.num_axis_players,
+                    num_online_players=len(snapshot.players.players),
+                    num_seeders=(
+                        len(seeded_event.seeders)
+                        if seeded_event
+                        else len(state_machine.tracker.eligible)
+                    ),
+                    is_seeding=bool(state_machine.is_seeding),
+                    seeded=seeded_event is not None,
+                )
+            )
+
+            for event in events:
+                await router.publish(event)
+
+    await router.aclose()
+
+
+class RewardProgress:
+    """What has been done so far for a seed so anything left undone can be reported"""
+
+    def __init__(self, event: SeededEvent) -> None:
+        self.event = event
+        # None until the VIP list has been checked
+        self.to_reward: set[str] | None = None
+        self.to_message: set[str] = set()
+        self.rewarded: set[str] = set()
+        # Messaged or queued, `send_messages` reports queued messages it never sent
+        self.messaged: set[str] = set()
+
+    def undone(self) -> list[str]:
+        seeded_at = self.event.seeded_timestamp.isoformat()
+        if self.to_reward is None:
+            return [
+                f"Seed at {seeded_at} was not rewarded, seeders {summarize(self.event.seeders)}"
+            ]
+
+        undone = []
+        if not_rewarded := self.to_reward - self.rewarded:
+            undone.append(
+                f"VIP was not granted for the seed at {seeded_at} to {summarize(not_rewarded)}"
+            )
+        if not_messaged := self.to_message - self.messaged:
+            undone.append(
+                f"Players were not messaged for the seed at {seeded_at} {summarize(not_messaged)}"
+            )
+        return undone
+
+
+async def reward_seeders(
+    client: httpx.AsyncClient,
+    event: SeededEvent,
+    ledger: GrantLedger | None = None,
+    progress: RewardProgress | None = None,
+    messages: MessageQueue | None = None,
+) -> RewardOutcome:
+    """Grant VIP to everyone who helped seed and message everyone online
+
+    If `messages` is set player messages are queued on it instead of sent right away
+    """
+    progress = progress or RewardProgress(event)
+    config = event.snapshot.config
+    online_players = event.snapshot.players
+    seeded_timestamp = event.seeded_timestamp
+    to_add_vip_steam_ids = set(event.seeders)
+
+    # Only the VIP status of online players and seeders matters
+    relevant_player_ids = online_players.players.keys() | to_add_vip_steam_ids
+    vip_index = VipIndex(
+        await get_vips(
+            client, config.base_url, player_filter=relevant_player_ids.__contains__
+        )
+    )
+
+    # only include online players in the current_vips
+    current_vips = vip_index.online(online_players)
+
+    # no vip reward needed for indefinite vip holders
+    skipped_indefinite = to_add_vip_steam_ids & vip_index.indefinite_player_ids()
+    to_add_vip_steam_ids -= skipped_indefinite
+
+    # Players who were online when we seeded but didn't meet the criteria for VIP
+    no_reward_steam_ids = {
+        p.player_id for p in online_players.players.values()
+    } - to_add_vip_steam_ids
+    progress.to_reward = set(to_add_vip_steam_ids)
+    progress.to_message = to_add_vip_steam_ids | no_reward_steam_ids
+
+    expiration_timestamps = defaultdict(
+        lambda: calc_vip_expiration_timestamp(
+            config=config,
+            expiration=None,
+            from_time=seeded_timestamp,
+        )
+    )
+    for player in current_vips.values():
+        expiration_timestamps[player.player.player_id] = calc_vip_expiration_timestamp(
+            config=config,
+            expiration=player.expiration_date if player else None,
+            from_time=seeded_timestamp,
+        )
+
+    # Add or update VIP in CRCON
+    await reward_players(
+        client=client,
+        config=config,
+        to_add_vip_steam_ids=to_add_vip_steam_ids,
+        current_vips=current_vips,
+        players_lookup=event.names,
+        expiration_timestamps=expiration_timestamps,
+        ledger=ledger,
+        done=progress.rewarded,
+    )
+
+    # Message those who earned VIP
+    await message_players(
+        client=client,
+        config=config,
+        message=config.message_reward,
+        steam_ids=to_add_vip_steam_ids,
+        expiration_timestamps=expiration_timestamps,
+        done=progress.messaged,
+        queue=messages,
+        priority=MessagePriority.REWARD,
+    )
+
+    # Message those who did not earn
+    await message_players(
+        client=client,
+        config=config,
+        message=config.message_non_vip,
+        steam_ids=no_reward_steam_ids,
+        expiration_timestamps=None,
+        done=progress.messaged,
+        queue=messages,
+        priority=MessagePriority.NON_VIP,
+    )
+
+    return RewardOutcome(
+        seeded_timestamp=seeded_timestamp,
+        rewarded=sorted(to_add_vip_steam_ids),
+        skipped_indefinite=sorted(skipped_indefinite),
+        not_rewarded=len(no_reward_steam_ids),
+        dry_run=config.dry_run,
+    )
+
+
+def is_standby(leader: LeaderElector | None, event: Event) -> bool:
+    if leader is None or leader.is_leader:
+        return False
+    logger.info(f"Not the leader, skipping {type(event).__name__}")
+    return True
+
+
+async def reward_worker(
+    client: httpx.AsyncClient,
+    receive_channel: trio.MemoryReceiveChannel,
+    leader: LeaderElector | None = None,
+    ledger: GrantLedger | None = None,
+    status: StatusCache | None = None,
+    messages: MessageQueue | None = None,
+    vip_lock: trio.Lock | None = None,
+) -> None:
+    """Reward each seed, closing `messages` once there's nothing left to reward
+
+    `vip_lock` is held while rewarding so a VIP cleanup can't remove the new VIP
+    """
+    progress: RewardProgress | None = None
+    async with receive_channel:
+        try:
+            async for event in receive_channel:
+                record_queue_depth("rewards", receive_channel)
+                if not is_standby(leader, event):
+                    progress = RewardProgress(event)
+                    async with vip_lock or nullcontext():
+                        outcome = await reward_seeders(
+                            client, event, ledger, progress, messages
+                        )
+                    progress = None
+                    if status:
+                        status.record_reward(outcome)
+        except trio.Cancelled:
+            log_undone_rewards(progress, receive_channel)
+            raise
+        finally:
+            if messages:
+                messages.close()
+
+
+def log_undone_rewards(
+    progress: RewardProgress | None, receive_channel: trio.MemoryReceiveChannel
+) -> None:
+    """Log the rewards that were cut off and those that never started"""
+    undone = progress.undone() if progress else []
+    for event in drain_nowait(receive_channel):
+        undone.extend(RewardProgress(event).undone())
+    for line in undone:
+        logger.error(f"Cancelled before finishing: {line}")
+    metrics.incr("pipeline.rewards.unfinished", len(undone))
+
+
+async def announce(client: httpx.AsyncClient, event: Event) -> None:
+    """Post a seeding progress or seeding complete Discord message"""
+    snapshot = event.snapshot
+    config = snapshot.config
+    gamestate = snapshot.gamestate
+
+    if isinstance(event, SeededEvent):
+        logger.debug(f"Making embed for `{config.discord_seeding_complete_message}`")
+        message = format_seeding_complete_message(
+            config.discord_seeding_complete_message,
+            player_count=snapshot.total_players,
+        )
+    elif isinstance(event, BucketReachedEvent):
+        message = format_seeding_in_progress_message(
+            config.discord_seeding_in_progress_message,
+            player_count=snapshot.total_players,
+            eta=event.eta,
+        )
+    else:
+        return
+
+    # The map comes from the snapshot's gamestate, no need to ask CRCON again
+    assets = layer_embed_assets(gamestate.current_map)
+    embed = make_seed_announcement_embed(
+        message=message,
+        current_map=assets.map_name,
+        time_remaining=gamestate.raw_time_remaining,
+        player_count_message=config.discord_player_count_message,
+        num_allied_players=gamestate.num_allied_players,
+        num_axis_players=gamestate.num_axis_players,
+        image_url=assets.image_url,
+    )
+    if not embed:
+        return
+
+    # discord_webhook uses requests which would block the event loop
+    for wh in make_webhooks(config):
+        wh.add_embed(embed)
+        await trio.to_thread.run_sync(lambda: wh.execute(remove_embeds=True))
+
+
+async def discord_worker(
+    client: httpx.AsyncClient,
+    receive_channel: trio.MemoryReceiveChannel,
+    leader: LeaderElector | None = None,
+) -> None:
+    async with receive_channel:
+        try:
+            async for event in receive_channel:
+                record_queue_depth("discord", receive_channel)
+                if event.snapshot.config.discord_webhooks and not is_standby(
+                    leader, event
+                ):
+                    await announce(client, event)
+        except trio.Cancelled:
+            for event in drain_nowait(receive_channel):
+                logger.error(
+                    f"Cancelled before announcing {type(event).__name__} from {event.snapshot.timestamp.isoformat()}"
+                )
+            raise
+
+
+async def sink_worker(
+    sink: RewardSink,
+    receive_channel: trio.MemoryReceiveChannel,
+    leader: LeaderElector | None = None,
+) -> None:
+    """Reward each seed through `sink`, separately from the CRCON rewards"""
+    async with receive_channel:
+        try:
+            async for event in receive_channel:
+                record_queue_depth(f"sink.{sink.name}", receive_channel)
+                if is_standby(leader, event):
+                    continue
+                config = event.snapshot.config
+                reward = SeedReward(
+                    server_url=config.base_url,
+                    seeded_timestamp=event.seeded_timestamp,
+                    players={
+                        player_id: event.names.get(player_id, "")
+                        for player_id in sorted(event.seeders)
+                    },
+                )
+                if config.dry_run:
+                    logger.info(
+                        f"{config.dry_run=} not rewarding {summarize(reward.players)} through the {sink.name} sink"
+                    )
+                    continue
+                await deliver(sink, reward)
+        except trio.Cancelled:
+            for event in drain_nowait(receive_channel):
+                logger.error(
+                    f"Cancelled before rewarding the seed from {event.seeded_timestamp.isoformat()} through the {sink.name} sink"
+                )
+            raise
+        finally:
+            with trio.CancelScope(shield=True):
+                await sink.aclose()
+
+
+def make_webhooks(config: ServerConfig) -> list["discord.DiscordWebhook"]:
+    if not config.discord_webhooks:
+        return []
+
+    # discord_webhook pulls in requests, only import it if Discord is enabled
+    import discord_webhook as discord
+
+    return [discord.DiscordWebhook(url=str(url)) for url in config.discord_webhooks]
+
+
+async def run_pipeline(
+    client: httpx.AsyncClient,
+    config_watcher: ConfigWatcher,
+    population_writer: PopulationWriter,
+    state_path: Path | None = None,
+    leader: LeaderElector | None = None,
+    ledger: GrantLedger | None = None,
+    status: StatusCache | None = None,
+    shutdown: GracefulShutdown | None = None,
+    watchdog: Watchdog | None = None,
+    sinks: list[RewardSink] | None = None,
+    vip_lock: trio.Lock | None = None,
+) -> None:
+    """Run the poller, state machine and action workers connected by bounded queues
+
+    If `state_path` is set the seeding state is saved there whenever it changes and
+    restored from it on start. If `leader` is set, actions are only taken while it
+    holds the lease, a standby keeps polling so it's ready to take over. Returns once
+    every queue has been worked through after `shutdown` is requested
+
+    Each of `sinks` gets its own queue that drops seeds when full, so a slow sink
+    never holds up the CRCON rewards or the other sinks
+    """
+    state_machine = SeedingStateMachine()
+    if state_path:
+        state_machine.restore(state_path)
+    router = EventRouter()
+    reward_channel = router.subscribe("rewards", (SeededEvent,))
+    discord_channel = router.subscribe(
+        "discord", (SeededEvent, BucketReachedEvent), drop_when_full=True
+    )
+    snapshot_send, snapshot_receive = trio.open_memory_channel[Snapshot](
+        SNAPSHOT_QUEUE_SIZE
+    )
+    sink_channels = [
+        (
+            sink,
+            router.subscribe(
+                f"sink.{sink.name}",
+                (SeededEvent,),
+                drop_when_full=True,
+                queue_size=sink.config.queue_size,
+            ),
+        )
+        for sink in sinks or []
+    ]
+    messages = MessageQueue.from_config(config_watcher.config)
+
+    async with trio.open_nursery() as nursery:
+        nursery.start_soon(
+            poll_crcon,
+            client,
+            config_watcher,
+            state_machine,
+            snapshot_send,
+            shutdown,
+            watchdog,
+        )
+        nursery.start_soon(
+            process_snapshots,
+            state_machine,
+            population_writer,
+            snapshot_receive,
+            router,
+            state_path,
+            status,
+        )
+        nursery.start_soon(
+            reward_worker,
+            client,
+            reward_channel,
+            leader,
+            ledger,
+            status,
+            messages,
+            vip_lock,
+        )
+        nursery.start_soon(send_messages, client, messages)
+        nursery.start_soon(discord_worker, client, discord_channel, leader)
+        for sink, sink_channel in sink_channels:
+            nursery.start_soon(sink_worker, sink, sink_channel, leader)
+
+
+async def serve_server(
+    config_path: Path,
+    config: ServerConfig,
+    headers: dict[str, str],
+    population_dir: Path,
+    leader_dir: Path,
+    state_path: Path | None = None,
+    ledger_path: Path | None = None,
+    shutdown: GracefulShutdown | None = None,
+) -> None:
+    """Seed a single server until cancelled or `shutdown` is requested
+
+    Leader election leases are kept in `leader_dir` unless the config sets a path
+
+    After a shutdown request, in-flight rewards and messages get `shutdown_timeout`
+    seconds to finish before they're cancelled
+    """
+    shutdown = shutdown or GracefulShutdown()
+    activate_language(config.language)
+    config_watcher = ConfigWatcher(config_path, config)
+    leader = make_leader_elector(config, leader_dir)
+    watchdog = Watchdog()
+    # Keeps the VIP cleanup from removing VIP while seeders are being rewarded
+    vip_lock = trio.Lock()
+    with ExitStack() as stack:
+        population_writer = stack.enter_context(PopulationWriter(population_dir))
+        ledger = stack.enter_context(GrantLedger(ledger_path)) if ledger_path else None
+        async with make_client(
+            config, headers
+        ) as client, trio.open_nursery() as nursery:
+            nursery.start_soon(config_watcher.run)
+            nursery.start_soon(watchdog.run, config_watcher)
+            if leader:
+                nursery.start_soon(leader.run)
+            nursery.start_soon(
+                run_vip_cleanup, client, config_watcher, ledger_path, leader, vip_lock
+            )
+            status = None
+            if config.status_api:
+                status = StatusCache(
+                    max_rewards=config.status_api_max_rewards, watchdog=watchdog
+                )
+                await nursery.start(
+                    serve_status,
+                    status,
+                    config.status_api_host,
+                    config.status_api_port,
+                    # Unhealthy once a few polls have been missed
+                    3
+                    * max(
+                        config.poll_time_seeding,
+                        config.poll_time_seeded,
+                        config.max_poll_time,
+                    ),
+                )
+            with shutdown.drain_within(config.shutdown_timeout) as drain_scope:
+                await run_pipeline(
+                    client,
+                    config_watcher,
+                    population_writer,
+                    state_path,
+                    leader,
+                    ledger,
+                    status,
+                    shutdown,
+                    watchdog,
+                    make_reward_sinks(config),
+                    vip_lock,
+                )
+            if drain_scope.cancelled_caught:
+                logger.error(
+                    f"{config.base_url} didn't finish its in-flight work within {config.shutdown_timeout}s"
+                )
+            else:
+                logger.info(f"{config.base_url} finished its in-flight work")
+            # Only stops the leader lease, config watcher and status API once the
+            # rewards are done so they stay up while draining
+            nursery.cancel_scope.cancel()
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+from typing import Final, NamedTuple
+
+from loguru import logger
+
+STARTUP_MODULE: Final = "hll_seed_vip.cli"
+
+
+class ImportTiming(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(output: str) -> list[ImportTiming]:
+    """Parse the stderr output of `python -X importtime`"""
+    timings: list[ImportTiming] = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        if not self_us.strip().isdigit():
+            # the header line
+            continue
+        module = name.strip()
+        timings.append(
+            ImportTiming(
+                module=module,
+                self_us=int(self_us),
+                cumulative_us=int(cumulative_us),
+                depth=(len(name) - len(name.lstrip()) - 1) // 2,
+            )
+        )
+    return timings
+
+
+def profile_startup(module: str = STARTUP_MODULE) -> list[ImportTiming]:
+    """Import `module` in a fresh interpreter and return the import timings"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)},
+        check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def report_startup_profile(module: str = STARTUP_MODULE, top: int = 15) -> None:
+    timings = profile_startup(module)
+    total = next((t for t in reversed(timings) if t.module == module), None)
+    if total:
+        logger.info(f"Importing {module} took {total.cumulative_us / 1000:.1f}ms")
+
+    # Only the modules imported directly (by us or the interpreter) are worth reporting
+    top_level = sorted(
+        (t for t in timings if t.depth <= 1 and t.module != module),
+        key=lambda t: t.cumulative_us,
+        reverse=True,
+    )
+    for timing in top_level[:top]:
+        logger.info(
+            f"{timing.cumulative_us / 1000:>8.1f}ms {timing.self_us / 1000:>8.1f}ms self  {timing.module}"
+        )
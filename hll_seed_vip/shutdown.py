@@ -0,0 +1,79 @@
+import signal
+from contextlib import contextmanager
+from typing import Iterator
+
+import trio
+from loguru import logger
+
+SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class GracefulShutdown:
+    """Stop polling on SIGTERM/SIGINT and give in-flight work time to finish
+
+    Polling stops as soon as shutdown is requested which closes the snapshot queue,
+    every stage then works through what's left in its queue and closes the next one.
+    Work still running `timeout` seconds after the request is cancelled
+
+    A single instance is shared by every server in a process since only one signal
+    receiver gets each signal
+    """
+
+    def __init__(self) -> None:
+        self.requested = trio.Event()
+        self._stop_scopes: list[trio.CancelScope] = []
+        self._drain_scopes: list[tuple[trio.CancelScope, float]] = []
+
+    def request(self, reason: str) -> None:
+        if self.requested.is_set():
+            return
+
+        logger.warning(f"{reason}, stopping once in-flight work is finished")
+        self.requested.set()
+        for scope in self._stop_scopes:
+            scope.cancel()
+        for scope, timeout in self._drain_scopes:
+            scope.deadline = trio.current_time() + timeout
+
+    @contextmanager
+    def stop_on_request(self) -> Iterator[trio.CancelScope]:
+        """Cancel the block as soon as shutdown is requested"""
+        scope = trio.CancelScope()
+        if self.requested.is_set():
+            scope.cancel()
+        self._stop_scopes.append(scope)
+        try:
+            with scope:
+                yield scope
+        finally:
+            self._stop_scopes.remove(scope)
+
+    @contextmanager
+    def drain_within(self, timeout: float) -> Iterator[trio.CancelScope]:
+        """Cancel the block `timeout` seconds after shutdown is requested"""
+        scope = trio.CancelScope()
+        if self.requested.is_set():
+            scope.deadline = trio.current_time() + timeout
+        self._drain_scopes.append((scope, timeout))
+        try:
+            with scope:
+                yield scope
+        finally:
+            self._drain_scopes.remove((scope, timeout))
+
+    async def watch_signals(self, task_status=trio.TASK_STATUS_IGNORED) -> None:
+        """Request shutdown on SIGTERM or SIGINT, must run in the main thread"""
+        with trio.open_signal_receiver(*SIGNALS) as signals:
+            task_status.started()
+            async for signum in signals:
+                self.request(f"Received {signal.Signals(signum).name}")
+
+
+def drain_nowait(receive_channel: trio.MemoryReceiveChannel) -> list:
+    """Take everything currently waiting in a channel without blocking"""
+    items = []
+    while True:
+        try:
+            items.append(receive_channel.receive_nowait())
+        except (trio.WouldBlock, trio.EndOfChannel, trio.ClosedResourceError):
+            return items
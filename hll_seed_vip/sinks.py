@@ -0,0 +1,184 @@
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Final, NamedTuple
+
+import httpx
+import trio
+from loguru import logger
+
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.models import RewardSinkConfig, ServerConfig
+
+# Seconds to wait before each retry, the last one is repeated
+RETRY_BACKOFFS: Final = (1, 2, 4, 8, 16)
+
+
+class SeedReward(NamedTuple):
+    server_url: str
+    seeded_timestamp: datetime
+    # player_id: name
+    players: dict[str, str]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "server_url": self.server_url,
+            "seeded_timestamp": self.seeded_timestamp.isoformat(),
+            "players": [
+                {"player_id": player_id, "name": name}
+                for player_id, name in self.players.items()
+            ],
+        }
+
+
+class RewardSink(ABC):
+    """Somewhere other than CRCON that seeders are rewarded
+
+    Each sink gets its own worker and queue of seeds, see `deliver` for how failures
+    are retried
+    """
+
+    def __init__(self, config: RewardSinkConfig) -> None:
+        self.config = config
+        self.name: str = config.name or config.type
+
+    @abstractmethod
+    async def reward(self, reward: SeedReward) -> None:
+        """Reward the seeders, raise if it failed and should be retried"""
+
+    async def aclose(self) -> None:
+        pass
+
+
+class SQLitePointsSink(RewardSink):
+    """Points per seed in a `seed_points` table
+
+    A row per player and seed so retrying a seed that was already recorded is a no-op,
+    a player's points are the sum of their rows
+    """
+
+    def __init__(self, config: RewardSinkConfig) -> None:
+        super().__init__(config)
+        self.path = Path(config.path or "")
+        # Created by the first `_record` so nothing blocks the event loop
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=self.config.timeout)
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS seed_points (server_url TEXT NOT NULL, player_id TEXT NOT NULL, seeded_at TEXT NOT NULL, name TEXT NOT NULL, points INTEGER NOT NULL, PRIMARY KEY (server_url, player_id, seeded_at))"
+        )
+
+    def _record(self, reward: SeedReward) -> None:
+        if not self._schema_ready:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                if not self._schema_ready:
+                    self._create_schema(conn)
+                    self._schema_ready = True
+                conn.executemany(
+                    "INSERT OR IGNORE INTO seed_points (server_url, player_id, seeded_at, name, points) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            reward.server_url,
+                            player_id,
+                            reward.seeded_timestamp.isoformat(),
+                            name,
+                            self.config.points,
+                        )
+                        for player_id, name in reward.players.items()
+                    ],
+                )
+        finally:
+            conn.close()
+
+    async def reward(self, reward: SeedReward) -> None:
+        # A timed out attempt abandons the thread rather than waiting for it, it
+        # finishes (or fails) on its own and a retry of the same seed is a no-op
+        await trio.to_thread.run_sync(self._record, reward, abandon_on_cancel=True)
+
+
+class WebhookSink(RewardSink):
+    """POST the seeders as JSON, any 4xx/5xx response is retried"""
+
+    def __init__(
+        self,
+        config: RewardSinkConfig,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        super().__init__(config)
+        self.url = str(config.url)
+        # Its own client so a slow sink can't tie up the CRCON connection pool
+        self.client = httpx.AsyncClient(
+            headers=config.headers, timeout=config.timeout, transport=transport
+        )
+
+    def payload(self, reward: SeedReward) -> dict[str, Any]:
+        return reward.to_dict()
+
+    async def reward(self, reward: SeedReward) -> None:
+        response = await self.client.post(self.url, json=self.payload(reward))
+        response.raise_for_status()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+class DiscordRoleSink(WebhookSink):
+    """Ask a Discord bot to give the seeders `role_id`
+
+    The bot is expected to map player IDs to Discord users itself
+    """
+
+    def payload(self, reward: SeedReward) -> dict[str, Any]:
+        return {
+            "role_id": self.config.role_id,
+            "player_ids": list(reward.players),
+            **reward.to_dict(),
+        }
+
+
+def make_reward_sinks(config: ServerConfig) -> list[RewardSink]:
+    sink_types: dict[str, type[RewardSink]] = {
+        "sqlite": SQLitePointsSink,
+        "webhook": WebhookSink,
+        "discord_role": DiscordRoleSink,
+    }
+    return [sink_types[sink.type](sink) for sink in config.reward_sinks]
+
+
+async def deliver(sink: RewardSink, reward: SeedReward) -> bool:
+    """Reward the seeders through `sink`, return False if every attempt failed
+
+    Each attempt gets `timeout` seconds and failed attempts are retried `retries`
+    times, exceptions never leave this function so a broken sink only affects itself
+    """
+    attempts = sink.config.retries + 1
+    for attempt in range(1, attempts + 1):
+        with trio.move_on_after(sink.config.timeout) as scope:
+            try:
+                await sink.reward(reward)
+                metrics.incr(f"sinks.{sink.name}.delivered")
+                return True
+            except Exception as e:
+                error = repr(e)
+        if scope.cancelled_caught:
+            error = f"timed out after {sink.config.timeout}s"
+
+        logger.warning(
+            f"{sink.name} sink attempt {attempt}/{attempts} for the seed at {reward.seeded_timestamp.isoformat()} failed: {error}"
+        )
+        if attempt < attempts:
+            metrics.incr(f"sinks.{sink.name}.retries")
+            await trio.sleep(RETRY_BACKOFFS[min(attempt, len(RETRY_BACKOFFS)) - 1])
+
+    logger.error(
+        f"Giving up on rewarding {len(reward.players)} seeders from {reward.seeded_timestamp.isoformat()} through the {sink.name} sink"
+    )
+    metrics.incr(f"sinks.{sink.name}.failed")
+    return False
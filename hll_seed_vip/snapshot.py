@@ -0,0 +1,123 @@
+import heapq
+from typing import NamedTuple
+
+from hll_seed_vip.models import ServerConfig, ServerPopulation
+from hll_seed_vip.utils import check_player_conditions
+
+
+class PopulationDelta(NamedTuple):
+    joined: set[str]
+    left: set[str]
+
+
+def diff_populations(
+    prev: ServerPopulation | None, curr: ServerPopulation
+) -> PopulationDelta:
+    """Return the players who joined or left between two snapshots"""
+    if prev is None:
+        return PopulationDelta(joined=set(curr.players), left=set())
+
+    return PopulationDelta(
+        joined=curr.players.keys() - prev.players.keys(),
+        left=prev.players.keys() - curr.players.keys(),
+    )
+
+
+class SeederTracker:
+    """Incrementally track which players have met the minimum play time
+
+    Instead of checking every online player each tick, the time each player will
+    meet `minimum_play_time` is computed once when they join and kept in a heap, so
+    the work done per tick scales with how many players joined/left rather than how
+    many are online
+    """
+
+    def __init__(self) -> None:
+        # Players who have met the minimum play time, only those currently online
+        # if `online_when_seeded` is set
+        self.eligible: set[str] = set()
+        self.names: dict[str, str] = {}
+        self._online: ServerPopulation | None = None
+        self._pending: list[tuple[float, str]] = []
+        # Used to discard heap entries from a previous session after a rejoin
+        self._eligible_at: dict[str, float] = {}
+        self._min_time_secs: int | None = None
+        self._online_when_seeded: bool | None = None
+
+    def update(
+        self, config: ServerConfig, players: ServerPopulation, now: float
+    ) -> PopulationDelta:
+        """Apply the changes since the previous snapshot, `now` is in seconds"""
+        min_time_secs = int(config.minimum_play_time.total_seconds())
+        if (
+            min_time_secs != self._min_time_secs
+            or config.online_when_seeded != self._online_when_seeded
+        ):
+            # The requirements changed (config reloaded) so every online player
+            # needs to be checked again
+            self._min_time_secs = min_time_secs
+            self._online_when_seeded = config.online_when_seeded
+            self._online = None
+            self._pending.clear()
+            self._eligible_at.clear()
+            if config.online_when_seeded:
+                self.eligible.clear()
+
+        delta = diff_populations(self._online, players)
+        self._online = players
+
+        for player_id in delta.left:
+            self._eligible_at.pop(player_id, None)
+            if config.online_when_seeded:
+                self.eligible.discard(player_id)
+
+        for player_id in delta.joined:
+            player = players.players[player_id]
+            self.names[player_id] = player.name
+            remaining = min_time_secs - max(0, player.current_playtime_seconds)
+            if remaining <= 0:
+                self.eligible.add(player_id)
+            else:
+                eligible_at = now + remaining
+                self._eligible_at[player_id] = eligible_at
+                heapq.heappush(self._pending, (eligible_at, player_id))
+
+        while self._pending and self._pending[0][0] <= now:
+            eligible_at, player_id = heapq.heappop(self._pending)
+            if self._eligible_at.get(player_id) == eligible_at:
+                del self._eligible_at[player_id]
+                self.eligible.add(player_id)
+
+        return delta
+
+    def seeders(self, config: ServerConfig, players: ServerPopulation) -> set[str]:
+        """Return the players to reward when the server seeds
+
+        The online players are checked in full once here so a player who quickly
+        rejoined between polls (and had their play time reset) is handled the same
+        way as `collect_steam_ids`
+        """
+        online_seeders = check_player_conditions(config=config, server_pop=players)
+        if config.online_when_seeded:
+            return online_seeders
+        return self.eligible | online_seeders
+
+    def reset(self) -> None:
+        """Start tracking a new seed
+
+        Online players who already met the minimum play time stay eligible, the same
+        as `collect_steam_ids` would find them again on the next tick
+        """
+        # Rebound rather than cleared so the previous seed's sets can still be used
+        self.eligible = set()
+        if self._online is None:
+            self.names = {}
+            return
+
+        online = self._online.players
+        self.eligible = online.keys() - self._eligible_at.keys()
+        self.names = {
+            player_id: self.names[player_id]
+            for player_id in online
+            if player_id in self.names
+        }
@@ -0,0 +1,245 @@
+import json
+from collections import deque
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Final, NamedTuple
+
+import trio
+from loguru import logger
+
+from hll_seed_vip.models import ServerConfig
+
+if TYPE_CHECKING:
+    from hll_seed_vip.pipeline import SeedingStateMachine, Snapshot
+    from hll_seed_vip.watchdog import Watchdog
+
+MAX_REQUEST_BYTES: Final = 8 * 1024
+REQUEST_TIMEOUT: Final = 5
+MAX_CONNECTIONS: Final = 16
+REASONS: Final = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    503: "Service Unavailable",
+}
+
+
+class RewardOutcome(NamedTuple):
+    seeded_timestamp: datetime
+    rewarded: list[str]
+    skipped_indefinite: list[str]
+    not_rewarded: int
+    dry_run: bool
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "seeded_timestamp": self.seeded_timestamp.isoformat(),
+            "rewarded": self.rewarded,
+            "skipped_indefinite": self.skipped_indefinite,
+            "not_rewarded": self.not_rewarded,
+            "dry_run": self.dry_run,
+        }
+
+
+def encode(body: Any) -> bytes:
+    return json.dumps(body, separators=(",", ":")).encode()
+
+
+class StatusCache:
+    """Pre-encoded responses for the status API, updated by the seeding pipeline
+
+    Requests only ever read the cached bytes so they never wait on CRCON and cost the
+    same no matter how often they're made
+    """
+
+    def __init__(
+        self, max_rewards: int = 20, watchdog: "Watchdog | None" = None
+    ) -> None:
+        self.watchdog = watchdog
+        self.rewards: deque[RewardOutcome] = deque(maxlen=max_rewards)
+        self.responses: dict[str, bytes] = {
+            "/status": encode({"status": "starting"}),
+            "/seeders": encode([]),
+            "/rewards": encode([]),
+        }
+        self.updated_at: datetime | None = None
+
+    def update(
+        self, state_machine: "SeedingStateMachine", snapshot: "Snapshot"
+    ) -> None:
+        config = snapshot.config
+        now = snapshot.timestamp
+        buffer_remaining = None
+        if not state_machine.is_seeding and state_machine.seeded_timestamp:
+            buffer_remaining = max(
+                0,
+                (
+                    config.buffer - (now - state_machine.seeded_timestamp)
+                ).total_seconds(),
+            )
+
+        self.responses["/status"] = encode(
+            {
+                "server": config.base_url,
+                "updated_at": now.isoformat(),
+                "is_seeding": state_machine.is_seeding,
+                "seeded_timestamp": (
+                    state_machine.seeded_timestamp.isoformat()
+                    if state_machine.seeded_timestamp
+                    else None
+                ),
+                "buffer_remaining_seconds": buffer_remaining,
+                "num_allied_players": snapshot.gamestate.num_allied_players,
+                "num_axis_players": snapshot.gamestate.num_axis_players,
+                "next_bucket": next_bucket(
+                    config,
+                    snapshot.total_players,
+                    state_machine.prev_announced_bucket,
+                ),
+                "num_seeders": len(state_machine.tracker.eligible),
+                "next_poll_seconds": state_machine.sleep_time,
+                "players_per_minute": state_machine.forecaster.players_per_minute,
+            }
+        )
+
+        online = snapshot.players.players
+        self.responses["/seeders"] = encode(
+            sorted(
+                (
+                    {
+                        "player_id": player_id,
+                        "name": state_machine.tracker.names.get(player_id),
+                        "online": player_id in online,
+                        "current_playtime_seconds": (
+                            online[player_id].current_playtime_seconds
+                            if player_id in online
+                            else None
+                        ),
+                    }
+                    for player_id in state_machine.tracker.eligible
+                ),
+                key=lambda seeder: seeder["player_id"],
+            )
+        )
+        self.updated_at = now
+
+    def record_reward(self, outcome: RewardOutcome) -> None:
+        self.rewards.append(outcome)
+        self.responses["/rewards"] = encode(
+            [reward.to_dict() for reward in reversed(self.rewards)]
+        )
+
+    def health(self, max_age: float) -> bool:
+        if self.updated_at is None:
+            return False
+        if self.watchdog and self.watchdog.stalled:
+            return False
+        age = (datetime.now(tz=timezone.utc) - self.updated_at).total_seconds()
+        return age <= max_age
+
+
+def next_bucket(
+    config: ServerConfig, total_players: int, prev_announced_bucket: int
+) -> int | None:
+    """The next player count that will be announced to Discord"""
+    floor = max(total_players, prev_announced_bucket)
+    return next(
+        (b for b in config.discord_seeding_player_buckets if b > floor),
+        None,
+    )
+
+
+def make_response(status: int, body: bytes) -> bytes:
+    headers = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n"
+        "\r\n"
+    )
+    return headers.encode() + body
+
+
+def route(cache: StatusCache, request_line: bytes, max_age: float) -> bytes:
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        return make_response(400, encode({"error": "bad request"}))
+
+    if method != "GET":
+        return make_response(405, encode({"error": "method not allowed"}))
+
+    path = target.split("?", 1)[0].rstrip("/") or "/"
+    if path == "/health":
+        if cache.health(max_age):
+            return make_response(200, encode({"status": "ok"}))
+        return make_response(503, encode({"status": "stale"}))
+
+    body = cache.responses.get(path)
+    if body is None:
+        return make_response(404, encode({"error": f"unknown path {path}"}))
+    return make_response(200, body)
+
+
+async def read_request_line(stream: trio.abc.Stream) -> bytes | None:
+    buffer = bytearray()
+    while b"\r\n\r\n" not in buffer and len(buffer) < MAX_REQUEST_BYTES:
+        data = await stream.receive_some(MAX_REQUEST_BYTES)
+        if not data:
+            break
+        buffer += data
+    if b"\r\n" not in buffer:
+        return None
+    return bytes(buffer.split(b"\r\n", 1)[0])
+
+
+async def handle_connection(
+    stream: trio.abc.Stream,
+    cache: StatusCache,
+    limiter: trio.CapacityLimiter,
+    max_age: float,
+) -> None:
+    try:
+        # Connections over the limit are turned away instead of queued so a burst
+        # of requests can't pile up
+        try:
+            limiter.acquire_nowait()
+        except trio.WouldBlock:
+            await stream.send_all(make_response(503, encode({"error": "busy"})))
+            return
+
+        try:
+            with trio.move_on_after(REQUEST_TIMEOUT):
+                request_line = await read_request_line(stream)
+                if request_line is None:
+                    response = make_response(400, encode({"error": "bad request"}))
+                else:
+                    response = route(cache, request_line, max_age)
+                await stream.send_all(response)
+        finally:
+            limiter.release()
+    except trio.BrokenResourceError:
+        pass
+    finally:
+        await stream.aclose()
+
+
+async def serve_status(
+    cache: StatusCache,
+    host: str,
+    port: int,
+    max_age: float,
+    task_status=trio.TASK_STATUS_IGNORED,
+) -> None:
+    """Serve the status API until cancelled
+
+    `max_age` is how old (in seconds) the last snapshot can be before /health fails
+    """
+    limiter = trio.CapacityLimiter(MAX_CONNECTIONS)
+    logger.info(f"Serving the status API on http://{host}:{port}")
+    await trio.serve_tcp(
+        lambda stream: handle_connection(stream, cache, limiter, max_age),
+        port,
+        host=host,
+        task_status=task_status,
+    )
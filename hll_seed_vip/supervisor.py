@@ -0,0 +1,344 @@
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Final
+
+import trio
+import yaml
+from loguru import logger
+
+from hll_seed_vip.constants import API_KEY, API_KEY_FORMAT
+from hll_seed_vip.leader import lease_path
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.pipeline import serve_server
+from hll_seed_vip.shutdown import GracefulShutdown
+from hll_seed_vip.utils import load_config
+
+METRICS_INTERVAL: Final = 10
+# How often the metrics aggregated from every worker are logged
+METRICS_LOG_INTERVAL: Final = 300
+RESTART_DELAY: Final = 5
+MAX_RESTART_DELAY: Final = 300
+# A worker that stays up this long is considered healthy again
+HEALTHY_UPTIME: Final = 60
+# How long workers get to finish their in-flight work when stopping, this should be
+# longer than the `shutdown_timeout` of every server and shorter than the container's
+# stop timeout (stop_grace_period in docker-compose.yml) so workers are never killed
+# without their unfinished work being logged
+STOP_TIMEOUT: Final = 40
+WORKER_LOG_FORMAT: Final = (
+    "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | shard {extra[shard]} | "
+    "{name}:{function}:{line} - {message}\n{exception}"
+)
+
+
+def shard_configs(config_paths: list[Path], num_workers: int) -> list[list[Path]]:
+    """Split config files round robin across at most `num_workers` shards"""
+    shards: list[list[Path]] = [[] for _ in range(max(1, num_workers))]
+    for idx, path in enumerate(sorted(config_paths)):
+        shards[idx % len(shards)].append(path)
+    return [shard for shard in shards if shard]
+
+
+def find_configs(config_dir: Path) -> list[Path]:
+    return sorted(
+        path
+        for pattern in ("*.yml", "*.yaml")
+        for path in config_dir.glob(pattern)
+        if path.is_file()
+    )
+
+
+async def serve_shard(
+    shard: int,
+    config_paths: list[Path],
+    state_dir: Path,
+    population_dir: Path,
+    ledger_dir: Path,
+    leader_dir: Path,
+    events: Any,
+) -> None:
+    """Seed every server in the shard, a server that fails is restarted on its own
+
+    humanize's language is global to the process so servers sharing a worker should
+    use the same `language`. Returns once every server has shut down gracefully
+    """
+    headers = {"Authorization": API_KEY_FORMAT.format(api_key=os.getenv(API_KEY))}
+    shutdown = GracefulShutdown()
+    async with trio.open_nursery() as nursery:
+        await nursery.start(shutdown.watch_signals)
+        nursery.start_soon(report_metrics, shard, events)
+        async with trio.open_nursery() as servers:
+            lock_files: dict[Path, Path] = {}
+            for config_path in config_paths:
+                try:
+                    config = load_config(config_path)
+                except (OSError, KeyError, TypeError, ValueError, yaml.YAMLError) as e:
+                    logger.error(f"Skipping {config_path}, unable to load it: {e}")
+                    continue
+
+                if config.shutdown_timeout >= STOP_TIMEOUT:
+                    logger.warning(
+                        f"{config_path} has shutdown_timeout={config.shutdown_timeout}, workers are killed if they take longer than {STOP_TIMEOUT}s to stop"
+                    )
+
+                if config.leader_election and config.leader_backend == "file":
+                    # Only one of the servers could ever hold the lock
+                    lock_file = lease_path(config, leader_dir).resolve()
+                    if lock_file in lock_files:
+                        logger.error(
+                            f"Skipping {config_path}, it uses the same leader election lock file {lock_file} as {lock_files[lock_file]}"
+                        )
+                        continue
+                    lock_files[lock_file] = config_path
+
+                logger.info(f"Seeding {config.base_url} from {config_path}")
+                servers.start_soon(
+                    serve_isolated,
+                    config.base_url,
+                    shutdown,
+                    partial(
+                        serve_server,
+                        config_path,
+                        config,
+                        headers,
+                        population_dir.joinpath(config_path.stem),
+                        leader_dir,
+                        state_dir.joinpath(f"{config_path.stem}.json"),
+                        ledger_dir.joinpath(f"{config_path.stem}.jsonl"),
+                        shutdown,
+                    ),
+                )
+        events.put(("metrics", shard, metrics.snapshot()))
+        nursery.cancel_scope.cancel()
+
+
+async def serve_isolated(
+    name: str, shutdown: GracefulShutdown, serve: Callable[[], Awaitable[None]]
+) -> None:
+    """Run `serve` until it returns, restarting it with a backoff whenever it fails
+
+    Keeps a failing server from taking down the other servers in its shard
+    """
+    delay = RESTART_DELAY
+    while True:
+        started_at = trio.current_time()
+        try:
+            await serve()
+            return
+        except Exception:
+            if trio.current_time() - started_at > HEALTHY_UPTIME:
+                delay = RESTART_DELAY
+            logger.exception(f"{name} failed, restarting it in {delay}s")
+            metrics.incr("supervisor.server_restarts")
+
+        with shutdown.stop_on_request():
+            await trio.sleep(delay)
+        if shutdown.requested.is_set():
+            return
+        delay = min(delay * 2, MAX_RESTART_DELAY)
+
+
+async def report_metrics(shard: int, events: Any) -> None:
+    while True:
+        await trio.sleep(METRICS_INTERVAL)
+        events.put(("metrics", shard, metrics.snapshot()))
+
+
+def run_worker(
+    shard: int,
+    config_paths: list[Path],
+    state_dir: Path,
+    population_dir: Path,
+    ledger_dir: Path,
+    leader_dir: Path,
+    events: Any,
+    log_level: str,
+) -> None:
+    """Entry point of a worker process"""
+    logger.remove()
+    logger.configure(extra={"shard": shard})
+    logger.add(
+        lambda message: events.put(
+            ("log", shard, message.record["level"].name, str(message))
+        ),
+        level=log_level,
+        format=WORKER_LOG_FORMAT,
+    )
+    state_dir.mkdir(parents=True, exist_ok=True)
+    trio.run(
+        serve_shard,
+        shard,
+        config_paths,
+        state_dir,
+        population_dir,
+        ledger_dir,
+        leader_dir,
+        events,
+    )
+
+
+class Worker:
+    def __init__(self, shard: int, config_paths: list[Path]) -> None:
+        self.shard = shard
+        self.config_paths = config_paths
+        self.process: multiprocessing.process.BaseProcess | None = None
+        self.started_at = 0.0
+        self.restart_at: float | None = None
+        self.restart_delay = RESTART_DELAY
+
+
+class Supervisor:
+    """Shard servers across worker processes each running their own trio loop
+
+    Worker logs and metrics are forwarded over a queue and re-emitted here, crashed
+    workers are restarted with an exponential backoff and pick their seeding state
+    back up from `state_dir`
+    """
+
+    def __init__(
+        self,
+        config_paths: list[Path],
+        num_workers: int,
+        state_dir: Path,
+        population_dir: Path,
+        ledger_dir: Path,
+        leader_dir: Path,
+        log_level: str = "DEBUG",
+        target: Callable[..., None] = run_worker,
+    ) -> None:
+        self.state_dir = state_dir
+        self.population_dir = population_dir
+        self.ledger_dir = ledger_dir
+        self.leader_dir = leader_dir
+        self.log_level = log_level
+        self.target = target
+        # spawn so workers don't inherit the supervisor's log sinks and threads
+        self._context = multiprocessing.get_context("spawn")
+        self.events = self._context.Queue()
+        self.metrics_logged_at = time.monotonic()
+        self.workers = [
+            Worker(shard=shard, config_paths=paths)
+            for shard, paths in enumerate(shard_configs(config_paths, num_workers))
+        ]
+
+    def start_worker(self, worker: Worker) -> None:
+        worker.process = self._context.Process(
+            target=self.target,
+            args=(
+                worker.shard,
+                worker.config_paths,
+                self.state_dir,
+                self.population_dir,
+                self.ledger_dir,
+                self.leader_dir,
+                self.events,
+                self.log_level,
+            ),
+            name=f"hll_seed_vip-shard-{worker.shard}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.restart_at = None
+        logger.info(
+            f"Started shard {worker.shard} pid={worker.process.pid} {[str(p) for p in worker.config_paths]}"
+        )
+
+    def start(self) -> None:
+        for worker in self.workers:
+            self.start_worker(worker)
+
+    def check_workers(self) -> None:
+        """Restart any workers that exited once their backoff has passed"""
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.process is None or worker.process.is_alive():
+                continue
+
+            if worker.restart_at is None:
+                if now - worker.started_at > HEALTHY_UPTIME:
+                    worker.restart_delay = RESTART_DELAY
+                logger.error(
+                    f"Shard {worker.shard} exited with {worker.process.exitcode}, restarting in {worker.restart_delay}s"
+                )
+                metrics.incr(f"supervisor.shard{worker.shard}.restarts")
+                worker.restart_at = now + worker.restart_delay
+                worker.restart_delay = min(worker.restart_delay * 2, MAX_RESTART_DELAY)
+            elif now >= worker.restart_at:
+                self.start_worker(worker)
+
+    def handle_event(self, event: tuple) -> None:
+        kind, shard, *payload = event
+        if kind == "log":
+            level, text = payload
+            logger.opt(raw=True).log(level, text)
+        elif kind == "metrics":
+            (snapshot,) = payload
+            for name, value in snapshot.items():
+                metrics.set(f"shard{shard}.{name}", value)
+
+    def poll_events(self, timeout: float) -> None:
+        """Handle forwarded events until none arrive for `timeout` seconds"""
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                self.handle_event(self.events.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+    def poll(self, timeout: float = 1.0) -> None:
+        """Handle forwarded events for up to `timeout` seconds then check on workers"""
+        self.poll_events(timeout)
+        self.check_workers()
+        if time.monotonic() - self.metrics_logged_at >= METRICS_LOG_INTERVAL:
+            self.log_metrics()
+
+    def log_metrics(self) -> None:
+        """Log the metrics of every worker, prefixed with their shard"""
+        self.metrics_logged_at = time.monotonic()
+        logger.info("Metrics {}", json.dumps(metrics.snapshot(), sort_keys=True))
+
+    def run(self) -> None:
+        # Stop the workers the same way on SIGTERM as on Ctrl+C
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self.start()
+        try:
+            while True:
+                self.poll()
+        except KeyboardInterrupt:
+            logger.warning("Stopping workers")
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = STOP_TIMEOUT) -> None:
+        """Ask workers to finish their in-flight work, killing any still running after `timeout` seconds"""
+        for worker in self.workers:
+            if worker.process and worker.process.is_alive():
+                worker.process.terminate()
+
+        # Keep forwarding events while waiting, workers can't exit until everything
+        # they've put on the queue has been read
+        deadline = time.monotonic() + timeout
+        while (
+            any(worker.process and worker.process.is_alive() for worker in self.workers)
+            and time.monotonic() < deadline
+        ):
+            self.poll_events(timeout=0.1)
+
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            if worker.process.is_alive():
+                logger.error(
+                    f"Shard {worker.shard} didn't stop within {timeout}s, killing it"
+                )
+                worker.process.kill()
+            worker.process.join()
+        self.poll_events(timeout=0.1)
+        self.log_metrics()
@@ -0,0 +1,111 @@
+import re
+import string
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Final
+
+from humanize import naturaldelta, naturaltime
+
+PLAYER_MESSAGE_FIELDS: Final = frozenset({"vip_reward", "vip_expiration"})
+VIP_NAME_FIELDS: Final = frozenset({"player_name"})
+SEEDING_IN_PROGRESS_FIELDS: Final = frozenset({"player_count", "eta"})
+SEEDING_COMPLETE_FIELDS: Final = frozenset({"player_count"})
+PLAYER_COUNT_FIELDS: Final = frozenset({"num_allied_players", "num_axis_players"})
+# Sent as is, any field is a typo
+NO_FIELDS: Final = frozenset[str]()
+
+# Expirations more than an hour away are rounded to the minute before humanizing so
+# players rewarded in the same seed share a cached result, the humanized text is
+# never more precise than that anyway
+EXPIRATION_PRECISE_SECONDS: Final = 60 * 60
+EXPIRATION_BUCKET_SECONDS: Final = 60
+
+
+class MessageTemplate:
+    """A `str.format` template that has been parsed and validated once"""
+
+    def __init__(self, template: str, allowed_fields: frozenset[str]) -> None:
+        self.template = template
+        self.fields = frozenset(
+            _root_field_name(field_name)
+            for _, field_name, _, _ in string.Formatter().parse(template)
+            if field_name is not None
+        )
+        unknown_fields = self.fields - allowed_fields
+        if unknown_fields:
+            raise ValueError(
+                f"Unknown fields {sorted(unknown_fields)} in {template!r}, valid fields are {sorted(allowed_fields)}"
+            )
+        # Templates without any fields still need escaped braces ({{ }}) unescaped
+        self._static = None if self.fields else template.format()
+
+    def uses(self, field: str) -> bool:
+        return field in self.fields
+
+    def render(self, **values: Any) -> str:
+        if self._static is not None:
+            return self._static
+        return self.template.format(**values)
+
+
+def _root_field_name(field_name: str) -> str:
+    # {} is positional and never valid since templates are only formatted with kwargs
+    if not field_name:
+        return "{}"
+    return re.split(r"[.\[]", field_name, maxsplit=1)[0]
+
+
+@lru_cache(maxsize=128)
+def compile_template(template: str, allowed_fields: frozenset[str]) -> MessageTemplate:
+    return MessageTemplate(template, allowed_fields)
+
+
+def validate_template(template: str, allowed_fields: frozenset[str]) -> str:
+    """Raise a ValueError if the template is malformed or uses unknown fields"""
+    compile_template(template, allowed_fields)
+    return template
+
+
+@lru_cache(maxsize=128)
+def natural_delta(value: timedelta) -> str:
+    return naturaldelta(value)
+
+
+@lru_cache(maxsize=1024)
+def _natural_time_seconds(seconds: int) -> str:
+    return naturaltime(timedelta(seconds=seconds))
+
+
+def natural_expiration(expiration: datetime) -> str:
+    """Return `humanize.naturaltime(expiration)` relative to now"""
+    now = datetime.now(tz=expiration.tzinfo)
+    seconds = round((now - expiration).total_seconds())
+    if abs(seconds) > EXPIRATION_PRECISE_SECONDS:
+        seconds = round(seconds / EXPIRATION_BUCKET_SECONDS) * EXPIRATION_BUCKET_SECONDS
+    return _natural_time_seconds(seconds)
+
+
+@lru_cache(maxsize=32)
+def template_pattern(template: str) -> re.Pattern | None:
+    """Return a regex matching anything the template could render
+
+    Returns None if the template has no literal text since it would match anything
+    """
+    parts: list[str] = []
+    has_literal = False
+    for literal_text, field_name, _, _ in string.Formatter().parse(template):
+        if literal_text:
+            has_literal = True
+            parts.append(re.escape(literal_text))
+        if field_name is not None:
+            parts.append(".*")
+
+    if not has_literal:
+        return None
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def clear_humanize_caches() -> None:
+    """Must be called after changing the humanize language"""
+    natural_delta.cache_clear()
+    _natural_time_seconds.cache_clear()
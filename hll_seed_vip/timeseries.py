@@ -0,0 +1,190 @@
+import mmap
+import struct
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import BinaryIO, Final, Iterator, NamedTuple
+
+from loguru import logger
+
+SEGMENT_PREFIX: Final = "population-"
+SEGMENT_SUFFIX: Final = ".bin"
+FORMAT_VERSION: Final = 1
+
+# The header is padded out to the record size so records stay aligned when mapped
+HEADER: Final = struct.Struct("<8sHH4x")
+RECORD: Final = struct.Struct("<dBBHHBx")
+MAGIC: Final = b"HLLSEED\x00"
+
+FLAG_SEEDING: Final = 0b01
+FLAG_SEEDED: Final = 0b10
+
+
+class PopulationRecord(NamedTuple):
+    timestamp: datetime
+    num_allied_players: int
+    num_axis_players: int
+    num_online_players: int
+    num_seeders: int
+    is_seeding: bool
+    seeded: bool = False
+
+    def pack(self) -> bytes:
+        flags = (FLAG_SEEDING if self.is_seeding else 0) | (
+            FLAG_SEEDED if self.seeded else 0
+        )
+        return RECORD.pack(
+            self.timestamp.timestamp(),
+            min(self.num_allied_players, 0xFF),
+            min(self.num_axis_players, 0xFF),
+            min(self.num_online_players, 0xFFFF),
+            min(self.num_seeders, 0xFFFF),
+            flags,
+        )
+
+
+class PopulationSeries:
+    """Column oriented view of population records suitable for fast aggregation"""
+
+    def __init__(self) -> None:
+        self.timestamps = array("d")
+        self.num_allied_players = array("B")
+        self.num_axis_players = array("B")
+        self.num_online_players = array("H")
+        self.num_seeders = array("H")
+        self.flags = array("B")
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def append(
+        self,
+        timestamp: float,
+        num_allied_players: int,
+        num_axis_players: int,
+        num_online_players: int,
+        num_seeders: int,
+        flags: int,
+    ) -> None:
+        self.timestamps.append(timestamp)
+        self.num_allied_players.append(num_allied_players)
+        self.num_axis_players.append(num_axis_players)
+        self.num_online_players.append(num_online_players)
+        self.num_seeders.append(num_seeders)
+        self.flags.append(flags)
+
+    def total_players(self, idx: int) -> int:
+        return self.num_allied_players[idx] + self.num_axis_players[idx]
+
+    def is_seeding(self, idx: int) -> bool:
+        return bool(self.flags[idx] & FLAG_SEEDING)
+
+    def seeded(self, idx: int) -> bool:
+        return bool(self.flags[idx] & FLAG_SEEDED)
+
+
+def segment_path(directory: Path, day: date) -> Path:
+    return directory.joinpath(f"{SEGMENT_PREFIX}{day.isoformat()}{SEGMENT_SUFFIX}")
+
+
+class PopulationWriter:
+    """Append population records to daily (UTC) segment files"""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+        self._day: date | None = None
+        self._fp: BinaryIO | None = None
+
+    def _open_segment(self, day: date) -> BinaryIO:
+        self.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = segment_path(self.directory, day)
+        fp = open(path, "ab")
+        if fp.tell() == 0:
+            fp.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size))
+        logger.debug(f"Writing population records to {path}")
+        self._day = day
+        self._fp = fp
+        return fp
+
+    def append(self, record: PopulationRecord) -> None:
+        day = record.timestamp.astimezone(timezone.utc).date()
+        fp = self._fp if day == self._day and self._fp else self._open_segment(day)
+        fp.write(record.pack())
+        fp.flush()
+
+    def close(self) -> None:
+        if self._fp:
+            self._fp.close()
+        self._fp = None
+        self._day = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _iter_segment(path: Path) -> Iterator[tuple[float, int, int, int, int, int]]:
+    with open(path, "rb") as fp:
+        if path.stat().st_size <= HEADER.size:
+            return
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            magic, version, record_size = HEADER.unpack_from(mm)
+            if magic != MAGIC or record_size != RECORD.size:
+                logger.error(f"Skipping {path}, unknown {version=} or {record_size=}")
+                return
+            # Ignore a partially written trailing record
+            end = HEADER.size + (len(mm) - HEADER.size) // RECORD.size * RECORD.size
+            for offset in range(HEADER.size, end, RECORD.size):
+                yield RECORD.unpack_from(mm, offset)
+
+
+def load_range(directory: Path, start: datetime, end: datetime) -> PopulationSeries:
+    """Return every record with start <= timestamp < end"""
+    series = PopulationSeries()
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    day = start.astimezone(timezone.utc).date()
+    last_day = end.astimezone(timezone.utc).date()
+    while day <= last_day:
+        path = segment_path(directory, day)
+        day += timedelta(days=1)
+        if not path.exists():
+            continue
+        for row in _iter_segment(path):
+            if start_ts <= row[0] < end_ts:
+                series.append(*row)
+
+    return series
+
+
+def time_to_seed_per_day(series: PopulationSeries) -> dict[date, timedelta]:
+    """Return how long the first seed of each (UTC) day took from the first player joining"""
+    results: dict[date, timedelta] = {}
+    seeding_started: float | None = None
+    for idx in range(len(series)):
+        timestamp = series.timestamps[idx]
+        if series.is_seeding(idx):
+            if series.total_players(idx) == 0:
+                seeding_started = None
+            elif seeding_started is None:
+                seeding_started = timestamp
+        elif seeding_started is not None:
+            day = datetime.fromtimestamp(timestamp, tz=timezone.utc).date()
+            results.setdefault(day, timedelta(seconds=timestamp - seeding_started))
+            seeding_started = None
+
+    return results
+
+
+def seeder_counts(series: PopulationSeries) -> list[tuple[datetime, int]]:
+    """Return the number of players eligible for VIP at every seed"""
+    return [
+        (
+            datetime.fromtimestamp(series.timestamps[idx], tz=timezone.utc),
+            series.num_seeders[idx],
+        )
+        for idx in range(len(series))
+        if series.seeded(idx)
+    ]
@@ -1,30 +1,56 @@
+from bisect import bisect_right
 from collections import defaultdict
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, Sequence
+from typing import TYPE_CHECKING, Iterable, NamedTuple, Sequence
 
-import discord_webhook as discord
 import httpx
+import humanize
 import yaml
-from humanize import naturaldelta, naturaltime
+from humanize import naturaldelta
 from loguru import logger
 
 from hll_seed_vip.constants import INDEFINITE_VIP_DATE
 from hll_seed_vip.io import add_vip, message_player
+from hll_seed_vip.ledger import GrantLedger, GrantRecord
+from hll_seed_vip.log import summarize
+from hll_seed_vip.messaging import MessagePriority, MessageQueue, OutboundMessage
 from hll_seed_vip.models import (
     BaseCondition,
+    ConfigAdaptivePollingType,
     ConfigDiscordType,
+    ConfigHttpType,
+    ConfigLeaderElectionType,
     ConfigPlayerMessageType,
     ConfigRequirementsType,
+    ConfigStatusApiType,
     ConfigType,
+    ConfigVipCleanupType,
     ConfigVipRewardType,
+    ConfigWatchdogType,
     GameState,
+    Layer,
     PlayerCountCondition,
     PlayTimeCondition,
     ServerConfig,
     ServerPopulation,
     VipPlayer,
 )
+from hll_seed_vip.templates import (
+    PLAYER_COUNT_FIELDS,
+    PLAYER_MESSAGE_FIELDS,
+    SEEDING_COMPLETE_FIELDS,
+    SEEDING_IN_PROGRESS_FIELDS,
+    VIP_NAME_FIELDS,
+    clear_humanize_caches,
+    compile_template,
+    natural_delta,
+    natural_expiration,
+)
+
+if TYPE_CHECKING:
+    import discord_webhook as discord
 
 
 def has_indefinite_vip(player: VipPlayer | None) -> bool:
@@ -64,6 +90,18 @@ def load_config(path: Path) -> ServerConfig:
     vip_reward = ConfigVipRewardType(**raw_config["vip_reward"])
     discord = ConfigDiscordType(**raw_config["discord"])
     player_messages = ConfigPlayerMessageType(**raw_config["player_messages"])
+    adaptive_polling = ConfigAdaptivePollingType(
+        **raw_config.get("adaptive_polling", {"enabled": False})
+    )
+    http = ConfigHttpType(**raw_config.get("http", {}))
+    leader_election = ConfigLeaderElectionType(
+        **raw_config.get("leader_election", {"enabled": False})
+    )
+    vip_cleanup = ConfigVipCleanupType(
+        **raw_config.get("vip_cleanup", {"enabled": False})
+    )
+    status_api = ConfigStatusApiType(**raw_config.get("status_api", {"enabled": False}))
+    watchdog = ConfigWatchdogType(**raw_config.get("watchdog", {}))
 
     return ServerConfig(
         language=raw_config.get("language"),
@@ -77,6 +115,34 @@ def load_config(path: Path) -> ServerConfig:
         buffer=timedelta(**requirements["buffer"]),
         poll_time_seeding=raw_config["poll_time_seeding"],
         poll_time_seeded=raw_config["poll_time_seeded"],
+        shutdown_timeout=raw_config.get("shutdown_timeout", 30),
+        adaptive_polling=adaptive_polling["enabled"],
+        min_poll_time=adaptive_polling.get("min_poll_time", 10),
+        max_poll_time=adaptive_polling.get("max_poll_time", 120),
+        http_max_connections=http.get("max_connections", 10),
+        http_max_keepalive_connections=http.get("max_keepalive_connections", 5),
+        http_keepalive_expiry=http.get("keepalive_expiry", 30),
+        http2=http.get("http2", False),
+        http_timeouts=http.get("timeouts") or {},
+        leader_election=leader_election["enabled"],
+        leader_backend=leader_election.get("backend", "file"),
+        leader_lease_path=leader_election.get("path"),
+        leader_lease_time=leader_election.get("lease_time", 30),
+        leader_renew_interval=leader_election.get("renew_interval", 10),
+        vip_cleanup=vip_cleanup["enabled"],
+        vip_cleanup_dry_run=vip_cleanup.get("dry_run", True),
+        vip_cleanup_match=vip_cleanup.get("match", "both"),
+        vip_cleanup_interval=vip_cleanup.get("interval", 3600),
+        vip_cleanup_batch_size=vip_cleanup.get("batch_size", 20),
+        vip_cleanup_batch_delay=vip_cleanup.get("batch_delay", 1.0),
+        status_api=status_api["enabled"],
+        status_api_host=status_api.get("host", "127.0.0.1"),
+        status_api_port=status_api.get("port", 8080),
+        status_api_max_rewards=status_api.get("max_rewards", 20),
+        watchdog=watchdog.get("enabled", True),
+        watchdog_stall_after=watchdog.get("stall_after", 120),
+        watchdog_restart_tick=watchdog.get("restart_tick", False),
+        reward_sinks=raw_config.get("reward_sinks") or [],
         min_allies=requirements["min_allies"],
         max_allies=requirements["max_allies"],
         min_axis=requirements["min_axis"],
@@ -89,11 +155,32 @@ def load_config(path: Path) -> ServerConfig:
         vip_reward=timedelta(**vip_reward["timeframe"]),
         message_reward=player_messages["reward"],
         message_non_vip=player_messages["non_vip"],
+        message_rate_limit=player_messages.get("rate_limit", 5),
+        message_burst=player_messages.get("burst", 10),
+        message_dedup_window=timedelta(
+            **player_messages.get("dedup_window", {"minutes": 30})
+        ),
+        message_queue_size=player_messages.get("queue_size", 500),
         nice_time_delta=vip_reward["nice_time_delta"],
         nice_expiration_date=vip_reward["nice_expiration_date"],
     )
 
 
+def activate_language(language: str | None):
+    """Activate the humanize translation for `language` or English if None"""
+    clear_humanize_caches()
+    if not language:
+        humanize.deactivate()
+        return
+
+    try:
+        logger.info(f"Attempting to activate {language=}")
+        humanize.activate(language)
+    except FileNotFoundError:
+        logger.error(f"Unable to activate {language=}, defaulting to English")
+        humanize.deactivate()
+
+
 def all_met(conditions: Iterable[BaseCondition]):
     return all(c.is_met() for c in conditions)
 
@@ -115,8 +202,12 @@ def check_population_conditions(config: ServerConfig, gamestate: GameState):
         ),
     ]
 
-    logger.debug(
-        f"{player_count_conditions[0]}={player_count_conditions[0].is_met()} {player_count_conditions[1]}={player_count_conditions[1].is_met()} breaking",
+    logger.opt(lazy=True).debug(
+        "{}={} {}={} breaking",
+        lambda: player_count_conditions[0],
+        lambda: player_count_conditions[0].is_met(),
+        lambda: player_count_conditions[1],
+        lambda: player_count_conditions[1].is_met(),
     )
     if not all_met(player_count_conditions):
         return False
@@ -146,6 +237,65 @@ def is_seeded(config: ServerConfig, gamestate: GameState) -> bool:
     )
 
 
+def players_until_seeded(config: ServerConfig, gamestate: GameState) -> int:
+    """Return how many more players need to join before the server is seeded"""
+    return max(0, config.max_allies - gamestate.num_allied_players) + max(
+        0, config.max_axis - gamestate.num_axis_players
+    )
+
+
+def format_seed_eta(eta: timedelta | None) -> str:
+    if eta is None:
+        return "unknown"
+    return naturaldelta(eta)
+
+
+def format_seeding_in_progress_message(
+    message: str, player_count: int, eta: timedelta | None
+) -> str:
+    template = compile_template(message, SEEDING_IN_PROGRESS_FIELDS)
+    values: dict[str, str | int] = {"player_count": player_count}
+    if template.uses("eta"):
+        values["eta"] = format_seed_eta(eta)
+    return template.render(**values)
+
+
+def format_seeding_complete_message(message: str, player_count: int) -> str:
+    return compile_template(message, SEEDING_COMPLETE_FIELDS).render(
+        player_count=player_count
+    )
+
+
+def calc_adaptive_poll_time(
+    config: ServerConfig, gamestate: GameState, players_per_second: float
+) -> int:
+    """Return how long to sleep while seeding based on how fast the server is filling up
+
+    Polls quickly as the teams approach max_allies/max_axis (or when the current join rate
+    would cross them soon) and backs off towards max_poll_time when the server is idle
+    """
+    if not config.adaptive_polling:
+        return config.poll_time_seeding
+
+    total_players = gamestate.num_allied_players + gamestate.num_axis_players
+    if total_players == 0:
+        return config.max_poll_time
+
+    threshold = config.max_allies + config.max_axis
+    remaining = players_until_seeded(config=config, gamestate=gamestate)
+    if threshold == 0 or remaining == 0:
+        return config.min_poll_time
+
+    poll_range = config.max_poll_time - config.min_poll_time
+    poll_time = config.min_poll_time + poll_range * remaining / threshold
+
+    if players_per_second > 0:
+        # Poll at least twice before we expect the server to seed
+        poll_time = min(poll_time, remaining / players_per_second / 2)
+
+    return round(max(config.min_poll_time, min(config.max_poll_time, poll_time)))
+
+
 def calc_vip_expiration_timestamp(
     config: ServerConfig, expiration: datetime | None, from_time: datetime
 ) -> datetime:
@@ -165,6 +315,17 @@ def calc_vip_expiration_timestamp(
             return timestamp
 
 
+def calc_vip_expiration_for_seeds(
+    config: ServerConfig, expiration: datetime | None, from_time: datetime, seeds: int
+) -> datetime | None:
+    """Return the players new expiration date after being rewarded for `seeds` seeds at once"""
+    for _ in range(seeds):
+        expiration = calc_vip_expiration_timestamp(
+            config=config, expiration=expiration, from_time=from_time
+        )
+    return expiration
+
+
 def collect_steam_ids(
     config: ServerConfig,
     players: ServerPopulation,
@@ -189,17 +350,34 @@ def format_player_message(
     nice_time_delta: bool = True,
     nice_expiration_date: bool = True,
 ) -> str:
-    if nice_time_delta:
-        delta = naturaldelta(vip_reward)
-    else:
-        delta = vip_reward
+    template = compile_template(message, PLAYER_MESSAGE_FIELDS)
+    values: dict[str, str | timedelta] = {}
 
-    if nice_expiration_date:
-        date = naturaltime(vip_expiration)
-    else:
-        date = vip_expiration.isoformat()
+    # Only humanize the fields the template actually uses
+    if template.uses("vip_reward"):
+        values["vip_reward"] = (
+            natural_delta(vip_reward) if nice_time_delta else vip_reward
+        )
+
+    if template.uses("vip_expiration"):
+        values["vip_expiration"] = (
+            natural_expiration(vip_expiration)
+            if nice_expiration_date
+            else vip_expiration.isoformat()
+        )
+
+    return template.render(**values)
 
-    return message.format(vip_reward=delta, vip_expiration=date)
+
+class LayerEmbedAssets(NamedTuple):
+    map_name: str
+    image_url: str | None
+
+
+@lru_cache(maxsize=32)
+def layer_embed_assets(layer: Layer) -> LayerEmbedAssets:
+    """The parts of an announcement that only change with the map, cached by `Layer.id`"""
+    return LayerEmbedAssets(map_name=layer.map.pretty_name, image_url=layer.image_url)
 
 
 def make_seed_announcement_embed(
@@ -209,11 +387,18 @@ def make_seed_announcement_embed(
     player_count_message: str,
     num_axis_players: int,
     num_allied_players: int,
-) -> discord.DiscordEmbed | None:
+    image_url: str | None = None,
+) -> "discord.DiscordEmbed | None":
     if not message:
         return
 
-    logger.debug(f"{num_allied_players=} {num_axis_players=}")
+    logger.debug(
+        "num_allied_players={} num_axis_players={}",
+        num_allied_players,
+        num_axis_players,
+    )
+
+    import discord_webhook as discord
 
     embed = discord.DiscordEmbed(title=message)
     embed.set_timestamp(datetime.now(tz=timezone.utc))
@@ -221,16 +406,18 @@ def make_seed_announcement_embed(
     embed.add_embed_field(name="Time Remaining", value=time_remaining)
     embed.add_embed_field(
         name="Players Per Team",
-        value=player_count_message.format(
+        value=compile_template(player_count_message, PLAYER_COUNT_FIELDS).render(
             num_allied_players=num_allied_players, num_axis_players=num_axis_players
         ),
     )
+    if image_url:
+        embed.set_thumbnail(url=image_url)
 
     return embed
 
 
 def format_vip_reward_name(player_name: str, format_str):
-    return format_str.format(player_name=player_name)
+    return compile_template(format_str, VIP_NAME_FIELDS).render(player_name=player_name)
 
 
 def should_announce_seeding_progress(
@@ -254,7 +441,19 @@ async def message_players(
     message: str,
     steam_ids: Iterable[str],
     expiration_timestamps: defaultdict[str, datetime] | None,
+    done: set[str] | None = None,
+    queue: MessageQueue | None = None,
+    priority: MessagePriority = MessagePriority.REWARD,
 ):
+    """Message each player, adding them to `done` (if set) once they've been messaged
+
+    If `queue` is set messages are queued to be sent at a limited rate instead of
+    being sent right away and players are added to `done` once queued, the queue
+    reports whatever it never got to send (see `send_messages`)
+    """
+    if queue and not message:
+        return
+
     for steam_id in steam_ids:
         if expiration_timestamps:
             formatted_message = format_player_message(
@@ -269,6 +468,15 @@ async def message_players(
 
         if config.dry_run:
             logger.info(f"{config.dry_run=} messaging {steam_id}: {formatted_message}")
+        elif queue:
+            queue.put(
+                OutboundMessage(
+                    priority=priority,
+                    server_url=config.base_url,
+                    player_id=steam_id,
+                    message=formatted_message,
+                )
+            )
         else:
             await message_player(
                 client=client,
@@ -276,6 +484,8 @@ async def message_players(
                 player_id=steam_id,
                 message=formatted_message,
             )
+        if done is not None:
+            done.add(steam_id)
 
 
 async def reward_players(
@@ -285,11 +495,16 @@ async def reward_players(
     current_vips: dict[str, VipPlayer],
     players_lookup: dict[str, str],
     expiration_timestamps: defaultdict[str, datetime],
+    ledger: GrantLedger | None = None,
+    done: set[str] | None = None,
 ):
+    """Add or extend VIP for each player, adding them to `done` (if set) once handled"""
     # TODO: make concurrent
     logger.info(f"Rewarding players with VIP {config.dry_run=}")
-    logger.info(f"Total={len(to_add_vip_steam_ids)} {to_add_vip_steam_ids=}")
-    logger.debug(f"Total={len(current_vips)=} {current_vips=}")
+    logger.opt(lazy=True).info(
+        "to_add_vip_steam_ids={}", lambda: summarize(to_add_vip_steam_ids)
+    )
+    logger.opt(lazy=True).debug("current_vips={}", lambda: summarize(current_vips))
     for player_id in to_add_vip_steam_ids:
         player = current_vips.get(player_id)
         expiration_date = expiration_timestamps[player_id]
@@ -298,6 +513,8 @@ async def reward_players(
             logger.info(
                 f"{config.dry_run=} Skipping! pre-existing indefinite VIP for {player_id=} {player=} {vip_name=} {expiration_date=}"
             )
+            if done is not None:
+                done.add(player_id)
             continue
 
         vip_name = (
@@ -321,26 +538,33 @@ async def reward_players(
                 expiration_timestamp=expiration_date,
                 forward=config.forward,
             )
+            if ledger:
+                ledger.record(
+                    GrantRecord(
+                        player_id=player_id,
+                        name=vip_name,
+                        expiration=expiration_date,
+                        granted_at=datetime.now(tz=timezone.utc),
+                        server_url=config.base_url,
+                    )
+                )
 
         else:
             logger.info(
                 f"{config.dry_run=} adding VIP to {player_id=} {player=} {vip_name=} {expiration_date=}",
             )
 
+        if done is not None:
+            done.add(player_id)
+
 
 def get_next_player_bucket(
     player_buckets: Sequence[int],
     total_players: int,
 ) -> int | None:
-    idx = None
-    for idx, ele in enumerate(player_buckets):
-        if ele > total_players:
-            break
+    """The largest of the sorted `player_buckets` reached with `total_players` players
 
-    try:
-        if total_players > player_buckets[-1]:
-            return player_buckets[-1]
-        elif idx:
-            return player_buckets[idx - 1]
-    except IndexError:
-        return None
+    The seeding loop uses the lookup table from `ServerConfig.player_bucket` instead
+    """
+    idx = bisect_right(player_buckets, total_players)
+    return player_buckets[idx - 1] if idx else None
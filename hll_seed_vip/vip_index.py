@@ -0,0 +1,140 @@
+import re
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+from typing import Iterable
+
+from hll_seed_vip.constants import INDEFINITE_VIP_DATE
+from hll_seed_vip.models import ServerPopulation, VipPlayer
+
+INDEFINITE_TIMESTAMP = INDEFINITE_VIP_DATE.timestamp()
+
+
+class VipIndex:
+    """VIPs by player ID with every dated VIP also kept sorted by expiration
+
+    Range queries by expiration are a binary search plus the size of the result
+    instead of a scan of every VIP on the server. Indefinite VIPs sort after everyone
+    else since they expire in the year 3000
+    """
+
+    def __init__(
+        self,
+        vips: dict[str, VipPlayer],
+        seed_name_pattern: re.Pattern | None = None,
+        seed_player_ids: Iterable[str] = (),
+    ) -> None:
+        self.by_id = vips
+        self.seed_name_pattern = seed_name_pattern
+        self.seed_player_ids = frozenset(seed_player_ids)
+        # (expiration timestamp, player_id)
+        self._expirations: list[tuple[float, str]] = []
+        self._seed_expirations: list[tuple[float, str]] = []
+        self._no_expiration: set[str] = set()
+
+        for player_id, vip in vips.items():
+            if vip.expiration_date is None:
+                self._no_expiration.add(player_id)
+                continue
+
+            key = (vip.expiration_date.timestamp(), player_id)
+            self._expirations.append(key)
+            if self.seed_granted_by(vip):
+                self._seed_expirations.append(key)
+
+        self._expirations.sort()
+        self._seed_expirations.sort()
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __contains__(self, player_id: str) -> bool:
+        return player_id in self.by_id
+
+    def get(self, player_id: str) -> VipPlayer | None:
+        return self.by_id.get(player_id)
+
+    def add(self, vip: VipPlayer) -> None:
+        """Add or replace a VIP"""
+        player_id = vip.player.player_id
+        self.remove(player_id)
+        self.by_id[player_id] = vip
+        if vip.expiration_date is None:
+            self._no_expiration.add(player_id)
+            return
+
+        key = (vip.expiration_date.timestamp(), player_id)
+        insort(self._expirations, key)
+        if self.seed_granted_by(vip):
+            insort(self._seed_expirations, key)
+
+    def remove(self, player_id: str) -> None:
+        vip = self.by_id.pop(player_id, None)
+        if vip is None:
+            return
+        if vip.expiration_date is None:
+            self._no_expiration.discard(player_id)
+            return
+
+        key = (vip.expiration_date.timestamp(), player_id)
+        for keys in (self._expirations, self._seed_expirations):
+            idx = bisect_left(keys, key)
+            if idx < len(keys) and keys[idx] == key:
+                del keys[idx]
+
+    def seed_granted_by(self, vip: VipPlayer) -> tuple[str, ...]:
+        """Return how (if at all) the VIP was identified as granted by this tool"""
+        reasons: list[str] = []
+        if self.seed_name_pattern and self.seed_name_pattern.fullmatch(vip.player.name):
+            reasons.append("name")
+        if vip.player.player_id in self.seed_player_ids:
+            reasons.append("ledger")
+        return tuple(reasons)
+
+    def _range(
+        self,
+        keys: list[tuple[float, str]],
+        start: datetime | None,
+        end: datetime | None,
+    ) -> list[VipPlayer]:
+        lo = bisect_left(keys, (start.timestamp(),)) if start else 0
+        hi = bisect_left(keys, (end.timestamp(),)) if end else len(keys)
+        return [self.by_id[player_id] for _, player_id in keys[lo:hi]]
+
+    def expiring_between(
+        self, start: datetime | None = None, end: datetime | None = None
+    ) -> list[VipPlayer]:
+        """VIPs expiring in [start, end) sorted by expiration, including indefinite VIPs"""
+        return self._range(self._expirations, start, end)
+
+    def expiring_within(self, delta: timedelta, now: datetime) -> list[VipPlayer]:
+        return self.expiring_between(now, now + delta)
+
+    def expired(self, now: datetime) -> list[VipPlayer]:
+        return self.expiring_between(None, now)
+
+    def indefinite(self) -> list[VipPlayer]:
+        lo = bisect_left(self._expirations, (INDEFINITE_TIMESTAMP,))
+        return [self.by_id[player_id] for _, player_id in self._expirations[lo:]]
+
+    def indefinite_player_ids(self) -> set[str]:
+        return {vip.player.player_id for vip in self.indefinite()}
+
+    def without_expiration(self) -> list[VipPlayer]:
+        return [self.by_id[player_id] for player_id in self._no_expiration]
+
+    def seed_granted(
+        self, start: datetime | None = None, end: datetime | None = None
+    ) -> list[VipPlayer]:
+        """VIPs granted by this tool expiring in [start, end) sorted by expiration"""
+        return self._range(self._seed_expirations, start, end)
+
+    def count_expiring_before(self, end: datetime) -> int:
+        return bisect_left(self._expirations, (end.timestamp(),))
+
+    def online(self, players: ServerPopulation) -> dict[str, VipPlayer]:
+        """VIPs who are currently online, looked up by the online players"""
+        return {
+            player_id: self.by_id[player_id]
+            for player_id in players.players
+            if player_id in self.by_id
+        }
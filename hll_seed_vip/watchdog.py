@@ -0,0 +1,96 @@
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Final, Iterator
+
+import trio
+from loguru import logger
+
+from hll_seed_vip.config_watcher import ConfigWatcher
+from hll_seed_vip.metrics import metrics
+
+CHECK_INTERVAL: Final = 5
+
+
+def format_task_tree(task: trio.lowlevel.Task | None = None) -> str:
+    """Every task under `task` (the root task by default) and where it's awaiting"""
+    lines: list[str] = []
+
+    def walk(task: trio.lowlevel.Task, depth: int) -> None:
+        frames = " -> ".join(
+            f"{frame.f_code.co_name} ({Path(frame.f_code.co_filename).name}:{lineno})"
+            for frame, lineno in task.iter_await_frames()
+        )
+        lines.append(f"{'  ' * depth}{task.name}: {frames}")
+        for nursery in task.child_nurseries:
+            for child in nursery.child_tasks:
+                walk(child, depth + 1)
+
+    walk(task or trio.lowlevel.current_root_task(), 0)
+    return "\n".join(lines)
+
+
+class Watchdog:
+    """Detect a poll that never finishes
+
+    CRCON requests are retried forever so a poll can hang without raising anything, the
+    poller marks each poll with `tick` and `run` checks how long the current one has
+    been going. A stalled poll is logged with the task tree, fails the status API
+    health check and can optionally be cancelled so a new one starts
+    """
+
+    def __init__(self) -> None:
+        self.stalled = False
+        # trio.current_time() when the current poll started, None between polls
+        self.tick_started: float | None = None
+        self.last_tick: float | None = None
+        # tick_started of the last poll reported as stalled so it's only reported once
+        self._reported: float | None = None
+        self._scope: trio.CancelScope | None = None
+
+    @contextmanager
+    def tick(self) -> Iterator[trio.CancelScope]:
+        self._scope = trio.CancelScope()
+        self.tick_started = trio.current_time()
+        try:
+            with self._scope:
+                yield self._scope
+        finally:
+            cancelled = self._scope.cancelled_caught
+            self._scope = None
+            self.tick_started = None
+            if cancelled:
+                logger.warning("Cancelled the stalled poll, starting a new one")
+                metrics.incr("watchdog.restarts")
+            else:
+                self.last_tick = trio.current_time()
+                if self.stalled:
+                    logger.info("Polling has recovered")
+                    self.stalled = False
+                    metrics.set("watchdog.stalled", 0)
+
+    def check(self, stall_after: float, restart_tick: bool) -> bool:
+        """Report and (if `restart_tick`) cancel a stalled poll, return if it's stalled"""
+        if self.tick_started is None or self.tick_started == self._reported:
+            return self.stalled
+
+        elapsed = trio.current_time() - self.tick_started
+        if elapsed < stall_after:
+            return self.stalled
+
+        self.stalled = True
+        self._reported = self.tick_started
+        metrics.set("watchdog.stalled", 1)
+        metrics.incr("watchdog.stalls")
+        logger.error(
+            f"Poll has been running for {elapsed:.0f}s (stall_after={stall_after}s), tasks:\n{format_task_tree()}"
+        )
+        if restart_tick and self._scope:
+            self._scope.cancel()
+        return True
+
+    async def run(self, config_watcher: ConfigWatcher) -> None:
+        while True:
+            await trio.sleep(CHECK_INTERVAL)
+            config = config_watcher.config
+            if config.watchdog:
+                self.check(config.watchdog_stall_after, config.watchdog_restart_tick)
@@ -0,0 +1,82 @@
+import json
+import timeit
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+REPEAT = 7
+# Lines for the benchmark section of the terminal summary
+REPORT_KEY = pytest.StashKey[list[str]]()
+
+
+def calibrate() -> float:
+    """Time a fixed workload so results are comparable between machines"""
+    timer = timeit.Timer("sorted(str(i) for i in range(1000))")
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=REPEAT, number=number)) / number
+
+
+def load_baselines() -> dict[str, float]:
+    try:
+        return json.loads(BASELINES_PATH.read_text())
+    except FileNotFoundError:
+        return {}
+
+
+@pytest.fixture(scope="session")
+def benchmark_results(request):
+    results: dict[str, float] = {}
+    yield results
+
+    if request.config.getoption("--benchmark-save") and results:
+        baselines = load_baselines()
+        baselines.update(results)
+        BASELINES_PATH.write_text(
+            json.dumps(baselines, indent=2, sort_keys=True) + "\n"
+        )
+
+
+@pytest.fixture(scope="session")
+def calibration() -> float:
+    return calibrate()
+
+
+@pytest.fixture
+def bench(request, benchmark_results, calibration):
+    """Time `func` and compare it to the saved baseline
+
+    Times are stored relative to a calibration workload rather than in seconds
+    """
+
+    def run(func: Callable[[], object]) -> float:
+        name = request.node.name
+        timer = timeit.Timer(func)
+        number, _ = timer.autorange()
+        seconds = min(timer.repeat(repeat=REPEAT, number=number)) / number
+        relative = seconds / calibration
+        benchmark_results[name] = relative
+
+        baseline = load_baselines().get(name)
+        threshold = request.config.getoption("--benchmark-threshold")
+        request.node.user_properties.append(("benchmark_relative", relative))
+        request.config.stash.setdefault(REPORT_KEY, []).append(
+            f"{name}: {seconds * 1e6:.1f}us relative={relative:.3f} {baseline=}"
+        )
+        if baseline and not request.config.getoption("--benchmark-save"):
+            assert (
+                relative <= baseline * threshold
+            ), f"{name} is {relative / baseline:.2f}x slower than its baseline"
+        return seconds
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    lines = config.stash.get(REPORT_KEY, [])
+    if not lines:
+        return
+    terminalreporter.write_sep("-", "benchmarks")
+    for line in lines:
+        terminalreporter.write_line(line)
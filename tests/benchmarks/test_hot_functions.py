@@ -0,0 +1,137 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+import trio
+
+from hll_seed_vip.io import get_online_players, make_client
+from hll_seed_vip.models import GameState
+from hll_seed_vip.utils import (
+    calc_vip_expiration_timestamp,
+    check_player_conditions,
+    collect_steam_ids,
+    filter_indefinite_vip_steam_ids,
+    filter_online_players,
+    format_player_message,
+)
+from tests.test_conditions import (
+    make_mock_config,
+    make_mock_gamestate,
+    make_mock_get_vips_dict,
+    make_mock_player,
+    make_mock_server_pop,
+)
+
+pytestmark = pytest.mark.benchmark
+
+NUM_PLAYERS = 100
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def make_players(seed: int = 0):
+    rng = random.Random(seed)
+    return make_mock_server_pop(
+        players={
+            str(76561198000000000 + idx): make_mock_player(
+                player_id=str(76561198000000000 + idx),
+                name=f"player {idx}",
+                current_playertime_seconds=rng.randint(0, 3600),
+            )
+            for idx in range(NUM_PLAYERS)
+        }
+    )
+
+
+def make_vips(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return make_mock_get_vips_dict(
+        {
+            str(76561198000000000 + idx): NOW
+            + timedelta(hours=rng.randint(-5000, 5000))
+            for idx in range(count)
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def players():
+    return make_players()
+
+
+def test_check_player_conditions(bench, players):
+    config = make_mock_config()
+    bench(lambda: check_player_conditions(config=config, server_pop=players))
+
+
+def test_collect_steam_ids(bench, players):
+    config = make_mock_config()
+    cum_steam_ids = set(list(players.players)[:50])
+    bench(
+        lambda: collect_steam_ids(
+            config=config, players=players, cum_steam_ids=cum_steam_ids
+        )
+    )
+
+
+@pytest.mark.parametrize("num_vips", [10_000, 100_000])
+def test_filter_online_players(bench, players, num_vips):
+    vips = make_vips(num_vips)
+    bench(lambda: filter_online_players(vips, players))
+
+
+@pytest.mark.parametrize("num_vips", [10_000, 100_000])
+def test_filter_indefinite_vip_steam_ids(bench, num_vips):
+    vips = make_vips(num_vips)
+    bench(lambda: filter_indefinite_vip_steam_ids(vips))
+
+
+def test_calc_vip_expiration_timestamp(bench):
+    config = make_mock_config(cumulative_vip=True)
+    # One per player rewarded in a seed
+    expirations = [NOW + timedelta(hours=hours) for hours in range(NUM_PLAYERS)]
+    bench(
+        lambda: [
+            calc_vip_expiration_timestamp(
+                config=config, expiration=expiration, from_time=NOW
+            )
+            for expiration in expirations
+        ]
+    )
+
+
+def test_format_player_message(bench):
+    expiration = datetime.now(tz=timezone.utc) + timedelta(days=3)
+    bench(
+        lambda: format_player_message(
+            "You earned {vip_reward} of VIP, it expires {vip_expiration}",
+            vip_reward=timedelta(hours=24),
+            vip_expiration=expiration,
+        )
+    )
+
+
+def test_gamestate_model_validate(bench):
+    raw = make_mock_gamestate(allied=20, axis=20).model_dump(mode="json")
+    bench(lambda: GameState.model_validate(raw))
+
+
+def test_get_online_players(bench, players):
+    config = make_mock_config()
+    result = [
+        {
+            "name": player.name,
+            "player_id": player.player_id,
+            "profile": {"current_playtime_seconds": player.current_playtime_seconds},
+        }
+        for player in players.players.values()
+    ]
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, json={"result": result})
+    )
+
+    async def run():
+        async with make_client(config, {}, transport) as client:
+            await get_online_players(client, config.base_url)
+
+    bench(lambda: trio.run(run))
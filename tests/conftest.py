@@ -0,0 +1,31 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark")
+    group.addoption(
+        "--benchmark",
+        action="store_true",
+        help="Run the benchmarks in tests/benchmarks and compare them to the baselines",
+    )
+    group.addoption(
+        "--benchmark-save",
+        action="store_true",
+        help="Run the benchmarks and save the results as the new baselines",
+    )
+    group.addoption(
+        "--benchmark-threshold",
+        type=float,
+        default=1.3,
+        help="Fail a benchmark that is this many times slower than its baseline",
+    )
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark") or config.getoption("--benchmark-save"):
+        return
+
+    skip = pytest.mark.skip(reason="benchmarks only run with --benchmark")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
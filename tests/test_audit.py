@@ -0,0 +1,152 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import trio
+
+from hll_seed_vip.audit import (
+    DOUBLE_ADDITION,
+    EXPIRATION_MISMATCH,
+    MISSING,
+    WRONG_EXPIRATION,
+    audit_rewards,
+    check_grants,
+)
+from hll_seed_vip.backfill import grant_backfill
+from hll_seed_vip.ledger import GrantLedger, GrantRecord
+from tests.test_conditions import make_mock_config
+
+NOW = datetime.now(tz=timezone.utc)
+REWARD = timedelta(hours=24)
+
+
+def make_grant(
+    player_id: str, granted_at: datetime, expiration: datetime | None
+) -> GrantRecord:
+    return GrantRecord(
+        player_id=player_id,
+        name=f"player {player_id}",
+        expiration=expiration,
+        granted_at=granted_at,
+        server_url="http://example.com/",
+    )
+
+
+def test_check_grants_cumulative():
+    config = make_mock_config(cumulative_vip=True, vip_reward=REWARD)
+    first = NOW - timedelta(days=3)
+    grants = [
+        make_grant("ok", first, first + REWARD),
+        make_grant("ok", first + timedelta(hours=1), first + 2 * REWARD),
+        # Rewarded twice for the same seed
+        make_grant("double", first, first + REWARD),
+        make_grant("double", first + timedelta(seconds=5), first + 2 * REWARD),
+        # Only got the reward from the time of the seed
+        make_grant("wrong", first, first + REWARD),
+        make_grant(
+            "wrong", first + timedelta(hours=2), first + timedelta(hours=2) + REWARD
+        ),
+        # Expired and removed before seeding again
+        make_grant("removed", first, first + REWARD),
+        make_grant("removed", first + 2 * REWARD, first + 3 * REWARD),
+        make_grant("other-server", first, first + REWARD)._replace(
+            server_url="http://other.com/"
+        ),
+    ]
+    latest: dict[str, GrantRecord] = {}
+
+    findings = list(check_grants(config, grants, timedelta(minutes=5), latest))
+
+    assert [(f.kind, f.player_id) for f in findings] == [
+        (DOUBLE_ADDITION, "double"),
+        (WRONG_EXPIRATION, "wrong"),
+    ]
+    assert set(latest) == {"ok", "double", "wrong", "removed"}
+    assert latest["ok"].expiration == first + 2 * REWARD
+
+
+def test_audit_rewards_joins_vip_list(tmp_path):
+    config = make_mock_config(vip_reward=REWARD)
+    expiration = NOW + timedelta(hours=12)
+    with GrantLedger(tmp_path / "ledger.jsonl") as ledger:
+        for player_id in ("ok", "missing", "mismatch", "indefinite"):
+            ledger.record(make_grant(player_id, NOW - timedelta(hours=12), expiration))
+        ledger.record(make_grant("expired", NOW - timedelta(days=2), NOW - REWARD))
+
+    vips = [
+        {"player_id": "ok", "name": "ok", "vip_expiration": expiration.isoformat()},
+        {
+            "player_id": "mismatch",
+            "name": "mismatch",
+            "vip_expiration": (expiration - timedelta(hours=6)).isoformat(),
+        },
+        {
+            "player_id": "indefinite",
+            "name": "indefinite",
+            "vip_expiration": "3000-01-01T00:00:00+00:00",
+        },
+    ] + [
+        {"player_id": str(idx), "name": str(idx), "vip_expiration": None}
+        for idx in range(1000)
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"result": vips})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await audit_rewards(client, config, tmp_path / "ledger.jsonl")
+
+    report = trio.run(run)
+
+    # Must be serializable as is
+    report = json.loads(json.dumps(report))
+    assert report["players"] == 5
+    assert report["counts"] == {
+        MISSING: 1,
+        EXPIRATION_MISMATCH: 1,
+        DOUBLE_ADDITION: 0,
+        WRONG_EXPIRATION: 0,
+    }
+    assert {(f["kind"], f["player_id"]) for f in report["findings"]} == {
+        (MISSING, "missing"),
+        (EXPIRATION_MISMATCH, "mismatch"),
+    }
+
+
+def test_audit_backfilled_grants(tmp_path):
+    config = make_mock_config(dry_run=False, cumulative_vip=True, vip_reward=REWARD)
+    live = make_grant("1", NOW - timedelta(days=2), NOW + timedelta(hours=6))
+    vips = {
+        "1": {
+            "player_id": "1",
+            "name": "player 1",
+            "vip_expiration": live.expiration.isoformat(),
+        }
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("get_vip_ids"):
+            return httpx.Response(200, json={"result": list(vips.values())})
+        body = json.loads(request.content)
+        vips[body["player_id"]] = {
+            "player_id": body["player_id"],
+            "name": body["description"],
+            "vip_expiration": body["expiration"],
+        }
+        return httpx.Response(200, json={"result": "SUCCESS"})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with GrantLedger(tmp_path / "ledger.jsonl") as ledger:
+                ledger.record(live)
+                await grant_backfill(
+                    client, config, Counter({"1": 3, "2": 2}), {}, ledger=ledger
+                )
+            return await audit_rewards(client, config, tmp_path / "ledger.jsonl")
+
+    report = trio.run(run)
+
+    assert report["players"] == 2
+    assert report["findings"] == []
@@ -0,0 +1,292 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+import trio
+
+from hll_seed_vip.backfill import (
+    CONNECTED,
+    DISCONNECTED,
+    TEAMSWITCH,
+    ConnectionEvent,
+    find_missed_seeds,
+    grant_backfill,
+    parse_log_line,
+    parse_team,
+    read_connection_events,
+    recording_gaps,
+    replay_seeds,
+    run_backfill,
+)
+from hll_seed_vip.constants import INDEFINITE_VIP_DATE
+from hll_seed_vip.ledger import GrantLedger, read_ledger
+from hll_seed_vip.models import Team
+from hll_seed_vip.timeseries import PopulationRecord, PopulationWriter
+from tests.test_conditions import make_mock_config
+
+START = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+
+
+def make_line(minutes: float, action: str, player_id: str, sub_content=None) -> str:
+    return json.dumps(
+        {
+            "timestamp_ms": int(
+                (START + timedelta(minutes=minutes)).timestamp() * 1000
+            ),
+            "action": action,
+            "player_id_1": player_id,
+            "player_name_1": f"player {player_id}",
+            "sub_content": sub_content,
+        }
+    )
+
+
+def test_parse_log_line():
+    event = parse_log_line(make_line(1, TEAMSWITCH, "1", "None > Allies"))
+    assert event == ConnectionEvent(
+        timestamp=(START + timedelta(minutes=1)).timestamp(),
+        action=TEAMSWITCH,
+        player_id="1",
+        name="player 1",
+        team=Team.ALLIES,
+    )
+    assert parse_log_line(make_line(1, "KILL", "1")) is None
+    assert parse_team("Allies > Axis") == Team.AXIS
+    assert parse_team("Axis > None") is None
+
+
+def test_read_connection_events_skips_outside_range():
+    lines = [
+        make_line(-1, CONNECTED, "1"),
+        "not json",
+        make_line(0, CONNECTED, "2"),
+        make_line(5, DISCONNECTED, "2"),
+        make_line(10, CONNECTED, "3"),
+    ]
+    events = read_connection_events(lines, START, START + timedelta(minutes=10))
+    assert [(e.action, e.player_id) for e in events] == [
+        (CONNECTED, "2"),
+        (DISCONNECTED, "2"),
+    ]
+
+
+def test_replay_finds_seed_and_seeders():
+    config = make_mock_config(max_allies=2, max_axis=2, poll_time_seeding=60)
+    lines = [make_line(0, CONNECTED, "early")]
+    for idx, team in enumerate(["Allies", "Axis", "Allies"]):
+        lines.append(make_line(1, CONNECTED, str(idx)))
+        lines.append(make_line(1, TEAMSWITCH, str(idx), f"None > {team}"))
+    # Left before the server seeded but still counts with online_when_seeded off
+    lines.append(make_line(20, DISCONNECTED, "2"))
+    lines.append(make_line(30, CONNECTED, "late"))
+    lines.append(make_line(30, TEAMSWITCH, "late", "None > Axis"))
+
+    end = START + timedelta(hours=1)
+    seeds = list(
+        replay_seeds(
+            config,
+            read_connection_events(lines, START, end),
+            until=end.timestamp(),
+        )
+    )
+
+    assert len(seeds) == 1
+    assert START + timedelta(minutes=30) <= seeds[0].seeded_timestamp
+    assert seeds[0].seeders == {"early", "0", "1", "2"}
+    assert seeds[0].names["early"] == "player early"
+
+
+def test_find_missed_seeds_skips_live_seeds(monkeypatch):
+    config = make_mock_config(max_allies=1, max_axis=1, poll_time_seeding=60)
+    events = []
+    for hour in range(3):
+        minutes = hour * 60
+        events.append(make_line(minutes, CONNECTED, "1"))
+        events.append(make_line(minutes + 5, CONNECTED, "2"))
+        events.append(make_line(minutes + 20, DISCONNECTED, "1"))
+        events.append(make_line(minutes + 20, DISCONNECTED, "2"))
+
+    end = START + timedelta(hours=3)
+    seeds = list(
+        replay_seeds(
+            config, read_connection_events(events, START, end), until=end.timestamp()
+        )
+    )
+    assert len(seeds) == 3
+
+    live_seeds = [seeds[1].seeded_timestamp + timedelta(minutes=3)]
+    missed = list(find_missed_seeds(seeds, live_seeds, timedelta(minutes=15)))
+    assert [seed.seeded_timestamp for seed in missed] == [
+        seeds[0].seeded_timestamp,
+        seeds[2].seeded_timestamp,
+    ]
+
+
+def test_replay_tracks_players_online_before_since():
+    config = make_mock_config(max_allies=1, max_axis=1, poll_time_seeding=60)
+    lines = [make_line(-30, CONNECTED, "1"), make_line(1, CONNECTED, "2")]
+    end = START + timedelta(hours=1)
+
+    def seeders(lookback: timedelta) -> list[set[str]]:
+        events = read_connection_events(lines, START - lookback, end)
+        return [
+            seed.seeders
+            for seed in replay_seeds(
+                config, events, until=end.timestamp(), since=START.timestamp()
+            )
+        ]
+
+    # Player 2 joined as it seeded so only player 1 played for minimum_play_time
+    assert seeders(timedelta(hours=1)) == [{"1"}]
+    # Without the lookback player 1 was never online
+    assert seeders(timedelta(0)) == []
+
+
+def test_recording_gaps():
+    assert recording_gaps([], 0, 1000, 100) == [(0, 1000)]
+    assert recording_gaps([50, 100, 400, 450, 520, 600], 0, 650, 100) == [(100, 400)]
+    assert recording_gaps([500], 0, 1000, 100) == [(0, 500), (500, 1000)]
+
+
+def hourly_seed_lines() -> list[str]:
+    lines = []
+    for hour in range(3):
+        minutes = hour * 60
+        lines.append(make_line(minutes, CONNECTED, "1"))
+        lines.append(make_line(minutes + 5, CONNECTED, "2"))
+        lines.append(make_line(minutes + 20, DISCONNECTED, "1"))
+        lines.append(make_line(minutes + 20, DISCONNECTED, "2"))
+    return lines
+
+
+def test_run_backfill_only_grants_seeds_in_recording_gaps(tmp_path):
+    config = make_mock_config(
+        max_allies=1, max_axis=1, poll_time_seeding=60, cumulative_vip=True
+    )
+    # The seeder was only running during the second hour and didn't see a seed
+    with PopulationWriter(tmp_path) as writer:
+        for minutes in range(60, 120):
+            writer.append(
+                PopulationRecord(
+                    timestamp=START + timedelta(minutes=minutes),
+                    num_allied_players=0,
+                    num_axis_players=0,
+                    num_online_players=0,
+                    num_seeders=0,
+                    is_seeding=True,
+                )
+            )
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"result": []})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await run_backfill(
+                client,
+                config,
+                hourly_seed_lines(),
+                start=START,
+                end=START + timedelta(hours=3),
+                population_dir=tmp_path,
+            )
+
+    grants = trio.run(run)
+
+    assert [grant.player_id for grant in grants] == ["1", "2"]
+    # 2 of the 3 seeds were missed
+    assert grants[0].expiration == grants[0].granted_at + timedelta(hours=48)
+
+
+def test_run_backfill_refuses_to_apply_without_population(tmp_path):
+    config = make_mock_config(dry_run=False, max_allies=1, max_axis=1)
+    requests: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return httpx.Response(200, json={"result": []})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            await run_backfill(
+                client,
+                config,
+                hourly_seed_lines(),
+                start=START,
+                end=START + timedelta(hours=3),
+                population_dir=tmp_path,
+            )
+
+    with pytest.raises(ValueError, match="No population records"):
+        trio.run(run)
+    assert requests == []
+
+
+def test_grant_backfill_batches_and_records(tmp_path):
+    config = make_mock_config(
+        dry_run=False, cumulative_vip=True, vip_reward=timedelta(hours=1)
+    )
+    existing = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    vips = [
+        {"player_id": "1", "name": "existing", "vip_expiration": existing.isoformat()},
+        {
+            "player_id": "2",
+            "name": "forever",
+            "vip_expiration": INDEFINITE_VIP_DATE.isoformat(),
+        },
+        {"player_id": "other", "name": "other", "vip_expiration": None},
+    ]
+    added: dict[str, dict] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("get_vip_ids"):
+            return httpx.Response(200, json={"result": vips})
+        body = json.loads(request.content)
+        added[body["player_id"]] = body
+        return httpx.Response(200, json={"result": "SUCCESS"})
+
+    rewards = Counter({"1": 2, "2": 1, "3": 1})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with GrantLedger(tmp_path / "ledger.jsonl") as ledger:
+                return await grant_backfill(
+                    client,
+                    config,
+                    rewards,
+                    {"3": "new"},
+                    ledger=ledger,
+                    batch_size=1,
+                    batch_delay=0,
+                )
+
+    grants = trio.run(run)
+
+    assert [grant.player_id for grant in grants] == ["1", "3"]
+    assert set(added) == {"1", "3"}
+    assert added["1"]["expiration"] == (existing + timedelta(hours=2)).isoformat()
+    assert added["3"]["description"] == "new - HLL Seed VIP"
+    assert [grant.player_id for grant in read_ledger(tmp_path / "ledger.jsonl")] == [
+        "1",
+        "3",
+    ]
+
+
+def test_grant_backfill_dry_run():
+    config = make_mock_config(dry_run=True)
+    requests: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return httpx.Response(200, json={"result": []})
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await grant_backfill(client, config, Counter({"1": 1}), {})
+
+    grants = trio.run(run)
+
+    assert [grant.player_id for grant in grants] == ["1"]
+    assert requests == ["/api/get_vip_ids"]
@@ -0,0 +1,240 @@
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+import trio
+import trio.testing
+
+from hll_seed_vip.cleanup import (
+    cleanup_expired_vips,
+    find_expired_seed_vips,
+    format_cleanup_report,
+    run_vip_cleanup,
+)
+from hll_seed_vip.config_watcher import ConfigWatcher
+from hll_seed_vip.io import make_client
+from hll_seed_vip.ledger import GrantLedger, GrantRecord, read_ledger
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.models import Player, VipPlayer
+from hll_seed_vip.templates import template_pattern
+from hll_seed_vip.utils import reward_players
+from tests.test_conditions import make_mock_config
+
+NOW = datetime.now(tz=timezone.utc)
+
+
+def make_vip(player_id: str, name: str, expiration: datetime | None) -> VipPlayer:
+    return VipPlayer(
+        player=Player(player_id=player_id, name=name, current_playtime_seconds=0),
+        expiration_date=expiration,
+    )
+
+
+VIPS = {
+    vip.player.player_id: vip
+    for vip in (
+        make_vip("expired-seed", "Alice - HLL Seed VIP", NOW - timedelta(days=2)),
+        make_vip("active-seed", "Bob - HLL Seed VIP", NOW + timedelta(days=1)),
+        make_vip("expired-other", "Carol", NOW - timedelta(days=1)),
+        make_vip("expired-ledger", "Dave", NOW - timedelta(hours=1)),
+        make_vip("indefinite", "Eve - HLL Seed VIP", None),
+    )
+}
+
+
+@pytest.mark.parametrize(
+    "template, name, expected",
+    [
+        ("{player_name} - HLL Seed VIP", "Alice - HLL Seed VIP", True),
+        ("{player_name} - HLL Seed VIP", "Alice", False),
+        ("[Seed] {player_name}", "[Seed] a.b (c)", True),
+        ("[Seed] {player_name}", "[Seed]", False),
+        ("Seed VIP", "Seed VIP", True),
+    ],
+)
+def test_template_pattern(template, name, expected):
+    pattern = template_pattern(template)
+    assert pattern is not None
+    assert bool(pattern.fullmatch(name)) == expected
+
+
+def test_template_pattern_without_literals():
+    assert template_pattern("{player_name}") is None
+
+
+@pytest.mark.parametrize(
+    "match, expected",
+    [
+        ("name", ["expired-seed"]),
+        ("ledger", ["expired-seed", "expired-ledger"]),
+        ("both", ["expired-seed", "expired-ledger"]),
+    ],
+)
+def test_find_expired_seed_vips(match, expected):
+    config = make_mock_config().model_copy(update={"vip_cleanup_match": match})
+    candidates = find_expired_seed_vips(
+        config=config,
+        vips=VIPS,
+        ledger_player_ids={"expired-seed", "expired-ledger", "active-seed"},
+        now=NOW,
+    )
+    assert [c.player_id for c in candidates] == expected
+
+
+def test_format_cleanup_report():
+    config = make_mock_config().model_copy(update={"vip_cleanup_match": "name"})
+    candidates = find_expired_seed_vips(config, VIPS, set(), NOW)
+    report = format_cleanup_report(candidates, total_vips=len(VIPS), dry_run=True)
+    assert report.startswith("Would remove 1 of 5 VIP entries")
+    assert "'Alice - HLL Seed VIP'" in report
+
+
+def make_crcon_transport(requests: list[httpx.Request]) -> httpx.MockTransport:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path.endswith("get_vip_ids"):
+            result = [
+                {
+                    "player_id": vip.player.player_id,
+                    "name": vip.player.name,
+                    "vip_expiration": (
+                        vip.expiration_date.isoformat() if vip.expiration_date else None
+                    ),
+                }
+                for vip in VIPS.values()
+            ]
+            return httpx.Response(200, json={"result": result})
+        return httpx.Response(200, json={"result": "SUCCESS"})
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.parametrize("dry_run", [True, False])
+def test_cleanup_expired_vips(dry_run):
+    requests: list[httpx.Request] = []
+    config = make_mock_config(dry_run=False).model_copy(
+        update={
+            "vip_cleanup_dry_run": dry_run,
+            "vip_cleanup_match": "name",
+            "vip_cleanup_batch_delay": 0,
+        }
+    )
+
+    async def run():
+        async with make_client(config, {}, make_crcon_transport(requests)) as client:
+            return await cleanup_expired_vips(client, config)
+
+    candidates = trio.run(run)
+    assert [c.player_id for c in candidates] == ["expired-seed"]
+    removed = [
+        json.loads(r.content)["player_id"]
+        for r in requests
+        if r.url.path.endswith("remove_vip")
+    ]
+    assert removed == ([] if dry_run else ["expired-seed"])
+
+
+def test_reward_players_records_grants(tmp_path):
+    requests: list[httpx.Request] = []
+    config = make_mock_config(dry_run=False)
+    expiration = NOW + timedelta(days=1)
+    ledger_path = tmp_path / "grants.jsonl"
+
+    async def run():
+        async with make_client(config, {}, make_crcon_transport(requests)) as client:
+            with GrantLedger(ledger_path) as ledger:
+                await reward_players(
+                    client=client,
+                    config=config,
+                    to_add_vip_steam_ids={"1"},
+                    current_vips={},
+                    players_lookup={"1": "Alice"},
+                    expiration_timestamps=defaultdict(lambda: expiration),
+                    ledger=ledger,
+                )
+
+    trio.run(run)
+    (grant,) = read_ledger(ledger_path)
+    assert grant.player_id == "1"
+    assert grant.name == "Alice - HLL Seed VIP"
+    assert grant.expiration == expiration
+
+
+def test_read_ledger_skips_invalid_lines(tmp_path):
+    path = tmp_path / "grants.jsonl"
+    grant = GrantRecord(
+        player_id="1",
+        name="Alice",
+        expiration=None,
+        granted_at=NOW,
+        server_url="http://example.com/",
+    )
+    path.write_text(grant.to_json() + "\n{not json\n\n")
+    assert list(read_ledger(path)) == [grant]
+    assert list(read_ledger(tmp_path / "missing.jsonl")) == []
+
+
+def test_run_vip_cleanup_survives_errors(tmp_path):
+    config = make_mock_config().model_copy(
+        update={"vip_cleanup": True, "vip_cleanup_interval": 60}
+    )
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(trio.current_time())
+        # A VIP without a name
+        return httpx.Response(200, json={"result": [{"player_id": "1"}]})
+
+    async def run():
+        async with make_client(
+            config, {}, httpx.MockTransport(handler)
+        ) as client, trio.open_nursery() as nursery:
+            nursery.start_soon(
+                run_vip_cleanup,
+                client,
+                ConfigWatcher(tmp_path / "config.yml", config),
+            )
+            await trio.sleep(150)
+            nursery.cancel_scope.cancel()
+
+    metrics.clear()
+    trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))
+    assert len(attempts) == 2
+    assert metrics.counters["vip_cleanup.failed"] == 2
+
+
+def test_run_vip_cleanup_waits_for_rewards(tmp_path):
+    config = make_mock_config().model_copy(
+        update={"vip_cleanup": True, "vip_cleanup_interval": 60}
+    )
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        attempts.append(trio.current_time())
+        return httpx.Response(200, json={"result": []})
+
+    async def run():
+        vip_lock = trio.Lock()
+        async with make_client(
+            config, {}, httpx.MockTransport(handler)
+        ) as client, trio.open_nursery() as nursery:
+            # Rewarding seeders
+            await vip_lock.acquire()
+            nursery.start_soon(
+                run_vip_cleanup,
+                client,
+                ConfigWatcher(tmp_path / "config.yml", config),
+                None,
+                None,
+                vip_lock,
+            )
+            await trio.sleep(100)
+            assert attempts == []
+            vip_lock.release()
+            await trio.sleep(1)
+            nursery.cancel_scope.cancel()
+
+    trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))
+    assert attempts == [100]
@@ -0,0 +1,79 @@
+import os
+from pathlib import Path
+
+import yaml
+from loguru import logger
+
+from hll_seed_vip.config_watcher import ConfigWatcher, diff_configs
+from hll_seed_vip.utils import load_config
+
+DEFAULT_CONFIG = Path(__file__).parent.parent.joinpath("default_config.yml")
+
+
+def write_config(path: Path, mtime_ns: int, **overrides):
+    raw_config = yaml.safe_load(DEFAULT_CONFIG.read_text())
+    raw_config["base_url"] = "http://example.com"
+    raw_config |= overrides
+    path.write_text(yaml.safe_dump(raw_config))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def make_watcher(tmp_path: Path) -> ConfigWatcher:
+    path = tmp_path.joinpath("config.yml")
+    write_config(path, mtime_ns=1_000_000_000)
+    return ConfigWatcher(path, load_config(path))
+
+
+def test_reloads_changed_config(tmp_path):
+    watcher = make_watcher(tmp_path)
+    original = watcher.config
+
+    assert not watcher.check()
+
+    write_config(watcher.path, mtime_ns=2_000_000_000, poll_time_seeded=60)
+    assert watcher.check()
+    assert watcher.config is not original
+    assert watcher.config.poll_time_seeded == 60
+    assert diff_configs(original, watcher.config) == {"poll_time_seeded": (300, 60)}
+
+
+def test_keeps_config_on_invalid_edit(tmp_path):
+    watcher = make_watcher(tmp_path)
+    original = watcher.config
+
+    watcher.path.write_text("base_url: [unterminated")
+    os.utime(watcher.path, ns=(2_000_000_000, 2_000_000_000))
+    assert not watcher.check()
+    assert watcher.config is original
+
+    write_config(watcher.path, mtime_ns=3_000_000_000, poll_time_seeding="soon")
+    assert not watcher.check()
+    assert watcher.config is original
+
+
+def test_ignores_touch_without_changes(tmp_path):
+    watcher = make_watcher(tmp_path)
+    original = watcher.config
+
+    write_config(watcher.path, mtime_ns=2_000_000_000)
+    assert not watcher.check()
+    assert watcher.config is original
+
+
+def test_warns_about_settings_that_need_a_restart(tmp_path):
+    watcher = make_watcher(tmp_path)
+    messages: list[str] = []
+    sink = logger.add(messages.append, level="WARNING")
+    try:
+        write_config(
+            watcher.path,
+            mtime_ns=2_000_000_000,
+            poll_time_seeded=60,
+            http={"max_connections": 2},
+        )
+        assert watcher.check()
+    finally:
+        logger.remove(sink)
+
+    assert any("http_max_connections only takes effect" in m for m in messages)
+    assert not any("poll_time_seeded" in m for m in messages)
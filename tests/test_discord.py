@@ -1,4 +1,5 @@
-from hll_seed_vip.utils import make_seed_announcement_embed
+from hll_seed_vip.utils import layer_embed_assets, make_seed_announcement_embed
+from tests.test_conditions import make_mock_layer
 
 
 def test_make_seed_announcement_embed():
@@ -31,3 +32,24 @@ def test_make_seed_announcement_embed():
         assert field == expected
 
     # assert False
+
+
+def test_layer_embed_assets():
+    layer = make_mock_layer(image_url="https://example.com/mortain-overcast.webp")
+    assets = layer_embed_assets(layer)
+    assert assets.map_name == "Mortain"
+    assert assets.image_url == "https://example.com/mortain-overcast.webp"
+    # Cached for the rest of the match
+    assert layer_embed_assets(make_mock_layer()) is assets
+
+    e = make_seed_announcement_embed(
+        message="live",
+        current_map=assets.map_name,
+        time_remaining="1:00:00",
+        player_count_message="{num_allied_players} - {num_axis_players}",
+        num_allied_players=1,
+        num_axis_players=1,
+        image_url=assets.image_url,
+    )
+    assert e
+    assert e.thumbnail["url"] == assets.image_url
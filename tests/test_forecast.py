@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+import pytest
+
+from hll_seed_vip.forecast import SeedForecaster
+from hll_seed_vip.utils import players_until_seeded
+from tests.test_conditions import make_mock_config, make_mock_gamestate
+
+
+def test_forecaster_tracks_steady_join_rate():
+    forecaster = SeedForecaster()
+    # 1 player joins every 30 seconds
+    for poll in range(40):
+        forecaster.update(poll * 30.0, poll)
+
+    assert forecaster.players_per_minute == pytest.approx(2, rel=0.01)
+    assert forecaster.eta(10) == pytest.approx(timedelta(minutes=5), rel=0.01)
+
+
+def test_forecaster_irregular_intervals():
+    forecaster = SeedForecaster()
+    timestamp = 0.0
+    for interval in [10, 60, 20, 120, 10] * 8:
+        timestamp += interval
+        forecaster.update(timestamp, int(timestamp / 60))
+
+    assert forecaster.players_per_minute == pytest.approx(1, rel=0.2)
+
+
+def test_forecaster_no_joins():
+    forecaster = SeedForecaster()
+    assert forecaster.eta(5) is None
+    for poll in range(10):
+        forecaster.update(poll * 30.0, 12)
+
+    assert forecaster.players_per_second == 0
+    assert forecaster.eta(5) is None
+    assert forecaster.eta(0) == timedelta(0)
+
+
+@pytest.mark.parametrize(
+    "allied, axis, expected",
+    [(0, 0, 40), (10, 5, 25), (25, 5, 15), (20, 20, 0), (30, 30, 0)],
+)
+def test_players_until_seeded(allied, axis, expected):
+    config = make_mock_config(max_allies=20, max_axis=20)
+    gamestate = make_mock_gamestate(allied=allied, axis=axis)
+    assert players_until_seeded(config=config, gamestate=gamestate) == expected
@@ -0,0 +1,55 @@
+import httpx
+import trio
+
+from hll_seed_vip.ids import PlayerIdRegistry, player_ids
+from hll_seed_vip.io import get_online_players, make_client
+from tests.test_conditions import make_mock_config
+
+
+def make_id(suffix: int) -> str:
+    # Built at runtime so the literals aren't already shared by the compiler
+    return "".join(["7656119800000", str(suffix).zfill(4)])
+
+
+def test_intern_returns_one_copy():
+    registry = PlayerIdRegistry()
+    first = registry.intern(make_id(1))
+    second = registry.intern(make_id(1))
+    assert first is second
+    registry.intern(make_id(2))
+    assert len(registry) == 2
+    assert make_id(1) in registry
+
+
+def test_intern_is_bounded():
+    registry = PlayerIdRegistry(max_size=2)
+    first = registry.intern(make_id(1))
+    registry.intern(make_id(2))
+    extra = make_id(3)
+    assert registry.intern(extra) is extra
+    assert make_id(3) not in registry
+    assert len(registry) == 2
+    assert registry.intern(make_id(1)) is first
+
+
+def test_get_online_players_interns_ids():
+    config = make_mock_config()
+    result = [
+        {
+            "name": "player",
+            "player_id": make_id(9999),
+            "profile": {"current_playtime_seconds": 10},
+        }
+    ]
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, json={"result": result})
+    )
+
+    async def run():
+        async with make_client(config, {}, transport) as client:
+            return [await get_online_players(client, config.base_url) for _ in range(2)]
+
+    first, second = trio.run(run)
+    (first_id,) = first.players
+    (second_id,) = second.players
+    assert first_id is second_id is player_ids.intern(make_id(9999))
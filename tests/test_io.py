@@ -0,0 +1,117 @@
+import json
+
+import httpx
+import trio
+import trio.testing
+
+from hll_seed_vip.io import get_gamestate, get_pool_stats, get_vips, make_client
+from tests.test_conditions import make_mock_config, make_mock_gamestate
+
+
+def test_make_client_endpoint_timeouts():
+    config = make_mock_config().model_copy(
+        update={"http_timeouts": {"default": 3, "get_gamestate": 1.5}}
+    )
+    timeouts: dict[str, dict] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        timeouts[request.url.path] = request.extensions["timeout"]
+        return httpx.Response(
+            200, json={"result": make_mock_gamestate().model_dump(mode="json")}
+        )
+
+    async def run():
+        async with make_client(
+            config, headers={}, transport=httpx.MockTransport(handler)
+        ) as client:
+            await get_gamestate(client, config.base_url)
+            await client.get(f"{config.base_url}api/get_vip_ids")
+            await client.get(f"{config.base_url}api/get_status")
+            assert get_pool_stats(client) == {
+                "http.requests_active": 0,
+                "http.requests_queued": 0,
+            }
+
+    trio.run(run)
+
+    assert timeouts["/api/get_gamestate"]["read"] == 1.5
+    assert timeouts["/api/get_vip_ids"]["read"] == 60
+    assert timeouts["/api/get_status"]["read"] == 3
+
+
+def test_make_client_pool_limits():
+    config = make_mock_config().model_copy(
+        update={"http_max_connections": 4, "http_max_keepalive_connections": 2}
+    )
+
+    async def run():
+        async with make_client(config, headers={}) as client:
+            pool = client._transport.transport._pool
+            assert pool._max_connections == 4
+            assert pool._max_keepalive_connections == 2
+
+    trio.run(run)
+
+
+def test_get_vips_streams_and_filters():
+    config = make_mock_config()
+    vips = [
+        {
+            "player_id": str(idx),
+            "name": f"player {idx}",
+            "vip_expiration": "2024-01-01T00:00:00+00:00" if idx % 2 else None,
+        }
+        for idx in range(1000)
+    ]
+    body = json.dumps({"result": vips, "failed": False}).encode()
+
+    async def stream_body():
+        for idx in range(0, len(body), 100):
+            yield body[idx : idx + 100]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=stream_body())
+
+    async def run():
+        async with make_client(
+            config, headers={}, transport=httpx.MockTransport(handler)
+        ) as client:
+            everyone = await get_vips(client, config.base_url)
+            online = await get_vips(
+                client, config.base_url, player_filter={"1", "2", "5000"}.__contains__
+            )
+        return everyone, online
+
+    everyone, online = trio.run(run)
+    assert len(everyone) == 1000
+    assert list(online) == ["1", "2"]
+    assert online["1"].player.name == "player 1"
+    assert online["2"].expiration_date is None
+
+
+def test_pool_stats_count_requests_in_flight():
+    config = make_mock_config().model_copy(update={"http_max_connections": 2})
+    release = trio.Event()
+    stats: list[dict[str, int]] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await release.wait()
+        return httpx.Response(200, json={"result": []})
+
+    async def run():
+        async with make_client(
+            config, headers={}, transport=httpx.MockTransport(handler)
+        ) as client:
+            async with trio.open_nursery() as nursery:
+                for _ in range(3):
+                    nursery.start_soon(client.get, f"{config.base_url}api/get_players")
+                await trio.testing.wait_all_tasks_blocked()
+                stats.append(get_pool_stats(client))
+                release.set()
+            stats.append(get_pool_stats(client))
+
+    trio.run(run)
+    assert stats == [
+        {"http.requests_active": 2, "http.requests_queued": 1},
+        {"http.requests_active": 0, "http.requests_queued": 0},
+    ]
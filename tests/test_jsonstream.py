@@ -0,0 +1,70 @@
+import json
+
+import pytest
+import trio
+
+from hll_seed_vip.jsonstream import iter_json_array
+
+
+async def aiter_chunks(text: str, size: int):
+    for idx in range(0, len(text), size):
+        yield text[idx : idx + size]
+
+
+def collect(text: str, size: int, key: str = "result") -> list:
+    async def run():
+        return [item async for item in iter_json_array(aiter_chunks(text, size), key)]
+
+    return trio.run(run)
+
+
+BODY = {
+    "command": "get_vip_ids",
+    "arguments": {"nested": [1, {"result": [0]}]},
+    "failed": False,
+    "version": 10.5,
+    "result": [
+        {
+            "player_id": "76561198000000001",
+            "name": 'Ä {\\"} ,]',
+            "vip_expiration": None,
+        },
+        {"player_id": "2", "name": "two", "vip_expiration": "2024-01-01T00:00:00"},
+        12345,
+        [1, 2],
+    ],
+    "error": None,
+}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100_000])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_iter_json_array(size, indent):
+    text = json.dumps(BODY, indent=indent, ensure_ascii=False)
+    assert collect(text, size) == BODY["result"]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '{"result": []}',
+        '{ "result" : [ ] , "failed": false}',
+    ],
+)
+def test_iter_json_array_empty(text):
+    assert collect(text, 1) == []
+
+
+@pytest.mark.parametrize(
+    "text, error",
+    [
+        ('{"failed": true}', KeyError),
+        ("{}", KeyError),
+        ('{"result": null}', ValueError),
+        ('{"result": [{"player_id": "1"}', ValueError),
+        ('[{"result": []}]', ValueError),
+    ],
+)
+def test_iter_json_array_errors(text, error):
+    with pytest.raises(error):
+        collect(text, 3)
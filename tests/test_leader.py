@@ -0,0 +1,136 @@
+import time
+from pathlib import Path
+
+import trio
+
+from hll_seed_vip.leader import (
+    FileLockLease,
+    LeaderElector,
+    LeaseBackend,
+    SQLiteLease,
+    lease_path,
+)
+from hll_seed_vip.pipeline import SeededEvent, reward_worker
+from tests.test_conditions import make_mock_config
+from tests.test_pipeline import START, make_snapshot
+
+
+class UnavailableLease(LeaseBackend):
+    def __init__(self) -> None:
+        self.available = True
+
+    def acquire(self, holder: str, lease_time: float) -> bool:
+        if not self.available:
+            raise OSError("unavailable")
+        return True
+
+    def release(self, holder: str) -> None:
+        pass
+
+
+def test_file_lock_lease(tmp_path):
+    path = tmp_path / "leader.lock"
+    first = FileLockLease(path)
+    second = FileLockLease(path)
+
+    assert first.acquire("first", 30)
+    assert first.acquire("first", 30)
+    assert not second.acquire("second", 30)
+
+    first.release("first")
+    assert second.acquire("second", 30)
+    assert path.read_text() == "second"
+
+
+def test_sqlite_lease(tmp_path):
+    path = tmp_path / "leases.db"
+    lease = SQLiteLease(path)
+
+    assert lease.acquire("first", 30)
+    assert not lease.acquire("second", 30)
+    # Renewing
+    assert lease.acquire("first", 30)
+    # Other servers have their own lease
+    assert SQLiteLease(path, name="other").acquire("second", 30)
+
+    lease.release("second")
+    assert not lease.acquire("second", 30)
+    lease.release("first")
+    assert lease.acquire("second", 30)
+
+    # An expired lease can be taken over
+    assert lease.acquire("second", -1)
+    assert lease.acquire("first", 30)
+
+
+def test_leader_elector_takeover(tmp_path):
+    path = tmp_path / "leases.db"
+    leader = LeaderElector(SQLiteLease(path), holder="leader")
+    standby = LeaderElector(SQLiteLease(path), holder="standby")
+
+    assert leader.try_acquire()
+    assert not standby.try_acquire()
+    assert not standby.is_leader
+
+    leader.release()
+    assert not leader.is_leader
+    assert standby.try_acquire()
+    assert not leader.try_acquire()
+
+
+def test_leader_elector_keeps_lease_until_expiry():
+    backend = UnavailableLease()
+    elector = LeaderElector(backend, lease_time=0.2)
+    assert elector.try_acquire()
+
+    backend.available = False
+    assert elector.try_acquire()
+    time.sleep(0.2)
+    assert not elector.try_acquire()
+
+
+def test_standby_does_not_reward():
+    class NeverLeader(LeaseBackend):
+        def acquire(self, holder: str, lease_time: float) -> bool:
+            return False
+
+        def release(self, holder: str) -> None:
+            pass
+
+    async def run():
+        send_channel, receive_channel = trio.open_memory_channel(1)
+        elector = LeaderElector(NeverLeader())
+        elector.try_acquire()
+        async with send_channel:
+            await send_channel.send(
+                SeededEvent(
+                    snapshot=make_snapshot(20, 20),
+                    seeded_timestamp=START,
+                    seeders={"1"},
+                    names={},
+                )
+            )
+        # Would fail trying to use the client if it tried to reward anyone
+        await reward_worker(None, receive_channel, elector)  # type: ignore
+
+    trio.run(run)
+
+
+def test_lease_path_defaults_per_server():
+    config = make_mock_config().model_copy(update={"leader_election": True})
+    other = config.model_copy(update={"base_url": "http://other.com/"})
+
+    leader_dir = Path("/data/leader")
+
+    assert lease_path(config, leader_dir) != lease_path(other, leader_dir)
+    assert lease_path(config, leader_dir) == lease_path(config.model_copy(), leader_dir)
+    assert lease_path(config, leader_dir).parent == leader_dir
+
+    sqlite = config.model_copy(update={"leader_backend": "sqlite"})
+    assert lease_path(sqlite, leader_dir) == lease_path(
+        other.model_copy(update={"leader_backend": "sqlite"}), leader_dir
+    )
+    assert lease_path(sqlite, leader_dir).parent == leader_dir
+    assert lease_path(
+        config.model_copy(update={"leader_lease_path": "/tmp/lease"}), leader_dir
+    ) == Path("/tmp/lease")
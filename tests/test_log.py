@@ -0,0 +1,40 @@
+from loguru import logger
+
+from hll_seed_vip.log import BatchingFileSink, summarize
+
+
+def test_summarize():
+    assert summarize({"1", "2"}, sample_size=5).startswith("len=2 ")
+    assert summarize(list(range(1000)), sample_size=3) == "len=1000 sample=[0, 1, 2]"
+    assert (
+        summarize({str(i): i for i in range(1000)}, sample_size=2)
+        == "len=1000 sample={'0': 0, '1': 1}"
+    )
+
+
+def test_batching_file_sink_flushes_on_stop(tmp_path):
+    path = tmp_path.joinpath("seeding.log")
+    sink = BatchingFileSink(path, batch_size=1000, flush_interval=60)
+    handler_id = logger.add(sink, format="{message}")
+    try:
+        for idx in range(250):
+            logger.info("line {}", idx)
+    finally:
+        logger.remove(handler_id)
+
+    lines = path.read_text().splitlines()
+    assert lines == [f"line {idx}" for idx in range(250)]
+
+
+def test_batching_file_sink_rotates(tmp_path):
+    path = tmp_path.joinpath("seeding.log")
+    sink = BatchingFileSink(path, rotation_bytes=1024, batch_size=10)
+    for idx in range(100):
+        sink.write(f"{idx:>99}\n")
+    sink.stop()
+
+    rotated = list(tmp_path.glob("seeding.*.log"))
+    assert rotated
+    assert path.stat().st_size <= 1024
+    total = sum(len(p.read_text().splitlines()) for p in [path, *rotated])
+    assert total == 100
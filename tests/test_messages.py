@@ -1,9 +1,22 @@
 from datetime import date, datetime, timedelta, timezone
 
+import pydantic
 import pytest
 from freezegun import freeze_time
+from humanize import naturaltime
 
-from hll_seed_vip.utils import format_player_message, format_vip_reward_name
+from hll_seed_vip.models import ServerConfig
+from hll_seed_vip.templates import (
+    PLAYER_MESSAGE_FIELDS,
+    compile_template,
+    natural_expiration,
+)
+from hll_seed_vip.utils import (
+    format_player_message,
+    format_seeding_complete_message,
+    format_vip_reward_name,
+)
+from tests.test_conditions import make_mock_config
 
 
 @pytest.mark.parametrize(
@@ -78,3 +91,74 @@ def test_format_player_message(
 )
 def test_format_vip_reward_name(name, format_str, expected):
     assert format_vip_reward_name(player_name=name, format_str=format_str) == expected
+
+
+@pytest.mark.parametrize(
+    "template, fields, expected",
+    [
+        ("seed", frozenset(), "seed"),
+        ("{{literal}} braces", frozenset(), "{literal} braces"),
+        ("{vip_reward} of VIP", frozenset({"vip_reward"}), "12 of VIP"),
+    ],
+)
+def test_compile_template(template, fields, expected):
+    compiled = compile_template(template, PLAYER_MESSAGE_FIELDS)
+    assert compiled.fields == fields
+    assert compiled.render(vip_reward=12) == expected
+
+
+@pytest.mark.parametrize(
+    "template",
+    ["{player_name} earned VIP", "{} earned VIP", "{vip_reward"],
+)
+def test_compile_template_invalid(template):
+    with pytest.raises(ValueError):
+        compile_template(template, PLAYER_MESSAGE_FIELDS)
+
+
+def test_config_rejects_unknown_template_fields():
+    with pytest.raises(pydantic.ValidationError):
+        make_mock_config(message_reward="You've been granted {vip_rewrd} of VIP")
+
+
+@pytest.mark.parametrize(
+    "field", ["message_non_vip", "discord_seeding_complete_message"]
+)
+def test_config_rejects_fields_in_static_messages(field):
+    config = make_mock_config()
+    with pytest.raises(pydantic.ValidationError):
+        ServerConfig.model_validate(
+            {**config.model_dump(), field: "Thanks {player_name} for seeding"}
+        )
+
+
+def test_seeding_complete_message_player_count():
+    config = make_mock_config()
+    config = ServerConfig.model_validate(
+        {
+            **config.model_dump(),
+            "discord_seeding_complete_message": "Live with {player_count} players!",
+        }
+    )
+    assert (
+        format_seeding_complete_message(
+            config.discord_seeding_complete_message, player_count=42
+        )
+        == "Live with 42 players!"
+    )
+
+
+@pytest.mark.parametrize(
+    "offset",
+    [
+        timedelta(seconds=30),
+        timedelta(minutes=59),
+        timedelta(hours=5, seconds=10),
+        timedelta(days=300),
+        -timedelta(days=3),
+    ],
+)
+def test_natural_expiration_matches_humanize(offset: timedelta):
+    with freeze_time("2024-01-01"):
+        expiration = datetime.now(tz=timezone.utc) + offset
+        assert natural_expiration(expiration) == naturaltime(expiration)
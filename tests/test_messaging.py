@@ -0,0 +1,92 @@
+import httpx
+import pytest
+import trio
+import trio.testing
+
+from hll_seed_vip.io import make_client
+from hll_seed_vip.messaging import (
+    MessagePriority,
+    MessageQueue,
+    OutboundMessage,
+    send_messages,
+)
+from hll_seed_vip.metrics import metrics
+from tests.test_conditions import make_mock_config
+
+URL = "http://example.com/"
+
+
+def make_message(player_id: str, priority=MessagePriority.REWARD) -> OutboundMessage:
+    return OutboundMessage(
+        priority=priority, server_url=URL, player_id=player_id, message="hello"
+    )
+
+
+def run_with_clock(func):
+    return trio.run(func, clock=trio.testing.MockClock(autojump_threshold=0))
+
+
+def test_priority_and_dedup():
+    async def run():
+        queue = MessageQueue(rate_limit=1, burst=1, dedup_window=60, max_size=10)
+        assert queue.put(make_message("1", MessagePriority.NON_VIP))
+        assert queue.put(make_message("2", MessagePriority.NON_VIP))
+        # Already queued a non VIP message for this player
+        assert not queue.put(make_message("2", MessagePriority.NON_VIP))
+        # Every reward message goes through, each one is for a new grant
+        assert queue.put(make_message("2"))
+        assert queue.put(make_message("2"))
+        assert [m.priority for m in (await queue.get(), await queue.get())] == [
+            MessagePriority.REWARD,
+            MessagePriority.REWARD,
+        ]
+
+        await trio.sleep(61)
+        assert queue.put(make_message("2", MessagePriority.NON_VIP))
+
+    metrics.clear()
+    run_with_clock(run)
+    assert metrics.counters["messages.deduplicated"] == 1
+
+
+def test_full_queue_drops_lowest_priority():
+    async def run():
+        queue = MessageQueue(rate_limit=1, burst=1, dedup_window=60, max_size=2)
+        assert queue.put(make_message("1", MessagePriority.NON_VIP))
+        assert queue.put(make_message("2", MessagePriority.NON_VIP))
+        # Evicts the newest non VIP message
+        assert queue.put(make_message("3"))
+        assert not queue.put(make_message("4", MessagePriority.NON_VIP))
+        queue.close()
+        return [message.player_id async for message in drain(queue)]
+
+    async def drain(queue):
+        while (message := await queue.get()) is not None:
+            yield message
+
+    metrics.clear()
+    assert run_with_clock(run) == ["3", "1"]
+    assert metrics.counters["messages.dropped"] == 2
+
+
+def test_send_messages_rate_limit():
+    sent: list[float] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(trio.current_time())
+        return httpx.Response(200, json={"result": "SUCCESS"})
+
+    async def run():
+        queue = MessageQueue(rate_limit=2, burst=2, dedup_window=60, max_size=10)
+        for player_id in range(6):
+            queue.put(make_message(str(player_id)))
+        queue.close()
+        async with make_client(
+            make_mock_config(), {}, httpx.MockTransport(handler)
+        ) as client:
+            await send_messages(client, queue)
+
+    run_with_clock(run)
+    assert len(sent) == 6
+    # 2 sent right away then one every half second
+    assert sent[-1] - sent[0] == pytest.approx(2)
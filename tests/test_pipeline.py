@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone
+
+import trio
+
+from hll_seed_vip.pipeline import (
+    BackToSeedingEvent,
+    BucketReachedEvent,
+    EventRouter,
+    SeededEvent,
+    SeedingStateMachine,
+    Snapshot,
+)
+from tests.test_conditions import (
+    make_mock_config,
+    make_mock_gamestate,
+    make_mock_player,
+    make_mock_server_pop,
+)
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_snapshot(
+    allied: int, axis: int, seconds: float = 0, discord: bool = False
+) -> Snapshot:
+    config = make_mock_config(minimum_time=timedelta(seconds=30))
+    if discord:
+        config = config.model_copy(
+            update={"discord_webhooks": ["https://discord.com/api/webhooks/1/a"]}
+        )
+    return Snapshot(
+        config=config,
+        gamestate=make_mock_gamestate(allied=allied, axis=axis),
+        players=make_mock_server_pop(
+            players={
+                str(i): make_mock_player(
+                    player_id=str(i),
+                    name=f"player {i}",
+                    current_playertime_seconds=int(seconds),
+                )
+                for i in range(allied + axis)
+            }
+        ),
+        timestamp=START + timedelta(seconds=seconds),
+        monotonic=seconds,
+    )
+
+
+def event_types(events) -> list[type]:
+    return [type(event) for event in events]
+
+
+def test_state_machine_seed_cycle():
+    machine = SeedingStateMachine()
+
+    assert machine.process(make_snapshot(5, 5)) == []
+    assert machine.is_seeding
+    assert machine.sleep_time == 300
+
+    events = machine.process(make_snapshot(20, 20, seconds=60))
+    assert event_types(events) == [SeededEvent]
+    assert events[0].seeded_timestamp == START + timedelta(seconds=60)
+    assert events[0].seeders == {str(i) for i in range(40)}
+    assert events[0].names["0"] == "player 0"
+    assert not machine.is_seeding
+    assert machine.sleep_time == 60
+    # The next seeding session starts without this one's trend
+    assert machine.forecaster.players_per_second == 0
+
+    # Dropping below the threshold within the buffer doesn't restart seeding
+    assert machine.process(make_snapshot(5, 5, seconds=120)) == []
+    assert not machine.is_seeding
+
+    events = machine.process(make_snapshot(5, 5, seconds=60 + 6 * 60))
+    assert event_types(events) == [BackToSeedingEvent]
+    assert machine.is_seeding
+
+
+def test_state_machine_starts_seeded():
+    machine = SeedingStateMachine()
+    assert machine.process(make_snapshot(20, 20)) == []
+    assert machine.is_seeding is False
+
+
+def test_state_machine_buckets():
+    machine = SeedingStateMachine()
+
+    # No webhooks means nothing to announce
+    assert machine.process(make_snapshot(6, 6)) == []
+
+    machine = SeedingStateMachine()
+    events = machine.process(make_snapshot(6, 6, discord=True))
+    assert event_types(events) == [BucketReachedEvent]
+    assert events[0].bucket == 10
+
+    # Jumps straight to the largest bucket reached
+    events = machine.process(make_snapshot(16, 16, seconds=30, discord=True))
+    assert event_types(events) == [BucketReachedEvent]
+    assert events[0].bucket == 30
+    assert machine.last_bucket_announced
+
+    assert machine.process(make_snapshot(17, 17, seconds=60, discord=True)) == []
+
+
+def test_event_router_backpressure_and_drops():
+    async def run():
+        router = EventRouter()
+        rewards = router.subscribe("rewards", (SeededEvent,), queue_size=1)
+        discord = router.subscribe(
+            "discord",
+            (SeededEvent, BucketReachedEvent),
+            drop_when_full=True,
+            queue_size=1,
+        )
+        event = BucketReachedEvent(snapshot=make_snapshot(5, 5), bucket=10, eta=None)
+        await router.publish(event)
+        # The discord queue is full so this is dropped instead of blocking
+        await router.publish(event)
+
+        seeded = SeededEvent(
+            snapshot=make_snapshot(20, 20),
+            seeded_timestamp=START,
+            seeders=set(),
+            names={},
+        )
+        await router.publish(seeded)
+        # The rewards queue is full so publishing waits for the worker
+        with trio.move_on_after(0.1) as cancel_scope:
+            await router.publish(seeded)
+        assert cancel_scope.cancelled_caught
+
+        assert await rewards.receive() == seeded
+        assert await discord.receive() == event
+
+    trio.run(run)
+
+
+def test_state_machine_save_and_restore(tmp_path):
+    machine = SeedingStateMachine()
+    machine.process(make_snapshot(5, 5))
+    machine.process(make_snapshot(20, 20, seconds=60))
+    path = tmp_path / "server.json"
+    machine.save(path)
+
+    restored = SeedingStateMachine()
+    assert restored.restore(path)
+    assert restored.dump_state() == machine.dump_state()
+    assert restored.seeded_timestamp == START + timedelta(seconds=60)
+
+    assert not SeedingStateMachine().restore(tmp_path / "missing.json")
+    path.write_text("{")
+    assert not SeedingStateMachine().restore(path)
@@ -0,0 +1,53 @@
+import pytest
+
+from hll_seed_vip.utils import calc_adaptive_poll_time
+from tests.test_conditions import make_mock_config, make_mock_gamestate
+
+
+def make_adaptive_config(enabled: bool = True):
+    return make_mock_config(
+        max_allies=20, max_axis=20, poll_time_seeding=30
+    ).model_copy(
+        update={"adaptive_polling": enabled, "min_poll_time": 10, "max_poll_time": 120}
+    )
+
+
+@pytest.mark.parametrize(
+    "allied, axis, players_per_second, expected",
+    [
+        # empty server backs off completely
+        (0, 0, 0.0, 120),
+        # barely populated and nobody joining is close to the max
+        (1, 1, 0.0, 114),
+        # hovering near the threshold polls tightly even without joins
+        (19, 19, 0.0, 16),
+        # at the threshold
+        (20, 20, 0.0, 10),
+        # halfway there but filling up fast, seeds in ~40s
+        (10, 10, 0.5, 20),
+        # halfway there and filling up slowly
+        (10, 10, 0.01, 65),
+        # players leaving doesn't shorten the poll time
+        (10, 10, -0.5, 65),
+    ],
+)
+def test_calc_adaptive_poll_time(allied, axis, players_per_second, expected):
+    assert (
+        calc_adaptive_poll_time(
+            config=make_adaptive_config(),
+            gamestate=make_mock_gamestate(allied=allied, axis=axis),
+            players_per_second=players_per_second,
+        )
+        == expected
+    )
+
+
+def test_calc_adaptive_poll_time_disabled():
+    assert (
+        calc_adaptive_poll_time(
+            config=make_adaptive_config(enabled=False),
+            gamestate=make_mock_gamestate(allied=19, axis=19),
+            players_per_second=1,
+        )
+        == 30
+    )
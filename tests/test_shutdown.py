@@ -0,0 +1,83 @@
+import httpx
+import trio
+import trio.testing
+
+from hll_seed_vip.io import make_client
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.pipeline import SeededEvent, reward_worker
+from hll_seed_vip.shutdown import GracefulShutdown
+from tests.test_pipeline import START, make_snapshot
+
+
+def test_shutdown_stops_then_drains():
+    shutdown = GracefulShutdown()
+    results = {}
+
+    async def poll():
+        with shutdown.stop_on_request() as scope:
+            await trio.sleep_forever()
+        results["poll"] = scope.cancelled_caught
+
+    async def drain(name: str, work: float):
+        with shutdown.drain_within(10) as scope:
+            await shutdown.requested.wait()
+            await trio.sleep(work)
+        results[name] = scope.cancelled_caught
+
+    async def run():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(poll)
+            nursery.start_soon(drain, "finished", 5)
+            nursery.start_soon(drain, "cut_off", 60)
+            await trio.sleep(1)
+            shutdown.request("Testing")
+        # Scopes entered after the request are already cancelled/have a deadline
+        with shutdown.stop_on_request() as scope:
+            await trio.sleep_forever()
+        results["late"] = scope.cancelled_caught
+
+    trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))
+    assert results == {"poll": True, "finished": False, "cut_off": True, "late": True}
+
+
+def test_reward_worker_reports_undone_work():
+    metrics.clear()
+    granted = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("get_vip_ids"):
+            return httpx.Response(200, json={"result": []})
+        if request.url.path.endswith("add_vip"):
+            await trio.sleep(10)
+            granted.append(request)
+        return httpx.Response(200, json={"result": "SUCCESS"})
+
+    snapshot = make_snapshot(allied=2, axis=1, seconds=60)
+    snapshot = snapshot._replace(
+        config=snapshot.config.model_copy(update={"dry_run": False})
+    )
+    event = SeededEvent(
+        snapshot=snapshot,
+        seeded_timestamp=START,
+        seeders={"0", "1", "2"},
+        names={},
+    )
+    shutdown = GracefulShutdown()
+
+    async def run():
+        send_channel, receive_channel = trio.open_memory_channel(4)
+        await send_channel.send(event)
+        await send_channel.send(event)
+        shutdown.request("Testing")
+        async with make_client(
+            snapshot.config, {}, httpx.MockTransport(handler)
+        ) as client:
+            with shutdown.drain_within(15) as scope:
+                await reward_worker(client, receive_channel)
+        return scope.cancelled_caught
+
+    cancelled = trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))
+    assert cancelled
+    assert len(granted) == 1
+    # Two seeders weren't granted VIP, nobody was messaged and the second seed never started
+    assert metrics.counters["pipeline.rewards.unfinished"] == 3
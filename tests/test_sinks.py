@@ -0,0 +1,184 @@
+import json
+import sqlite3
+
+import httpx
+import pydantic
+import pytest
+import trio
+import trio.testing
+
+from hll_seed_vip.models import RewardSinkConfig, ServerConfig
+from hll_seed_vip.pipeline import EventRouter, SeededEvent, sink_worker
+from hll_seed_vip.sinks import (
+    DiscordRoleSink,
+    RewardSink,
+    SeedReward,
+    SQLitePointsSink,
+    WebhookSink,
+    deliver,
+    make_reward_sinks,
+)
+from tests.test_conditions import make_mock_config
+from tests.test_pipeline import START, make_snapshot
+
+REWARD = SeedReward(
+    server_url="http://example.com/",
+    seeded_timestamp=START,
+    players={"1": "player 1", "2": "player 2"},
+)
+
+
+class FlakySink(RewardSink):
+    def __init__(self, config: RewardSinkConfig, failures: int, delay: float = 0):
+        super().__init__(config)
+        self.failures = failures
+        self.delay = delay
+        self.attempts = 0
+        self.rewarded: list[SeedReward] = []
+
+    async def reward(self, reward: SeedReward) -> None:
+        self.attempts += 1
+        await trio.sleep(self.delay)
+        if self.attempts <= self.failures:
+            raise RuntimeError("unavailable")
+        self.rewarded.append(reward)
+
+
+def test_sink_config_validation():
+    with pytest.raises(pydantic.ValidationError):
+        RewardSinkConfig(type="discord_role", url="http://bot")
+    assert RewardSinkConfig(type="sqlite", path="points.db").name == "sqlite"
+
+    with pytest.raises(pydantic.ValidationError):
+        ServerConfig.model_validate(
+            {
+                **make_mock_config().model_dump(),
+                "reward_sinks": [
+                    {"type": "webhook", "url": "http://a"},
+                    {"type": "webhook", "url": "http://b"},
+                ],
+            }
+        )
+
+
+def test_deliver_retries_then_gives_up():
+    async def run():
+        config = RewardSinkConfig(type="webhook", url="http://a", retries=2)
+        recovers = FlakySink(config, failures=2)
+        assert await deliver(recovers, REWARD)
+        assert recovers.attempts == 3
+        assert recovers.rewarded == [REWARD]
+
+        broken = FlakySink(config, failures=10)
+        assert not await deliver(broken, REWARD)
+        assert broken.attempts == 3
+
+        slow = FlakySink(config.model_copy(update={"timeout": 5}), failures=0, delay=60)
+        start = trio.current_time()
+        assert not await deliver(slow, REWARD)
+        # Every attempt timed out, with 1s and 2s between them
+        assert trio.current_time() - start == 3 * 5 + 1 + 2
+
+    trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))
+
+
+def test_sqlite_points_sink(tmp_path):
+    path = tmp_path / "logs" / "points.db"
+    sink = SQLitePointsSink(RewardSinkConfig(type="sqlite", path=str(path), points=2))
+    # The database is only created once there is a seed to record
+    assert not path.parent.exists()
+
+    async def run():
+        await sink.reward(REWARD)
+        # A retry of the same seed doesn't add more points
+        await sink.reward(REWARD)
+        await sink.reward(REWARD._replace(seeded_timestamp=START.replace(hour=5)))
+
+    trio.run(run)
+
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute(
+            "SELECT player_id, SUM(points) FROM seed_points GROUP BY player_id"
+        ).fetchall()
+    assert dict(rows) == {"1": 4, "2": 4}
+
+
+def test_webhook_sinks_post_seeders():
+    requests: list[tuple[str, dict]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append((str(request.url), json.loads(request.content)))
+        return httpx.Response(200)
+
+    transport = httpx.MockTransport(handler)
+    webhook = WebhookSink(
+        RewardSinkConfig(type="webhook", url="http://site/seeders"), transport
+    )
+    discord = DiscordRoleSink(
+        RewardSinkConfig(type="discord_role", url="http://bot/roles", role_id="42"),
+        transport,
+    )
+
+    async def run():
+        for sink in (webhook, discord):
+            await sink.reward(REWARD)
+            await sink.aclose()
+
+    trio.run(run)
+
+    assert requests[0] == ("http://site/seeders", REWARD.to_dict())
+    assert requests[1][0] == "http://bot/roles"
+    assert requests[1][1]["role_id"] == "42"
+    assert requests[1][1]["player_ids"] == ["1", "2"]
+
+
+def test_make_reward_sinks(tmp_path):
+    config = make_mock_config().model_copy(
+        update={
+            "reward_sinks": [
+                RewardSinkConfig(type="sqlite", path=str(tmp_path / "points.db")),
+                RewardSinkConfig(type="webhook", url="http://a", name="site"),
+            ]
+        }
+    )
+    sinks = make_reward_sinks(config)
+    assert [type(sink) for sink in sinks] == [SQLitePointsSink, WebhookSink]
+    assert [sink.name for sink in sinks] == ["sqlite", "site"]
+
+
+def test_slow_sink_never_blocks_rewards():
+    config = make_mock_config(dry_run=False)
+    sink = FlakySink(
+        RewardSinkConfig(type="webhook", url="http://a", queue_size=1, timeout=120),
+        failures=0,
+        delay=60,
+    )
+    seeded = SeededEvent(
+        snapshot=make_snapshot(20, 20)._replace(config=config),
+        seeded_timestamp=START,
+        seeders={"1", "2"},
+        names={"1": "player 1"},
+    )
+
+    async def run():
+        router = EventRouter()
+        rewards = router.subscribe("rewards", (SeededEvent,), queue_size=3)
+        sink_channel = router.subscribe(
+            "sink.slow", (SeededEvent,), drop_when_full=True, queue_size=1
+        )
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(sink_worker, sink, sink_channel)
+            await trio.testing.wait_all_tasks_blocked()
+            start = trio.current_time()
+            for _ in range(3):
+                await router.publish(seeded)
+            # Publishing didn't wait on the sink
+            assert trio.current_time() == start
+            assert len([await rewards.receive() for _ in range(3)]) == 3
+            await router.aclose()
+
+    trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))
+
+    # One seed was being rewarded, one queued and the last dropped
+    assert len(sink.rewarded) == 2
+    assert sink.rewarded[0].players == {"1": "player 1", "2": ""}
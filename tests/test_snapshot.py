@@ -0,0 +1,103 @@
+import random
+from datetime import timedelta
+
+import pytest
+
+from hll_seed_vip.models import ServerPopulation
+from hll_seed_vip.snapshot import SeederTracker, diff_populations
+from hll_seed_vip.utils import collect_steam_ids
+from tests.test_conditions import (
+    make_mock_config,
+    make_mock_player,
+    make_mock_server_pop,
+)
+
+
+def make_pop(playtimes: dict[str, int]) -> ServerPopulation:
+    return make_mock_server_pop(
+        players={
+            player_id: make_mock_player(
+                player_id=player_id, current_playertime_seconds=playtime
+            )
+            for player_id, playtime in playtimes.items()
+        }
+    )
+
+
+def test_diff_populations():
+    prev = make_pop({"1": 10, "2": 10})
+    curr = make_pop({"2": 40, "3": 1})
+
+    delta = diff_populations(None, prev)
+    assert delta.joined == {"1", "2"} and delta.left == set()
+
+    delta = diff_populations(prev, curr)
+    assert delta.joined == {"3"}
+    assert delta.left == {"1"}
+
+
+@pytest.mark.parametrize("online_when_seeded", [True, False])
+def test_tracker_matches_collect_steam_ids(online_when_seeded):
+    config = make_mock_config(
+        minimum_time=timedelta(minutes=5), online_when_seeded=online_when_seeded
+    )
+    rng = random.Random(42)
+    poll_time = 30
+    sessions: dict[str, int] = {}
+
+    tracker = SeederTracker()
+    cum_steam_ids: set[str] = set()
+    for tick in range(200):
+        now = tick * poll_time
+        left = {player_id for player_id in sessions if rng.random() < 0.03}
+        for player_id in left:
+            del sessions[player_id]
+        for _ in range(rng.randint(0, 3)):
+            player_id = str(rng.randint(0, 150))
+            if player_id not in sessions and player_id not in left:
+                # players may join part way through a poll interval
+                sessions[player_id] = now - rng.randint(0, poll_time - 1)
+
+        players = make_pop(
+            {player_id: now - joined for player_id, joined in sessions.items()}
+        )
+        tracker.update(config=config, players=players, now=now)
+        cum_steam_ids = collect_steam_ids(
+            config=config, players=players, cum_steam_ids=cum_steam_ids
+        )
+        assert tracker.eligible == cum_steam_ids
+        assert tracker.seeders(config=config, players=players) == cum_steam_ids
+
+        if tick % 50 == 49:
+            tracker.reset()
+            cum_steam_ids = collect_steam_ids(
+                config=config, players=players, cum_steam_ids=set()
+            )
+            assert tracker.eligible == cum_steam_ids
+
+
+def test_tracker_names_and_config_change():
+    config = make_mock_config(minimum_time=timedelta(minutes=5))
+    tracker = SeederTracker()
+
+    tracker.update(config=config, players=make_pop({"1": 100, "2": 400}), now=0)
+    assert tracker.eligible == {"2"}
+    assert set(tracker.names) == {"1", "2"}
+
+    config = config.model_copy(update={"minimum_play_time": timedelta(seconds=60)})
+    tracker.update(config=config, players=make_pop({"1": 130, "2": 430}), now=30)
+    assert tracker.eligible == {"1", "2"}
+
+
+def test_tracker_seeders_handles_rejoin_between_polls():
+    config = make_mock_config(
+        minimum_time=timedelta(minutes=5), online_when_seeded=True
+    )
+    tracker = SeederTracker()
+
+    tracker.update(config=config, players=make_pop({"1": 400, "2": 400}), now=0)
+    # 1 left and rejoined between polls so their play time restarted
+    players = make_pop({"1": 10, "2": 430})
+    tracker.update(config=config, players=players, now=30)
+
+    assert tracker.seeders(config=config, players=players) == {"2"}
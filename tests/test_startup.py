@@ -0,0 +1,38 @@
+from typing import Final
+
+from hll_seed_vip.profiling import STARTUP_MODULE, parse_importtime, profile_startup
+
+# About twice the current import time, enough headroom for slow CI runners while
+# still catching a heavy dependency being imported eagerly again
+STARTUP_BUDGET_MS: Final = 750
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       572 |        572 |   _io
+import time:       100 |        672 | io
+import time:       281 |     282994 | hll_seed_vip.cli
+"""
+
+
+def test_parse_importtime():
+    timings = parse_importtime(IMPORTTIME_OUTPUT)
+    assert [(t.module, t.self_us, t.cumulative_us, t.depth) for t in timings] == [
+        ("_io", 572, 572, 1),
+        ("io", 100, 672, 0),
+        ("hll_seed_vip.cli", 281, 282994, 0),
+    ]
+
+
+def test_startup_import_time():
+    timings = profile_startup()
+    modules = {t.module for t in timings}
+
+    assert STARTUP_MODULE in modules
+    # Only needed when Discord webhooks are configured
+    assert "discord_webhook" not in modules
+    assert "requests" not in modules
+    # Only needed by their subcommand or flag
+    for module in ("audit", "backfill", "supervisor", "profiling"):
+        assert f"hll_seed_vip.{module}" not in modules
+
+    total = next(t for t in timings if t.module == STARTUP_MODULE)
+    assert total.cumulative_us / 1000 < STARTUP_BUDGET_MS
@@ -0,0 +1,94 @@
+import json
+from datetime import timedelta
+
+import trio
+
+from hll_seed_vip.pipeline import SeedingStateMachine
+from hll_seed_vip.status import RewardOutcome, StatusCache, route, serve_status
+from tests.test_pipeline import START, make_snapshot
+
+
+def parse(response: bytes) -> tuple[int, object]:
+    head, body = response.split(b"\r\n\r\n", 1)
+    return int(head.split(b" ")[1]), json.loads(body)
+
+
+def test_status_cache():
+    cache = StatusCache(max_rewards=2)
+    machine = SeedingStateMachine()
+
+    snapshot = make_snapshot(6, 6, seconds=60)
+    machine.process(snapshot)
+    cache.update(machine, snapshot)
+    status, body = parse(route(cache, b"GET /status HTTP/1.1", max_age=60))
+    assert status == 200
+    assert body["is_seeding"] is True
+    assert body["next_bucket"] == 20
+    assert body["buffer_remaining_seconds"] is None
+
+    # Everyone has played for 60 seconds, over the 30 second minimum
+    status, seeders = parse(route(cache, b"GET /seeders HTTP/1.1", max_age=60))
+    assert len(seeders) == 12
+    assert seeders[0] == {
+        "player_id": "0",
+        "name": "player 0",
+        "online": True,
+        "current_playtime_seconds": 60,
+    }
+
+    snapshot = make_snapshot(20, 20, seconds=120)
+    machine.process(snapshot)
+    snapshot = make_snapshot(19, 19, seconds=180)
+    machine.process(snapshot)
+    cache.update(machine, snapshot)
+    _, body = parse(route(cache, b"GET /status HTTP/1.1", max_age=60))
+    assert body["is_seeding"] is False
+    assert body["buffer_remaining_seconds"] == timedelta(minutes=4).total_seconds()
+
+    for idx in range(3):
+        cache.record_reward(
+            RewardOutcome(
+                seeded_timestamp=START + timedelta(days=idx),
+                rewarded=[str(idx)],
+                skipped_indefinite=[],
+                not_rewarded=0,
+                dry_run=False,
+            )
+        )
+    _, rewards = parse(route(cache, b"GET /rewards HTTP/1.1", max_age=60))
+    assert [reward["rewarded"] for reward in rewards] == [["2"], ["1"]]
+
+
+def test_route_errors():
+    cache = StatusCache()
+    assert parse(route(cache, b"GET /health HTTP/1.1", max_age=60))[0] == 503
+    assert parse(route(cache, b"POST /status HTTP/1.1", max_age=60))[0] == 405
+    assert parse(route(cache, b"GET /missing HTTP/1.1", max_age=60))[0] == 404
+    assert parse(route(cache, b"garbage", max_age=60))[0] == 400
+
+
+def test_serve_status():
+    cache = StatusCache()
+    responses: list[bytes] = []
+
+    async def request(port: int) -> None:
+        stream = await trio.open_tcp_stream("127.0.0.1", port)
+        async with stream:
+            await stream.send_all(b"GET /status HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = b""
+            while data := await stream.receive_some():
+                response += data
+            responses.append(response)
+
+    async def run():
+        async with trio.open_nursery() as nursery:
+            listeners = await nursery.start(serve_status, cache, "127.0.0.1", 0, 60)
+            port = listeners[0].socket.getsockname()[1]
+            async with trio.open_nursery() as clients:
+                for _ in range(10):
+                    clients.start_soon(request, port)
+            nursery.cancel_scope.cancel()
+
+    trio.run(run)
+    assert len(responses) == 10
+    assert all(parse(r) == (200, {"status": "starting"}) for r in responses)
@@ -0,0 +1,121 @@
+import time
+from pathlib import Path
+
+import trio
+import trio.testing
+from loguru import logger
+
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.shutdown import GracefulShutdown
+from hll_seed_vip.supervisor import Supervisor, serve_isolated, shard_configs
+
+
+def crash(
+    shard,
+    config_paths,
+    state_dir,
+    population_dir,
+    ledger_dir,
+    leader_dir,
+    events,
+    log_level,
+):
+    events.put(("log", shard, "ERROR", f"shard {shard} crashing\n"))
+    events.put(("metrics", shard, {"polls": 3}))
+    raise SystemExit(1)
+
+
+def test_shard_configs():
+    paths = [Path(f"{name}.yml") for name in "edcba"]
+    assert shard_configs(paths, 2) == [
+        [Path("a.yml"), Path("c.yml"), Path("e.yml")],
+        [Path("b.yml"), Path("d.yml")],
+    ]
+    # Never more shards than servers
+    assert shard_configs(paths[:2], 8) == [[Path("d.yml")], [Path("e.yml")]]
+    assert shard_configs([], 4) == []
+
+
+def test_supervisor_restarts_crashed_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr("hll_seed_vip.supervisor.RESTART_DELAY", 0)
+    supervisor = Supervisor(
+        config_paths=[tmp_path / "a.yml", tmp_path / "b.yml"],
+        num_workers=2,
+        state_dir=tmp_path / "state",
+        population_dir=tmp_path / "population",
+        ledger_dir=tmp_path / "ledger",
+        leader_dir=tmp_path / "leader",
+        target=crash,
+    )
+    for worker in supervisor.workers:
+        worker.restart_delay = 0
+
+    supervisor.start()
+    first_pids = {worker.process.pid for worker in supervisor.workers}
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            supervisor.poll(timeout=0.1)
+            pids = {worker.process.pid for worker in supervisor.workers}
+            if not pids & first_pids:
+                break
+        assert not pids & first_pids
+    finally:
+        supervisor.stop()
+
+
+def test_serve_isolated_restarts_failed_server():
+    shutdown = GracefulShutdown()
+    calls: list[float] = []
+
+    async def serve():
+        calls.append(trio.current_time())
+        if len(calls) < 3:
+            raise ValueError("broken")
+
+    async def run():
+        await serve_isolated("server", shutdown, serve)
+
+    trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))
+    # Restarted after 5s then after another 10s
+    assert [round(t - calls[0]) for t in calls] == [0, 5, 15]
+
+
+def test_serve_isolated_stops_restarting_on_shutdown():
+    shutdown = GracefulShutdown()
+    calls = 0
+
+    async def serve():
+        nonlocal calls
+        calls += 1
+        raise ValueError("broken")
+
+    async def run():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(serve_isolated, "server", shutdown, serve)
+            await trio.sleep(1)
+            shutdown.request("test")
+
+    trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))
+    assert calls == 1
+
+
+def test_supervisor_logs_worker_metrics(tmp_path):
+    supervisor = Supervisor(
+        config_paths=[tmp_path / "a.yml"],
+        num_workers=1,
+        state_dir=tmp_path / "state",
+        population_dir=tmp_path / "population",
+        ledger_dir=tmp_path / "ledger",
+        leader_dir=tmp_path / "leader",
+        target=crash,
+    )
+    metrics.clear()
+    supervisor.handle_event(("metrics", 0, {"polls": 3}))
+    messages: list[str] = []
+    sink = logger.add(messages.append, level="INFO")
+    try:
+        supervisor.log_metrics()
+    finally:
+        logger.remove(sink)
+    assert '"shard0.polls": 3' in messages[0]
@@ -0,0 +1,81 @@
+from datetime import date, datetime, timedelta, timezone
+
+from hll_seed_vip.timeseries import (
+    RECORD,
+    PopulationRecord,
+    PopulationWriter,
+    load_range,
+    seeder_counts,
+    segment_path,
+    time_to_seed_per_day,
+)
+
+START = datetime(2024, 1, 1, 23, 50, tzinfo=timezone.utc)
+
+
+def make_record(
+    minutes: int,
+    allied: int,
+    axis: int,
+    is_seeding: bool = True,
+    seeded: bool = False,
+    num_seeders: int = 0,
+):
+    return PopulationRecord(
+        timestamp=START + timedelta(minutes=minutes),
+        num_allied_players=allied,
+        num_axis_players=axis,
+        num_online_players=allied + axis,
+        num_seeders=num_seeders,
+        is_seeding=is_seeding,
+        seeded=seeded,
+    )
+
+
+def test_rotates_daily_and_loads_range(tmp_path):
+    with PopulationWriter(tmp_path) as writer:
+        for minutes in range(0, 20, 5):
+            writer.append(make_record(minutes, allied=minutes, axis=minutes))
+
+    assert segment_path(tmp_path, date(2024, 1, 1)).exists()
+    assert segment_path(tmp_path, date(2024, 1, 2)).exists()
+
+    series = load_range(tmp_path, START, START + timedelta(days=1))
+    assert list(series.num_allied_players) == [0, 5, 10, 15]
+    assert series.timestamps[-1] == (START + timedelta(minutes=15)).timestamp()
+
+    series = load_range(
+        tmp_path, START + timedelta(minutes=5), START + timedelta(minutes=15)
+    )
+    assert list(series.num_axis_players) == [5, 10]
+
+
+def test_ignores_partial_trailing_record(tmp_path):
+    with PopulationWriter(tmp_path) as writer:
+        writer.append(make_record(0, allied=1, axis=1))
+
+    path = segment_path(tmp_path, START.date())
+    with open(path, "ab") as fp:
+        fp.write(make_record(1, allied=2, axis=2).pack()[: RECORD.size // 2])
+
+    series = load_range(tmp_path, START, START + timedelta(hours=1))
+    assert len(series) == 1
+
+
+def test_aggregations(tmp_path):
+    with PopulationWriter(tmp_path) as writer:
+        # server empties out before seeding starts in earnest
+        writer.append(make_record(0, allied=1, axis=0))
+        writer.append(make_record(1, allied=0, axis=0))
+        writer.append(make_record(15, allied=2, axis=2))
+        writer.append(make_record(40, allied=10, axis=9))
+        writer.append(
+            make_record(
+                70, allied=20, axis=20, is_seeding=False, seeded=True, num_seeders=25
+            )
+        )
+        writer.append(make_record(100, allied=30, axis=30, is_seeding=False))
+
+    series = load_range(tmp_path, START, START + timedelta(days=2))
+    assert time_to_seed_per_day(series) == {date(2024, 1, 2): timedelta(minutes=55)}
+    assert seeder_counts(series) == [(START + timedelta(minutes=70), 25)]
@@ -1,6 +1,7 @@
 import pytest
 
 from hll_seed_vip.utils import get_next_player_bucket
+from tests.test_conditions import make_mock_config
 
 
 @pytest.mark.parametrize(
@@ -13,6 +14,8 @@ from hll_seed_vip.utils import get_next_player_bucket
         ([10, 20, 30, 40], 21, 20),
         ([10, 20, 30, 40], 30, 30),
         ([10, 20, 30], 34, 30),
+        ([10, 20, 30, 40], 40, 40),
+        ([10], 10, 10),
         ([], 37, None),
     ],
 )
@@ -24,3 +27,16 @@ def test_get_next_player_bucket(buckets, total_players, expected):
         )
         == expected
     )
+
+
+def test_player_bucket_lookup():
+    config = make_mock_config()
+    for total_players in range(120):
+        assert config.player_bucket(total_players) == get_next_player_bucket(
+            config.discord_seeding_player_buckets, total_players
+        )
+
+    config = config.model_copy(update={"discord_seeding_player_buckets": [40, 5]})
+    assert config.player_bucket(4) is None
+    assert config.player_bucket(39) == 5
+    assert config.player_bucket(100) == 40
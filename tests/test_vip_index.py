@@ -0,0 +1,105 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+from hll_seed_vip.constants import INDEFINITE_VIP_DATE
+from hll_seed_vip.models import Player, VipPlayer
+from hll_seed_vip.templates import template_pattern
+from hll_seed_vip.utils import filter_indefinite_vip_steam_ids, filter_online_players
+from hll_seed_vip.vip_index import VipIndex
+from tests.test_conditions import make_mock_player, make_mock_server_pop
+
+NOW = datetime(2024, 6, 1, tzinfo=timezone.utc)
+
+
+def make_vip(player_id: str, expiration: datetime | None, name: str = "") -> VipPlayer:
+    return VipPlayer(
+        player=Player(player_id=player_id, name=name, current_playtime_seconds=0),
+        expiration_date=expiration,
+    )
+
+
+def make_vips(count: int, seed: int = 0) -> dict[str, VipPlayer]:
+    rng = random.Random(seed)
+    vips = {}
+    for idx in range(count):
+        roll = rng.random()
+        if roll < 0.1:
+            expiration = INDEFINITE_VIP_DATE
+        elif roll < 0.15:
+            expiration = None
+        else:
+            expiration = NOW + timedelta(hours=rng.randint(-500, 500))
+        name = f"player {idx}" + (" - HLL Seed VIP" if rng.random() < 0.5 else "")
+        vips[str(idx)] = make_vip(str(idx), expiration, name)
+    return vips
+
+
+def test_vip_index_range_queries():
+    vips = make_vips(500)
+    index = VipIndex(vips)
+    start, end = NOW, NOW + timedelta(hours=24)
+
+    expected = sorted(
+        (
+            vip
+            for vip in vips.values()
+            if vip.expiration_date and start <= vip.expiration_date < end
+        ),
+        key=lambda vip: (vip.expiration_date, vip.player.player_id),
+    )
+    assert index.expiring_within(timedelta(hours=24), NOW) == expected
+    assert index.count_expiring_before(NOW) == len(index.expired(NOW))
+    assert {v.player.player_id for v in index.expired(NOW)} == {
+        player_id
+        for player_id, vip in vips.items()
+        if vip.expiration_date and vip.expiration_date < NOW
+    }
+    assert index.indefinite_player_ids() == filter_indefinite_vip_steam_ids(vips)
+    assert len(index.without_expiration()) == sum(
+        1 for vip in vips.values() if vip.expiration_date is None
+    )
+
+
+def test_vip_index_online():
+    vips = make_vips(100)
+    index = VipIndex(vips)
+    players = make_mock_server_pop(
+        players={
+            player_id: make_mock_player(player_id)
+            for player_id in ("1", "50", "not a vip")
+        }
+    )
+    assert index.online(players) == filter_online_players(vips, players)
+
+
+def test_vip_index_seed_granted():
+    vips = make_vips(200)
+    index = VipIndex(
+        vips,
+        seed_name_pattern=template_pattern("{player_name} - HLL Seed VIP"),
+        seed_player_ids={"3"},
+    )
+    expired = index.seed_granted(end=NOW)
+    assert expired == sorted(expired, key=lambda vip: vip.expiration_date)
+    assert {vip.player.player_id for vip in expired} == {
+        player_id
+        for player_id, vip in vips.items()
+        if vip.expiration_date
+        and vip.expiration_date < NOW
+        and (vip.player.name.endswith("Seed VIP") or player_id == "3")
+    }
+
+
+def test_vip_index_add_and_remove():
+    index = VipIndex({})
+    index.add(make_vip("1", NOW))
+    index.add(make_vip("2", NOW + timedelta(hours=1)))
+    # Replacing moves it in the sorted order
+    index.add(make_vip("1", NOW + timedelta(hours=2)))
+    assert [v.player.player_id for v in index.expiring_between()] == ["2", "1"]
+
+    index.remove("2")
+    index.remove("missing")
+    assert "2" not in index
+    assert [v.player.player_id for v in index.expiring_between()] == ["1"]
+    assert len(index) == 1
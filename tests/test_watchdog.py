@@ -0,0 +1,100 @@
+from datetime import datetime, timezone
+
+import httpx
+import trio
+import trio.testing
+
+from hll_seed_vip.config_watcher import ConfigWatcher
+from hll_seed_vip.io import make_client
+from hll_seed_vip.metrics import metrics
+from hll_seed_vip.pipeline import SeedingStateMachine, poll_crcon
+from hll_seed_vip.status import StatusCache
+from hll_seed_vip.watchdog import Watchdog, format_task_tree
+from tests.test_conditions import make_mock_config, make_mock_gamestate
+
+
+async def hang_forever():
+    await trio.sleep_forever()
+
+
+def test_format_task_tree():
+    async def run():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(hang_forever)
+            await trio.sleep(1)
+            tree = format_task_tree()
+            nursery.cancel_scope.cancel()
+        return tree
+
+    tree = trio.run(run)
+    assert "hang_forever" in tree
+    assert "sleep_forever" in tree
+
+
+def test_watchdog_detects_and_restarts_stalled_tick():
+    metrics.clear()
+    watchdog = Watchdog()
+    polls = []
+
+    async def poll():
+        for attempt in range(2):
+            with watchdog.tick() as scope:
+                # The first poll hangs, the second one finishes
+                await trio.sleep(1000 if attempt == 0 else 1)
+            polls.append(scope.cancelled_caught)
+
+    async def run():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(poll)
+            await trio.sleep(30)
+            assert not watchdog.check(stall_after=60, restart_tick=False)
+            await trio.sleep(40)
+            assert watchdog.check(stall_after=60, restart_tick=True)
+            assert watchdog.stalled
+            status = StatusCache(watchdog=watchdog)
+            status.updated_at = datetime.now(tz=timezone.utc)
+            assert not status.health(max_age=60)
+            # Still stalled until a poll finishes
+            await trio.sleep(0.5)
+            assert watchdog.stalled
+
+    trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))
+    assert polls == [True, False]
+    assert not watchdog.stalled
+    assert metrics.counters["watchdog.stalls"] == 1
+    assert metrics.counters["watchdog.restarts"] == 1
+
+
+def test_waiting_on_the_pipeline_is_not_a_stall(tmp_path):
+    config = make_mock_config()
+    watchdog = Watchdog()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("get_players"):
+            return httpx.Response(200, json={"result": []})
+        return httpx.Response(
+            200, json={"result": make_mock_gamestate().model_dump(mode="json")}
+        )
+
+    async def run():
+        # Nothing receives the snapshots, like a pipeline stuck on a slow reward
+        send_channel, receive_channel = trio.open_memory_channel(0)
+        async with make_client(
+            config, {}, httpx.MockTransport(handler)
+        ) as client, trio.open_nursery() as nursery:
+            nursery.start_soon(
+                poll_crcon,
+                client,
+                ConfigWatcher(tmp_path / "config.yml", config),
+                SeedingStateMachine(),
+                send_channel,
+                None,
+                watchdog,
+            )
+            await trio.sleep(1000)
+            assert not watchdog.check(stall_after=120, restart_tick=True)
+            assert watchdog.last_tick is not None
+            nursery.cancel_scope.cancel()
+        receive_channel.close()
+
+    trio.run(run, clock=trio.testing.MockClock(autojump_threshold=0))